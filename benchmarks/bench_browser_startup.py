@@ -0,0 +1,54 @@
+"""
+Measures the browser part of the startup-to-login path: the driver test followed by the launch
+of the registrar's browser, with the license check stood in for by a sleep. Compares booting a
+throwaway test browser and then a second one for the registrar against prelaunching a single
+browser during the license check and reusing it. Requires Google Chrome. Run from the repository
+root with:
+
+    python -m benchmarks.bench_browser_startup [license check seconds] [runs]
+"""
+import statistics
+import sys
+import time
+
+from core.browser import BrowserFactory, launch_chrome
+
+
+def cold_startup(license_check_time: float) -> float:
+    # the pre-existing startup path, kept as the baseline
+    start = time.monotonic()
+    time.sleep(license_check_time)
+    test_driver = launch_chrome()
+    test_driver.close()
+    test_driver.quit()
+    driver = launch_chrome()
+    elapsed = time.monotonic() - start
+    driver.quit()
+    return elapsed
+
+
+def warm_startup(license_check_time: float) -> float:
+    start = time.monotonic()
+    browser_factory = BrowserFactory()
+    browser_factory.prelaunch()
+    time.sleep(license_check_time)
+    browser_factory.put(browser_factory.acquire())
+    driver = browser_factory.acquire()
+    elapsed = time.monotonic() - start
+    driver.quit()
+    return elapsed
+
+
+def main():
+    license_check_time = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    # the first launch warms the disk cache, so it isn't counted
+    launch_chrome().quit()
+    for name, startup in (('two cold launches', cold_startup), ('prelaunch + reuse', warm_startup)):
+        times = [startup(license_check_time) for _ in range(runs)]
+        print(f'{name:>18}: median {statistics.median(times):6.2f} s | '
+              f'min {min(times):6.2f} s | max {max(times):6.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Runs the registrar's real polling and HTTP registration paths end to end against the stand-in
+student link from benchmarks.fake_student_link, until seats open up in every target section and
+they are all registered for. Reports the checks per second sustained, the CPU time spent per
+check and the peak memory use. The stand-in is served from a separate process so its work isn't
+counted, and the browser is stood in for too, since the HTTP paths only need its session. Run
+from the repository root with:
+
+    python -m benchmarks.bench_end_to_end [max checks per minute] [latency seconds] [failure rate]
+"""
+import contextlib
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Iterator, List, Tuple
+
+# imported ahead of the registrar, like main.py does, since the two import each other
+from core.licensing import cloud_util  # noqa: F401
+from core.licensing.cloud_actions import MembershipLevel
+from core.licensing.cloud_client import CloudResult, CloudResultStatus
+from core.licensing.cloud_outbox import CloudOutbox
+from core.browser import BrowserFactory, get_launch_options
+from core.bu_course import BUCourse, BUCourseSection, CourseSection
+from core.configuration import UserApplicationSettings, PushNotification, CustomerDriver
+from core.registrar import Registrar, RegistrationMode
+from core.semester import Semester, SemesterSeason
+from core.status import Status
+from benchmarks.fake_student_link import FakeStudentLink, FakeSection
+
+try:
+    import resource
+except ImportError:
+    resource = None  # not available on windows
+
+# (college, dept, course code, section, seconds until seats open up)
+TARGET_SECTIONS = [('CAS', 'CS', '111', 'A1', 10), ('CAS', 'CS', '111', 'A2', 12), ('CAS', 'CS', '210', 'A1', 15)]
+
+
+"""
+Stands in for chrome. The HTTP paths only read the session the browser was logged in with, so
+nothing is ever rendered.
+"""
+class StandInDriver:
+    title: str
+    current_url: str
+    cookies: List[dict]
+
+    def __init__(self, current_url: str, cookies: List[dict]):
+        self.title = 'Add Classes - Display'
+        self.current_url = current_url
+        self.cookies = cookies
+
+    def get(self, url: str):
+        self.current_url = url
+
+    def get_cookies(self) -> List[dict]:
+        return self.cookies
+
+    def find_element(self, *args):
+        raise RuntimeError('The stand-in browser has no pages.')
+
+    def close(self):
+        ...
+
+    def quit(self):
+        ...
+
+
+def get_peak_rss() -> float:
+    """
+    :return: the peak resident memory of this process in MiB, or 0 where it can't be measured
+    """
+    if resource is None:
+        return 0
+    # reported in bytes on macOS and in KiB everywhere else
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def serve(latency: float, failure_rate: float, urls: multiprocessing.Queue, stopped: multiprocessing.Event):
+    sections = [FakeSection(college, dept, course_code, section, seats=5, opens_at=opens_at)
+                for college, dept, course_code, section, opens_at in TARGET_SECTIONS]
+    fake_student_link = FakeStudentLink(sections, latency=latency, latency_jitter=latency / 2,
+                                        failure_rate=failure_rate)
+    urls.put((fake_student_link.start(), fake_student_link.get_session_cookie()))
+    stopped.wait()
+    fake_student_link.stop()
+
+
+def create_config() -> UserApplicationSettings:
+    semester = Semester(SemesterSeason.Spring, 2024)
+    target_courses = [BUCourseSection(BUCourse(i, semester, college, dept, course_code), CourseSection(section), True)
+                      for i, (college, dept, course_code, section, _) in enumerate(TARGET_SECTIONS)]
+    notifications = PushNotification(False, False, False, False)
+    return UserApplicationSettings(False, True, False, False, notifications, notifications, False,
+                                   CustomerDriver(False, None), False, target_courses, False, False, None, None)
+
+
+def create_registrar(student_link_url: str, session_cookie: dict, max_checks_per_minute: float,
+                     **kwargs) -> Registrar:
+    """
+    :param student_link_url: the stand-in student link, or where a replayed capture was recorded from
+    :param session_cookie: the cookie the stand-in browser is logged in with
+    :param kwargs: passed on to the registrar, e.g. a traffic capture or replay
+    :return: a registrar logged in over HTTP, whose registrations are reported to nowhere
+    """
+    browse_url = f'{student_link_url}?ModuleName=reg/add/browse_schedule.pl'
+    config = create_config()
+    browser_factory = BrowserFactory()
+    browser_factory.put(StandInDriver(browse_url, [session_cookie]), *get_launch_options(config))
+    registrar = Registrar('stand-in-license', ('stand-in', 'stand-in'), config, 0, MembershipLevel.Full,
+                          registration_mode=RegistrationMode.HTTP, browser_factory=browser_factory,
+                          student_link_url=student_link_url, **kwargs)
+    # registrations are reported to nowhere, the cloud server isn't part of the benchmark
+    registrar.cloud_outbox.stop(0)
+    registrar.cloud_outbox = CloudOutbox(lambda n: CloudResult(CloudResultStatus.SUCCESS))
+    registrar.cloud_outbox.start()
+    registrar.max_requests_per_second_total = max_checks_per_minute
+    registrar.max_requests_per_second_per_course = max_checks_per_minute
+    registrar.session_state.publish(cookies=(session_cookie,), current_url=browse_url, logged_in=True)
+    registrar.http_session.sync_cookies([session_cookie])
+    return registrar
+
+
+def run_registrar(registrar: Registrar) -> Status:
+    """
+    Polls and registers until every target section is registered for, then prints how it went.
+    """
+    rss_before = get_peak_rss()
+    cpu_start, start = time.process_time(), time.monotonic()
+    status = registrar.find_courses()
+    cpu_time, elapsed = time.process_time() - cpu_start, time.monotonic() - start
+
+    registrar.cloud_outbox.stop(1)
+    registrar.http_session.close()
+    if registrar.traffic_capture is not None:
+        registrar.traffic_capture.close()
+    registrar.thread_pool.shutdown(wait=True)
+
+    poll_stats = registrar.get_poll_stats()
+    checks = max(poll_stats.total_checks, 1)
+    print(f'finished with {status.name}, {len(TARGET_SECTIONS) - len(registrar.target_courses)}/'
+          f'{len(TARGET_SECTIONS)} sections registered in {elapsed:6.2f} s')
+    print(f'{poll_stats.total_checks / elapsed:8.1f} checks/s | {poll_stats.total_errors} failed | '
+          f'{cpu_time / checks * 1000:6.3f} ms CPU/check | latency {registrar.stats.get("check_latency")}')
+    if resource is not None:
+        print(f'peak RSS {rss_before:6.1f} MiB before polling, {get_peak_rss():6.1f} MiB after')
+    return status
+
+
+@contextlib.contextmanager
+def stand_in_student_link(latency: float, failure_rate: float) -> Iterator[Tuple[str, dict]]:
+    """
+    Serves the stand-in student link from a separate process until the block exits.
+
+    :return: its url and the cookie that logs a client in
+    """
+    urls, stopped = multiprocessing.Queue(), multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(latency, failure_rate, urls, stopped), daemon=True)
+    server.start()
+    try:
+        yield urls.get(timeout=10)
+    finally:
+        stopped.set()
+        server.join(5)
+
+
+@contextlib.contextmanager
+def scratch_directory(prefix: str) -> Iterator[str]:
+    """
+    Works from a fresh temporary directory until the block exits, since the registrar keeps its
+    notification outbox in the working directory.
+    """
+    working_directory = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix=prefix))
+    try:
+        yield os.getcwd()
+    finally:
+        os.chdir(working_directory)
+
+
+def main():
+    max_checks_per_minute = float(sys.argv[1]) if len(sys.argv) > 1 else 6000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    failure_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    logging.basicConfig(level=logging.WARNING)
+
+    with stand_in_student_link(latency, failure_rate) as (student_link_url, session_cookie), \
+            scratch_directory('bench-end-to-end-'):
+        status = run_registrar(create_registrar(student_link_url, session_cookie, max_checks_per_minute))
+    if status != Status.SUCCESS:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
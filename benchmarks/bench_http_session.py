@@ -0,0 +1,89 @@
+"""
+Compares pooled (keep-alive) and unpooled availability polling against a local stand-in
+for the student link. Run from the repository root with:
+
+    python -m benchmarks.bench_http_session [polls]
+"""
+import concurrent.futures
+import gzip
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+import requests
+
+from core.student_link_session import StudentLinkSession, DEFAULT_HEADERS
+
+PAGE = ('<html><head><title>Add Classes - Display</title></head><body><form name="SelectForm"><table>' +
+        ''.join(f'<tr><td>{i}</td>' + '<td>x</td>' * 10 + '</tr>' for i in range(200)) +
+        '</table></form></body></html>').encode()
+GZIPPED_PAGE = gzip.compress(PAGE)
+POLL_CONCURRENCY = 4  # mirrors core.registrar.POLL_CONCURRENCY
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # required for keep-alive
+    disable_nagle_algorithm = True  # headers and body are written separately
+    connections = 0
+    connections_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StandInHandler.connections_lock:
+            StandInHandler.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(GZIPPED_PAGE)))
+        self.end_headers()
+        self.wfile.write(GZIPPED_PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(name: str, polls: int, poll: Callable[[], requests.Response]):
+    StandInHandler.connections = 0
+    latencies: List[float] = []
+
+    def timed_poll():
+        start = time.perf_counter()
+        res = poll()
+        assert res.content == PAGE, "response body was not decoded"
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=POLL_CONCURRENCY) as pool:
+        for future in [pool.submit(timed_poll) for _ in range(polls)]:
+            future.result()
+    total = time.perf_counter() - start
+
+    print(f'{name:>9}: {polls / total:8.1f} polls/s | '
+          f'mean {statistics.mean(latencies) * 1000:6.2f} ms | '
+          f'p95 {statistics.quantiles(latencies, n=20)[-1] * 1000:6.2f} ms | '
+          f'{StandInHandler.connections} connection(s) opened')
+
+
+def main():
+    polls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/link/bin/uiscgi_studentlink.pl'
+    params = {'ModuleName': 'reg/add/browse_schedule.pl'}
+
+    try:
+        run('unpooled', polls, lambda: requests.get(url, params=params, headers=DEFAULT_HEADERS))
+        session = StudentLinkSession(url, POLL_CONCURRENCY)
+        run('pooled', polls, lambda: session.get(params))
+        session.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Measures what a single availability parse costs, and how it grows with the size of the browse
+page: title extraction, row scanning and registration-string matching, each the way the poller and
+the registration path do them, on generated pages of 10 to 1000 rows and optionally on real pages
+recorded with --capture-file. Reports the time and the peak memory allocated per page. Results can
+be saved and compared against an earlier run to catch parse regressions. Run from the repository
+root with:
+
+    python -m benchmarks.bench_parser_suite [--capture FILE] [--save FILE] [--compare FILE]
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.student_link_pages import browse_schedule_page, department_rows
+from core import student_link_parser
+from core.traffic_capture import load_exchanges
+
+ROW_COUNTS = (10, 30, 100, 300, 1000)
+# timings are repeated this many times, and the fastest is kept as the least disturbed
+REPEATS = 7
+# a measurement slower, or allocating more, than its baseline by more than this fraction is a regression
+REGRESSION_THRESHOLD = 0.10
+# stands in for a target course that isn't listed on the page, which has to be looked up anyway
+MISSING_TARGET = 'CAS CS999 Z9'
+
+
+"""
+A browse page and the target courses looked up on it.
+"""
+class PageFixture:
+    name: str
+    page: str
+    table: student_link_parser.CourseTable
+    targets: List[str]
+
+    def __init__(self, name: str, page: str):
+        self.name = name
+        self.page = page
+        self.table = student_link_parser.parse_course_table(page)
+        assert self.table == student_link_parser.parse_course_table(page, verify=True), \
+            f"fast parser disagrees with BeautifulSoup on '{name}'"
+        rows = self.table.rows
+        # the first, middle and last rows, so matching can't get lucky, and a course that isn't listed
+        self.targets = [rows[0].registration_string, rows[len(rows) // 2].registration_string,
+                        rows[-1].registration_string, MISSING_TARGET] if len(rows) > 0 else [MISSING_TARGET]
+
+
+def extract_title(fixture: PageFixture):
+    assert student_link_parser.parse_title(fixture.page) == 'Add Classes - Display'
+
+
+def scan_rows(fixture: PageFixture):
+    student_link_parser.parse_course_table(fixture.page)
+
+
+def match_targets(fixture: PageFixture):
+    # every target course is harvested from every page, like the poller does
+    for target in fixture.targets:
+        row = fixture.table.find(target)
+        if row is not None:
+            row.has_select_it()
+
+
+def check_availability(fixture: PageFixture):
+    # the whole of one check, as the poll threads run it
+    extract_title(fixture)
+    table = student_link_parser.parse_course_table(fixture.page)
+    for target in fixture.targets:
+        row = table.find(target)
+        if row is not None:
+            row.has_select_it()
+
+
+OPERATIONS: Dict[str, Callable[[PageFixture], None]] = {
+    'title': extract_title,
+    'rows': scan_rows,
+    'match': match_targets,
+    'check': check_availability,
+}
+
+
+def generate_fixtures() -> List[PageFixture]:
+    return [PageFixture(f'{count} rows', browse_schedule_page(department_rows('CAS', 'CS', count)))
+            for count in ROW_COUNTS]
+
+
+def load_captured_fixtures(path: str) -> List[PageFixture]:
+    """
+    :return: every distinct browse page in a capture, in the order they were recorded
+    """
+    fixtures: List[PageFixture] = []
+    seen = set()
+    for exchange in load_exchanges(path):
+        if exchange.body in seen or student_link_parser.parse_title(exchange.body) != 'Add Classes - Display':
+            continue
+        seen.add(exchange.body)
+        fixture = PageFixture(f'captured #{len(fixtures) + 1}', exchange.body)
+        fixture.name += f' ({len(fixture.table.rows)} rows)'
+        fixtures += [fixture]
+    return fixtures
+
+
+def measure_time(operation: Callable[[], None]) -> float:
+    """
+    :return: the fastest CPU seconds per call over the repeats
+    """
+    # CPU time rather than wall time, so other processes being scheduled in don't count
+    timer = timeit.Timer(operation, timer=time.process_time)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=REPEATS, number=number)) / number
+
+
+def reference_workload():
+    # a fixed mix of interpreter and regular expression work, to tell a slower machine from a slower parser
+    text = ' '.join(str(i) for i in range(2000))
+    len(student_link_parser._TAG_RE.findall(f'<td>{text}</td>' * 20))
+
+
+def measure_allocations(operation: Callable[[], None]) -> int:
+    """
+    :return: the peak bytes allocated while the operation ran, over what was allocated before it
+    """
+    operation()  # warms up caches, e.g. compiled regular expressions, so they aren't counted
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - baseline
+
+
+def run(fixtures: List[PageFixture]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results = {}
+    for fixture in fixtures:
+        results[fixture.name] = {}
+        for name, operation in OPERATIONS.items():
+            results[fixture.name][name] = {
+                'seconds': measure_time(lambda: operation(fixture)),
+                'peak_bytes': measure_allocations(lambda: operation(fixture)),
+            }
+    return results
+
+
+def print_results(results: Dict[str, Dict[str, Dict[str, float]]], reference_seconds: float,
+                  baseline: Optional[dict], threshold: float = REGRESSION_THRESHOLD) -> int:
+    """
+    :param baseline: the saved output of an earlier run to compare against, if any
+    :param threshold: the fraction by which a measurement may grow before it counts as a regression
+    :return: the number of regressions against the baseline
+    """
+    # times are compared relative to the reference workload, so a busier or slower machine doesn't
+    # show up as a regression
+    speed = 1 if baseline is None else baseline['reference_seconds'] / reference_seconds
+    regressions = 0
+    width = 22 if baseline is None else 27
+    print(f'{"page":>24} | ' + ' | '.join(f'{name:>{width}}' for name in OPERATIONS))
+    for page_name, page_results in results.items():
+        cells = []
+        for name in OPERATIONS:
+            result = page_results[name]
+            cell = f'{result["seconds"] * 1e6:8.1f} us {result["peak_bytes"] / 1024:7.1f} KiB'
+            baseline_result = None if baseline is None else baseline['results'].get(page_name, {}).get(name)
+            if baseline_result is not None:
+                change = result['seconds'] * speed / baseline_result['seconds'] - 1
+                # allocations don't depend on the machine's load, so they are compared on their own
+                allocations_grew = result['peak_bytes'] > baseline_result['peak_bytes'] * (1 + threshold)
+                if change > threshold or allocations_grew:
+                    regressions += 1
+                cell += f' {change:+4.0%}{"!" if change > threshold or allocations_grew else ""}'
+            cells += [f'{cell:>{width}}']
+        print(f'{page_name:>24} | ' + ' | '.join(cells))
+
+    # how a check grows with the page, the slope should stay linear in the number of rows
+    generated = [(count, results[f'{count} rows']['check']['seconds']) for count in ROW_COUNTS
+                 if f'{count} rows' in results]
+    if len(generated) > 1:
+        per_row = [(seconds - generated[0][1]) / (count - generated[0][0]) for count, seconds in generated[1:]]
+        print(f'check cost per extra row: {statistics.median(per_row) * 1e6:.2f} us')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Student link parser microbenchmarks')
+    parser.add_argument('--capture', default=None, help='also measure the browse pages recorded in this capture')
+    parser.add_argument('--save', default=None, help='write the results to this json file')
+    parser.add_argument('--compare', default=None, help='compare against results saved by an earlier run')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='the fraction by which a measurement may grow before it counts as a regression')
+    args = parser.parse_args()
+
+    fixtures = generate_fixtures()
+    if args.capture is not None:
+        fixtures += load_captured_fixtures(args.capture)
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    reference_seconds = measure_time(reference_workload)
+    results = run(fixtures)
+    regressions = print_results(results, reference_seconds, baseline, args.threshold)
+
+    if args.save is not None:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(),
+                       'reference_seconds': reference_seconds, 'results': results}, file, indent=4)
+    if regressions > 0:
+        print(f'{regressions} measurement(s) regressed by more than {args.threshold:.0%}.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Replays a capture of StudentLink traffic, as recorded with main.py's --capture-file, through the
+registrar's real polling and HTTP registration paths, without any network. Every request is
+answered with the response recorded for it, in the order they were recorded, so a run can be
+repeated exactly, e.g. to profile the parsing and scheduling of a real registration window. The
+capture must be of the benchmark's target sections. If the capture file doesn't exist yet, it is
+first recorded against the stand-in student link, the way bench_end_to_end runs it. Run from the
+repository root with:
+
+    python -m benchmarks.bench_replay [capture file] [max checks per minute] [replay latency, 1 or 0]
+"""
+import logging
+import os
+import sys
+from urllib.parse import urlsplit, urlunsplit
+
+from benchmarks.bench_end_to_end import create_registrar, run_registrar, scratch_directory, \
+    stand_in_student_link
+from core.status import Status
+from core.traffic_capture import TrafficCapture, ReplayAdapter, load_exchanges
+
+# the stand-in browser's session, replayed responses don't depend on it
+REPLAY_COOKIE = {'name': 'PHPSESSID', 'value': 'replayed', 'domain': 'studentlink.example', 'path': '/'}
+
+
+def record(path: str, max_checks_per_minute: float) -> Status:
+    print(f'recording {path} against the stand-in student link')
+    with stand_in_student_link(0.02, 0) as (student_link_url, session_cookie), scratch_directory('bench-replay-'):
+        registrar = create_registrar(student_link_url, session_cookie, max_checks_per_minute,
+                                     traffic_capture=TrafficCapture(path))
+        return run_registrar(registrar)
+
+
+def replay(path: str, max_checks_per_minute: float, replay_latency: bool) -> Status:
+    exchanges = load_exchanges(path)
+    if not exchanges:
+        print(f'{path} has no exchanges to replay')
+        return Status.FAILURE
+    # requests are matched regardless of host, but they are made to the student link the capture was of
+    scheme, netloc, student_link_path, _, _ = urlsplit(exchanges[0].url)
+    student_link_url = urlunsplit((scheme, netloc, student_link_path, '', ''))
+    print(f'replaying {len(exchanges)} exchange(s) of {student_link_url} from {path}')
+    with scratch_directory('bench-replay-'):
+        registrar = create_registrar(student_link_url, REPLAY_COOKIE, max_checks_per_minute,
+                                     traffic_replay=ReplayAdapter(exchanges, replay_latency))
+        return run_registrar(registrar)
+
+
+def main():
+    path = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else 'bench-replay.jsonl.gz')
+    max_checks_per_minute = float(sys.argv[2]) if len(sys.argv) > 2 else 6000
+    replay_latency = sys.argv[3] != '0' if len(sys.argv) > 3 else True
+    logging.basicConfig(level=logging.WARNING)
+
+    if not os.path.exists(path) and record(path, max_checks_per_minute) != Status.SUCCESS:
+        sys.exit(1)
+    if replay(path, max_checks_per_minute, replay_latency) != Status.SUCCESS:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
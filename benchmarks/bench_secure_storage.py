@@ -0,0 +1,60 @@
+"""
+Times secure storage writes before and after caching the derived encryption key. Every write used
+to look up the hardware UUID and run PBKDF2 again, now only the first one does. Runs in a temporary
+directory so the real secure_storage.tt is left alone. Run from the repository root with:
+
+    python -m benchmarks.bench_secure_storage [iterations]
+"""
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+from cryptography.fernet import Fernet
+
+from core import secure_storage_handler
+
+DUO_COOKIES = [{'name': f'cookie{i}', 'value': 'x' * 64, 'domain': '.duosecurity.com', 'path': '/'}
+               for i in range(8)]
+
+
+def save_uncached(data: secure_storage_handler.SecurelyStorageData):
+    # the pre-existing write path, kept as the baseline
+    key = secure_storage_handler._get_encryption_key()
+    fernet = Fernet(base64.urlsafe_b64encode(secure_storage_handler._derive_key(key)))
+    with open("secure_storage.tt", "w") as file:
+        file.write(fernet.encrypt(json.dumps(data.__dict__).encode()).decode())
+
+
+def time_call(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    os.chdir(tempfile.mkdtemp())
+
+    data = secure_storage_handler.SecurelyStorageData()
+    data.license_key = 'BENCHMARK-LICENSE'
+    data.duo_cookies = DUO_COOKIES
+
+    uncached = [time_call(lambda: save_uncached(data)) for _ in range(3)]
+    print(f'{"uncached write":>22}: {min(uncached) * 1e3:9.1f} ms')
+
+    first = time_call(lambda: secure_storage_handler.set_license_key('BENCHMARK-LICENSE'))
+    print(f'{"first cached write":>22}: {first * 1e3:9.1f} ms (derives the key)')
+
+    writes = [time_call(lambda: secure_storage_handler.set_duo_cookies(DUO_COOKIES)) for _ in range(iterations)]
+    print(f'{"later cached writes":>22}: {sorted(writes)[len(writes) // 2] * 1e6:9.1f} us (median)')
+
+    secure_storage_handler.loaded_storage, secure_storage_handler.loaded_stamp = None, None
+    read = time_call(secure_storage_handler.load_encrypted_data)
+    print(f'{"cached read from disk":>22}: {read * 1e6:9.1f} us')
+
+
+if __name__ == '__main__':
+    main()
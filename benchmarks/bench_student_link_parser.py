@@ -0,0 +1,59 @@
+"""
+Compares the fast student link parser against the BeautifulSoup path it replaced on
+representative "Add Classes - Display" pages. Run from the repository root with:
+
+    python -m benchmarks.bench_student_link_parser [iterations]
+"""
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from benchmarks.student_link_pages import browse_schedule_page, department_rows, course_row
+from core import student_link_parser
+
+PAGES = {
+    'single section': browse_schedule_page([course_row('CAS', 'CS', '111', 'A1', 3, '0001190094')]),
+    'one course (8 sections)': browse_schedule_page(department_rows('CAS', 'CS', 8, first_course=111)),
+    'department (200 rows)': browse_schedule_page(department_rows('CAS', 'CS', 200)),
+}
+
+
+def check_with_bs4(page: str, registration_string: str) -> bool:
+    # the pre-existing poller logic, kept verbatim as the baseline
+    parser = BeautifulSoup(page, 'html.parser')
+    assert parser.find('title').text == 'Add Classes - Display'
+    for table_row in parser.find('form').find('table').find_all('tr'):
+        table_columns = table_row.find_all('td')
+        if len(table_columns) < 11 or table_columns[0].text == '':
+            continue
+        if table_columns[2].text.replace('\xa0', ' ') == registration_string:
+            return table_columns[0].select_one(selector="input[name='SelectIt']") is not None
+    return False
+
+
+def check_with_fast_parser(page: str, registration_string: str) -> bool:
+    assert student_link_parser.parse_title(page) == 'Add Classes - Display'
+    row = student_link_parser.parse_course_table(page).find(registration_string)
+    return row is not None and row.has_select_it()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    for name, page in PAGES.items():
+        table = student_link_parser.parse_course_table(page)
+        assert table == student_link_parser.parse_course_table(page, verify=True), \
+            f"fast parser disagrees with BeautifulSoup on '{name}'"
+        # the last row of each page, so every row has to be scanned
+        target = table.rows[-1].registration_string
+        assert check_with_bs4(page, target) == check_with_fast_parser(page, target)
+
+        bs4_time = min(timeit.repeat(lambda: check_with_bs4(page, target), number=iterations, repeat=3))
+        fast_time = min(timeit.repeat(lambda: check_with_fast_parser(page, target), number=iterations, repeat=3))
+        print(f'{name:>24}: bs4 {bs4_time / iterations * 1e6:9.1f} us | '
+              f'fast {fast_time / iterations * 1e6:8.1f} us | '
+              f'speedup {bs4_time / fast_time:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
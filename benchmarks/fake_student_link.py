@@ -0,0 +1,278 @@
+"""
+A local stand-in for StudentLink, built on the standard library, so the registrar can be load
+tested without going anywhere near BU. It serves the browse_schedule.pl course listings, the
+add_planner.pl and confirm_classes.pl registration confirmations, the login page for requests
+without a session, and error pages, with configurable latency, failure rate and the times at which
+seats open up. Run it on its own from the repository root with:
+
+    python -m benchmarks.fake_student_link [port]
+"""
+import random
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.student_link_pages import course_row, browse_schedule_page
+
+STUDENT_LINK_PATH = '/link/bin/uiscgi_studentlink.pl'
+SESSION_COOKIE = 'StudentLinkSession'
+REGISTRATION_MODULES = ('reg/add/confirm_classes.pl', 'reg/plan/add_planner.pl')
+
+LOGIN_PAGE = '''<!DOCTYPE html>
+<html><head><title>Boston University | Login</title></head>
+<body><form method="post" action="/idp/profile/SAML2/Redirect/SSO">
+<input id="j_username" name="j_username" type="text"><input id="j_password" name="j_password" type="password">
+<button class="input-submit" type="submit">Continue</button>
+</form></body></html>
+'''
+
+ERROR_PAGE = '''<HTML><HEAD><TITLE>Error</TITLE></HEAD>
+<BODY><H2>Error</H2><P>{message}</P></BODY></HTML>
+'''
+
+CONFIRMATION_PAGE = '''<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01 Transitional//EN">
+<HTML><HEAD><TITLE>Add Classes - Confirmation</TITLE></HEAD>
+<BODY BGCOLOR="#FFFFFF">
+<TABLE BORDER=0 CELLPADDING=2 CELLSPACING=1 WIDTH="100%">
+<TR ALIGN=center BGCOLOR="#CC0000"><TH>Status</TH><TH>Class</TH><TH>Title</TH><TH>Message</TH></TR>
+<TR ALIGN=center Valign=top>
+<TD><IMG SRC="/link/student/images/{icon}.gif"></TD>
+<TD><FONT SIZE=-1>{name}</FONT></TD>
+<TD><FONT SIZE=-1>Intro Comp Sci</FONT></TD>
+<TD><FONT SIZE=-1>{reason}</FONT></TD>
+</TR>
+</TABLE></BODY></HTML>
+'''
+
+REGISTRATION_PAGE = '''<HTML><HEAD><TITLE>Registration</TITLE></HEAD><BODY>
+<A HREF="uiscgi_studentlink.pl?ModuleName=reg/option/_start.pl">Registration Options</A>
+</BODY></HTML>
+'''
+
+
+"""
+A section listed by the stand-in, and when seats open up in it.
+"""
+class FakeSection:
+    college: str
+    dept: str
+    course_code: str
+    section: str
+    seats: int
+    # seconds after the server starts at which the seats open up, None if they never do
+    opens_at: Optional[float]
+    select_it: str
+
+    def __init__(self, college: str, dept: str, course_code: str, section: str, seats: int = 0,
+                 opens_at: Optional[float] = None, select_it: Optional[str] = None):
+        """
+        :param seats: the number of seats once the section opens up
+        :param opens_at: the seconds after the server starts at which the seats open up, None if never
+        :param select_it: the SelectIt value of the section, generated if not given
+        """
+        self.college = college.upper()
+        self.dept = dept.upper()
+        self.course_code = course_code
+        self.section = section.upper()
+        self.seats = seats
+        self.opens_at = opens_at
+        self.select_it = select_it if select_it is not None else \
+            f'{abs(hash((self.college, self.dept, course_code, self.section))) % 10 ** 10:010d}'
+
+    def get_key(self) -> Tuple[str, str, str, str]:
+        return self.college, self.dept, self.course_code, self.section
+
+    def get_name(self) -> str:
+        return f'{self.college} {self.dept}{self.course_code} {self.section}'
+
+
+"""
+Serves the stand-in StudentLink from a background thread. Every listing starts at the requested
+section and continues through the catalog, like the real browse pages do, so a single check can
+report on several sections.
+"""
+class FakeStudentLink:
+    sections: List[FakeSection]
+    by_key: Dict[Tuple[str, str, str, str], int]
+    latency: float
+    latency_jitter: float
+    failure_rate: float
+    listing_rows: int
+    session_id: str
+    random: random.Random
+    start_time: float
+    lock: threading.Lock
+    # requests served, by module name, plus 'login' and 'failure'
+    request_counts: Dict[str, int]
+    registered: List[str]
+    server: Optional[ThreadingHTTPServer]
+
+    def __init__(self, sections: List[FakeSection], latency: float = 0, latency_jitter: float = 0,
+                 failure_rate: float = 0, listing_rows: int = 40, filler_sections: int = 400,
+                 session_id: str = 'stand-in-session', seed: int = 0):
+        """
+        :param sections: the sections of interest, the catalog is padded out with closed sections
+        :param latency: the seconds every response is held back for
+        :param latency_jitter: up to this many more seconds are added to the latency, at random
+        :param failure_rate: the fraction of requests answered with a server error
+        :param listing_rows: the number of sections listed on every browse page
+        :param filler_sections: the number of closed sections the catalog is padded out with
+        :param session_id: the value of the session cookie requests must carry to be logged in
+        """
+        filler = [FakeSection('CAS', 'XX', str(100 + i // 8), f'A{i % 8 + 1}') for i in range(filler_sections)]
+        self.sections = sorted(sections + filler, key=lambda s: s.get_key())
+        self.by_key = {section.get_key(): i for i, section in enumerate(self.sections)}
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self.listing_rows = listing_rows
+        self.session_id = session_id
+        self.random = random.Random(seed)
+        self.start_time = time.monotonic()
+        self.lock = threading.Lock()
+        self.request_counts = {}
+        self.registered = []
+        self.server = None
+
+    def start(self, port: int = 0) -> str:
+        """
+        :param port: the port to listen on, 0 picks a free one
+        :return: the url of the stand-in student link
+        """
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self.__create_handler())
+        self.server.daemon_threads = True
+        self.start_time = time.monotonic()
+        threading.Thread(target=self.server.serve_forever, name='FakeStudentLink', daemon=True).start()
+        return self.get_url()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def get_url(self) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}{STUDENT_LINK_PATH}'
+
+    def get_session_cookie(self) -> dict:
+        """
+        :return: the cookie that logs a client in, in the form selenium reports cookies
+        """
+        return {'name': SESSION_COOKIE, 'value': self.session_id, 'domain': '127.0.0.1', 'path': '/'}
+
+    def get_request_count(self, kind: str) -> int:
+        with self.lock:
+            return self.request_counts.get(kind, 0)
+
+    def is_open(self, section: FakeSection) -> bool:
+        return section.seats > 0 and section.opens_at is not None and \
+            time.monotonic() - self.start_time >= section.opens_at
+
+    def respond(self, query: Dict[str, str], cookies: Dict[str, str]) -> Tuple[int, str]:
+        """
+        :return: the status code and page to answer a request with
+        """
+        module = query.get('ModuleName', '')
+        if cookies.get(SESSION_COOKIE) != self.session_id:
+            self.__count('login')
+            return 200, LOGIN_PAGE
+        with self.lock:
+            failed = self.random.random() < self.failure_rate
+        if failed:
+            self.__count('failure')
+            return 503, ERROR_PAGE.format(message='The service is temporarily unavailable.')
+
+        self.__count(module)
+        if module.endswith('browse_schedule.pl'):
+            return self.__browse(query)
+        elif module in REGISTRATION_MODULES and 'SelectIt' in query:
+            return self.__register(query)
+        elif module == 'regsched.pl':
+            return 200, REGISTRATION_PAGE
+        return 200, ERROR_PAGE.format(message=f'Unknown module {module}.')
+
+    def __browse(self, query: Dict[str, str]) -> Tuple[int, str]:
+        key = (query.get('College', ''), query.get('Dept', ''), query.get('Course', ''), query.get('Section', ''))
+        start = self.by_key.get(key)
+        if start is None:
+            # listings start at the section that would come next
+            start = sum(1 for section in self.sections if section.get_key() < key)
+        rows = []
+        for section in self.sections[start:start + self.listing_rows]:
+            is_open = self.is_open(section)
+            rows += [course_row(section.college, section.dept, section.course_code, section.section,
+                                section.seats if is_open else 0, section.select_it if is_open else None)]
+        return 200, browse_schedule_page(rows)
+
+    def __register(self, query: Dict[str, str]) -> Tuple[int, str]:
+        key = (query.get('College', ''), query.get('Dept', ''), query.get('Course', ''), query.get('Section', ''))
+        index = self.by_key.get(key)
+        section = None if index is None else self.sections[index]
+        if section is None or section.select_it != query['SelectIt']:
+            return 200, ERROR_PAGE.format(message='Invalid selection.')
+
+        with self.lock:
+            if self.is_open(section):
+                section.seats -= 1
+                self.registered += [section.get_name()]
+                icon, reason = 'checkmark', ''
+            else:
+                icon, reason = 'xmark', 'Class Full'
+        return 200, CONFIRMATION_PAGE.format(icon=icon, name=section.get_name().replace(' ', '&nbsp;'),
+                                             reason=reason)
+
+    def __count(self, kind: str):
+        with self.lock:
+            self.request_counts[kind] = self.request_counts.get(kind, 0) + 1
+
+    def __create_handler(self):
+        fake_student_link = self
+
+        class FakeStudentLinkHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # required for keep-alive
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != STUDENT_LINK_PATH:
+                    self.send_error(404)
+                    return
+                query = {key: values[0] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+                cookies = {name: morsel.value for name, morsel in SimpleCookie(self.headers.get('Cookie', '')).items()}
+
+                delay = fake_student_link.latency + fake_student_link.latency_jitter * random.random()
+                if delay > 0:
+                    time.sleep(delay)
+                status, page = fake_student_link.respond(query, cookies)
+
+                body = page.encode('latin-1')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=ISO-8859-1')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return FakeStudentLinkHandler
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    fake_student_link = FakeStudentLink([FakeSection('CAS', 'CS', '111', 'A1', seats=5, opens_at=30)],
+                                        latency=0.05, latency_jitter=0.05)
+    print(f'Serving a stand-in student link at {fake_student_link.start(port)}')
+    print(f'Log in by sending the cookie {SESSION_COOKIE}={fake_student_link.session_id}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake_student_link.stop()
+
+
+if __name__ == '__main__':
+    main()
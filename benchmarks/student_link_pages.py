@@ -0,0 +1,80 @@
+"""
+Generators for realistic student link "Add Classes - Display" pages, modeled on the markup
+StudentLink serves from reg/add/browse_schedule.pl (upper-case attributes, &nbsp; separated
+course names, a SelectIt checkbox for every registrable section).
+"""
+from typing import List, Optional
+
+HEADER = '''<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01 Transitional//EN">
+<HTML>
+<HEAD>
+<TITLE>Add Classes - Display</TITLE>
+<META HTTP-EQUIV="Pragma" CONTENT="no-cache">
+<LINK REL="stylesheet" TYPE="text/css" HREF="https://www.bu.edu/link/student/css/studentlink.css">
+<SCRIPT LANGUAGE="JavaScript">
+<!--
+function ValidateForm() { return true; }
+// -->
+</SCRIPT>
+</HEAD>
+<BODY BGCOLOR="#FFFFFF" LEFTMARGIN=0 TOPMARGIN=0>
+<TABLE WIDTH="100%" BORDER=0 CELLPADDING=0 CELLSPACING=0>
+<TR><TD><A HREF="uiscgi_studentlink.pl?ModuleName=regsched.pl"><IMG SRC="https://www.bu.edu/link/student/images/header_logoff.gif" BORDER=0></A></TD></TR>
+</TABLE>
+<FORM NAME="SelectForm" METHOD="GET" ACTION="uiscgi_studentlink.pl">
+<TABLE BORDER=0 CELLPADDING=2 CELLSPACING=1 WIDTH="100%">
+<TR ALIGN=center BGCOLOR="#CC0000">
+<TH>&nbsp;</TH><TH>Class</TH><TH>Title<BR>Instructor</TH><TH>Open<BR>Seats</TH><TH>Cr Hrs</TH>
+<TH>Type</TH><TH>Building</TH><TH>Room</TH><TH>Day</TH><TH>Start</TH><TH>Stop</TH><TH>Notes</TH>
+</TR>
+'''
+
+FOOTER = '''</TABLE>
+<INPUT TYPE="button" VALUE="Add Classes to Schedule" ONCLICK="ValidateForm()">
+<INPUT TYPE="hidden" NAME="ModuleName" VALUE="reg/add/confirm_classes.pl">
+</FORM>
+</BODY>
+</HTML>
+'''
+
+
+def course_row(college: str, dept: str, course_code: str, section: str, open_seats: int,
+               select_it: Optional[str]) -> str:
+    checkbox = f'<INPUT TYPE="checkbox" NAME="SelectIt" VALUE="{select_it}">' if select_it is not None \
+        else '<IMG SRC="https://www.bu.edu/link/student/images/blocked.gif" ALT="Blocked">'
+    return (f'<TR ALIGN=center Valign=top>\n'
+            f'<TD>{checkbox}&nbsp;</TD>\n'
+            f'<TD><FONT SIZE=-1><A HREF="uiscgi_studentlink.pl?ModuleName=univschr.pl&amp;SearchOptionDesc=Class'
+            f'&amp;College={college}&amp;Dept={dept}&amp;Course={course_code}">'
+            f'{college}&nbsp;{dept}{course_code}&nbsp;{section}</A></FONT></TD>\n'
+            f'<TD><FONT SIZE=-1>{college}&nbsp;{dept}{course_code}&nbsp;{section}</FONT></TD>\n'
+            f'<TD ALIGN=left><FONT SIZE=-1>Intro Comp Sci<BR>Staff</FONT></TD>\n'
+            f'<TD><FONT SIZE=-1>{open_seats}</FONT></TD>\n'
+            f'<TD><FONT SIZE=-1>4.0</FONT></TD>\n'
+            f'<TD><FONT SIZE=-1>Lecture</FONT></TD>\n'
+            f'<TD><FONT SIZE=-1>CAS</FONT></TD>\n'
+            f'<TD><FONT SIZE=-1>B12</FONT></TD>\n'
+            f'<TD><FONT SIZE=-1>Mon,Wed</FONT></TD>\n'
+            f'<TD><FONT SIZE=-1>10:10am</FONT></TD>\n'
+            f'<TD><FONT SIZE=-1>11:25am</FONT></TD>\n'
+            f'<TD><FONT SIZE=-1>{"" if open_seats > 0 else "Class Full"}</FONT></TD>\n'
+            f'</TR>\n')
+
+
+def department_rows(college: str, dept: str, count: int, first_course: int = 100,
+                    sections_per_course: int = 8) -> List[str]:
+    """
+    :return: count course rows of a department-wide listing, every third section being open
+    """
+    rows = []
+    for i in range(count):
+        course_code = str(first_course + i // sections_per_course)
+        section = 'A' + str(i % sections_per_course + 1)
+        is_open = i % 3 == 0
+        rows += [course_row(college, dept, course_code, section, 5 if is_open else 0,
+                            f'{1190000 + i:010d}' if is_open else None)]
+    return rows
+
+
+def browse_schedule_page(rows: List[str]) -> str:
+    return HEADER + ''.join(rows) + FOOTER
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from typing import List, Optional, Mapping
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:
+    aiohttp = None
+
+from core.student_link_session import DEFAULT_HEADERS
+
+"""
+A response read in full, so it can be used after its connection has gone back to the pool. The
+attributes are named after those of a requests response.
+"""
+class AsyncResponse:
+    status_code: int
+    headers: Mapping[str, str]
+    text: str
+
+    def __init__(self, status_code: int, headers: Mapping[str, str], text: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+
+"""
+The asyncio counterpart of StudentLinkSession. A single aiohttp session with a keep-alive
+connection pool is shared by every in-flight check, so hundreds of availability checks can
+be awaited concurrently from one event loop without a thread per check.
+"""
+class AsyncStudentLinkSession:
+    base_url: str
+    pool_size: int
+    timeout: float
+    session: Optional['aiohttp.ClientSession']
+    cookies: List[dict]
+
+    def __init__(self, base_url: str, pool_size: int, timeout: float = 15):
+        """
+        :param base_url: the student link url all requests are sent to
+        :param pool_size: the max number of concurrently open connections
+        :param timeout: the total timeout in seconds for every request
+        """
+        if aiohttp is None:
+            raise ImportError("The async poll mode requires the 'aiohttp' package. Install it with "
+                              "'pip install aiohttp' or use the threaded poll mode instead.")
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = None
+        self.cookies = []
+
+    def __get_session(self) -> 'aiohttp.ClientSession':
+        # aiohttp sessions are bound to the running loop, so they can only be created lazily
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                cookie_jar=aiohttp.CookieJar(unsafe=True),
+                headers={key: value for key, value in DEFAULT_HEADERS.items() if key != 'Connection'},
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self.__load_cookies()
+        return self.session
+
+    def __load_cookies(self):
+        if self.session is None:
+            return
+        self.session.cookie_jar.clear()
+        self.session.cookie_jar.update_cookies({cookie['name']: cookie['value'] for cookie in self.cookies},
+                                               response_url=URL(self.base_url))
+
+    def sync_cookies(self, cookies: List[dict]):
+        """
+        Replaces the session's cookies with the cookies exported by the browser.
+
+        :param cookies: the cookies as returned by selenium's get_cookies()
+        """
+        self.cookies = list(cookies)
+        self.__load_cookies()
+        logging.debug(f"Synced {len(cookies)} browser cookie(s) into the async HTTP session.")
+
+    async def get(self, params: dict) -> AsyncResponse:
+        async with self.__get_session().get(self.base_url, params=params) as response:
+            return AsyncResponse(response.status, response.headers, await response.text())
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+            # give the connector a moment to close its transports (see aiohttp's graceful shutdown docs)
+            await asyncio.sleep(0)
@@ -0,0 +1,260 @@
+import concurrent.futures
+import logging
+import threading
+import time
+from enum import Enum
+from typing import List, Optional, Callable, Dict, Tuple
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.webdriver import WebDriver
+
+from core import util, secure_storage_handler
+from core.configuration import UserApplicationSettings
+
+
+def launch_chrome(debug_mode: bool = False, driver_path: Optional[str] = None) -> WebDriver:
+    """
+    :param debug_mode: whether to show the browser window rather than running headless
+    :param driver_path: the path to a custom chromedriver, or None to let selenium find one
+    """
+    options = util.get_chrome_options(debug_mode)
+    service = Service(executable_path=driver_path) if driver_path is not None else Service()
+    logging.debug(f"Initializing chrome driver with service_url={service.service_url} path={service.path}...")
+    driver = webdriver.Chrome(options=options, service=service)
+    driver.set_page_load_timeout(30)
+    return driver
+
+
+"""
+Hands out chrome instances, keeping at most one warm browser on the side. A browser can be
+launched ahead of time on a background thread (e.g. while the license check is in flight),
+and a browser that was launched only to check that the drivers work can be put back for the
+registrar to use, so we only pay for one cold chrome start on the way to logging in.
+"""
+class BrowserFactory:
+    lock: threading.Lock
+    # the warm browser, possibly still launching, and the (debug mode, driver path) it was launched with
+    warm_browser: Optional[concurrent.futures.Future]
+    warm_options: Optional[Tuple[bool, Optional[str]]]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.warm_browser = None
+        self.warm_options = None
+
+    def prelaunch(self, debug_mode: bool = False, driver_path: Optional[str] = None) -> concurrent.futures.Future:
+        """
+        Starts launching a browser on a background thread. Any launch error is raised by acquire.
+
+        :return: resolves once the browser is launched
+        """
+        future = concurrent.futures.Future()
+
+        def launch_task():
+            try:
+                future.set_result(launch_chrome(debug_mode, driver_path))
+            except BaseException as e:
+                future.set_exception(e)
+
+        self.__set_warm(future, (debug_mode, driver_path))
+        threading.Thread(target=launch_task, name='BrowserPrelaunch', daemon=True).start()
+        return future
+
+    def acquire(self, debug_mode: bool = False, driver_path: Optional[str] = None) -> WebDriver:
+        """
+        :return: the warm browser if it was launched with the same options, waiting for it if it is
+                 still launching, otherwise a newly launched browser
+        """
+        with self.lock:
+            warm_browser, warm_options = self.warm_browser, self.warm_options
+            self.warm_browser, self.warm_options = None, None
+
+        if warm_browser is not None:
+            if warm_options == (debug_mode, driver_path):
+                wait_start = time.monotonic()
+                driver = warm_browser.result()
+                logging.debug(f"Reusing the warm browser (waited {round(time.monotonic() - wait_start, 2)} seconds "
+                              f"for it).")
+                return driver
+            logging.debug("The warm browser was launched with different options. Launching a new one...")
+            self.__discard(warm_browser)
+        return launch_chrome(debug_mode, driver_path)
+
+    def put(self, driver: WebDriver, debug_mode: bool = False, driver_path: Optional[str] = None):
+        """
+        Keeps a launched browser warm for the next acquire with the same options.
+        """
+        future = concurrent.futures.Future()
+        future.set_result(driver)
+        self.__set_warm(future, (debug_mode, driver_path))
+
+    def close(self):
+        """
+        Quits the warm browser, if any. Browsers that were handed out are left alone.
+        """
+        with self.lock:
+            warm_browser = self.warm_browser
+            self.warm_browser, self.warm_options = None, None
+        if warm_browser is not None:
+            self.__discard(warm_browser)
+
+    def __set_warm(self, future: concurrent.futures.Future, options: Tuple[bool, Optional[str]]):
+        with self.lock:
+            previous = self.warm_browser
+            self.warm_browser, self.warm_options = future, options
+        if previous is not None:
+            self.__discard(previous)
+
+    @staticmethod
+    def __discard(warm_browser: concurrent.futures.Future):
+        def quit_browser(future: concurrent.futures.Future):
+            if future.exception() is None:
+                try:
+                    future.result().quit()
+                except Exception:
+                    # do nothing
+                    ...
+
+        # quits the browser once it is done launching, without waiting for it
+        warm_browser.add_done_callback(quit_browser)
+
+
+def get_launch_options(config: UserApplicationSettings) -> Tuple[bool, Optional[str]]:
+    """
+    :return: the (debug mode, driver path) the config asks browsers to be launched with
+    """
+    return config.debug_mode, config.custom_driver.driver_path if config.custom_driver.enabled else None
+
+
+class BrowserLifecycle(Enum):
+    PERSISTENT = 1  # chrome stays open for the whole run
+    ON_DEMAND = 2  # chrome is closed while idle and relaunched from the saved session when it is needed again
+
+
+"""
+Owns the registrar's chrome instance. Once logged in, the student link is polled over HTTP and
+chrome is only needed to log back in and to register, so in the on demand lifecycle the browser
+is closed after sitting idle for a while. Its cookies and url are saved first and restored when
+it is relaunched, so the relaunched browser picks up the same student link session.
+"""
+class BrowserManager:
+    config: UserApplicationSettings
+    lifecycle: BrowserLifecycle
+    idle_timeout: float
+    driver: Optional[WebDriver]
+    last_used: float
+    saved_cookies: List[dict]
+    saved_url: Optional[str]
+    # supplies cookies that may be fresher than the saved ones, e.g. those updated by the HTTP session
+    cookie_overrides: Optional[Callable[[], List[dict]]]
+    factory: BrowserFactory
+    # seconds taken by every launch, the first one included
+    launch_times: List[float]
+
+    def __init__(self, config: UserApplicationSettings, lifecycle: BrowserLifecycle = BrowserLifecycle.PERSISTENT,
+                 idle_timeout: float = 120, cookie_overrides: Optional[Callable[[], List[dict]]] = None,
+                 factory: Optional[BrowserFactory] = None):
+        """
+        :param config: the program config
+        :param lifecycle: whether chrome stays open or is closed while idle
+        :param idle_timeout: the number of seconds chrome may sit unused before it is closed, if on demand
+        :param cookie_overrides: returns cookies to restore on top of the saved ones when relaunching
+        :param factory: where browsers are launched from, so a warm browser can be reused
+        """
+        self.config = config
+        self.lifecycle = lifecycle
+        self.idle_timeout = idle_timeout
+        self.driver = None
+        self.last_used = time.monotonic()
+        self.saved_cookies = []
+        self.saved_url = None
+        self.cookie_overrides = cookie_overrides
+        self.factory = factory if factory is not None else BrowserFactory()
+        self.launch_times = []
+
+    def get_driver(self) -> WebDriver:
+        """
+        :return: the browser, launching it first if it isn't running
+        """
+        if self.driver is None:
+            self.__launch()
+        self.last_used = time.monotonic()
+        return self.driver
+
+    def is_running(self) -> bool:
+        return self.driver is not None
+
+    def get_idle_time(self) -> float:
+        return time.monotonic() - self.last_used
+
+    def release_if_idle(self) -> bool:
+        """
+        Closes the browser if it has sat unused for longer than the idle timeout. Does nothing
+        in the persistent lifecycle.
+
+        :return: whether the browser was closed
+        """
+        if self.lifecycle != BrowserLifecycle.ON_DEMAND or self.driver is None:
+            return False
+        idle_time = self.get_idle_time()
+        if idle_time < self.idle_timeout:
+            return False
+        logging.info(f'Closing the browser after {round(idle_time)} seconds of inactivity '
+                     f'(idle timeout is {self.idle_timeout} seconds)...')
+        self.release()
+        return True
+
+    def release(self):
+        """
+        Saves the browser's session and closes it. It is relaunched the next time it is needed.
+        """
+        if self.driver is None:
+            return
+        try:
+            self.saved_cookies = util.get_all_cookies(self.driver)
+            self.saved_url = self.driver.current_url
+        except Exception:
+            logging.warning('Unable to save the browser session before closing it. The browser will have to log '
+                            'back in when it is relaunched.')
+        self.quit()
+
+    def quit(self):
+        if self.driver is None:
+            return
+        try:
+            self.driver.quit()
+        except Exception:
+            # do nothing
+            ...
+        self.driver = None
+
+    def __launch(self):
+        launch_start = time.monotonic()
+        driver = self.factory.acquire(*get_launch_options(self.config))
+
+        is_relaunch = len(self.launch_times) > 0
+        if is_relaunch and (len(self.saved_cookies) > 0 or self.cookie_overrides is not None):
+            logging.debug("Restoring the saved browser session...")
+            util.load_cookies_chrome(driver, self.__get_cookies_to_restore())
+            if self.saved_url is not None:
+                driver.get(self.saved_url)
+        elif self.config.save_duo_cookies and secure_storage_handler.has_duo_cookies():
+            logging.info("Loading Duo cookies from secure local storage...")
+            util.load_cookies_chrome(driver, secure_storage_handler.get_duo_cookies())
+
+        self.driver = driver
+        launch_time = time.monotonic() - launch_start
+        self.launch_times += [launch_time]
+        if is_relaunch:
+            logging.info(f"Relaunched the browser in {round(launch_time, 2)} seconds.")
+        else:
+            logging.debug(f"Browser initialized in {round(launch_time, 2)} seconds!")
+
+    def __get_cookies_to_restore(self) -> List[dict]:
+        cookies: Dict[Tuple[str, str, str], dict] = {}
+        overrides = self.cookie_overrides() if self.cookie_overrides is not None else []
+        for cookie in self.saved_cookies + overrides:
+            # later cookies replace earlier ones with the same name, domain and path
+            cookies[(cookie['name'], cookie.get('domain', ''), cookie.get('path', '/'))] = dict(cookie)
+        return list(cookies.values())
@@ -1,11 +1,10 @@
 import base64
 import json
-import logging
+import re
 from enum import Enum
-from typing import List, Set, Union
+from typing import List, Set, Union, Optional, Dict, Tuple, Type
 from cryptography.exceptions import InvalidSignature
 
-import requests
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
 
@@ -16,6 +15,74 @@ BASE_URL = "http://localhost:8080/api/app/v1"
 loaded_key: Union[Ed25519PublicKey, None] = None
 
 
+JSON_DECODER = json.JSONDecoder()
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# the characters that open and close objects, arrays and strings
+JSON_STRUCTURE = re.compile(r'[{}\[\]"]')
+JSON_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+
+
+def find_json_members(document: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Finds where each value of a json object is in the document, without decoding the values. Objects
+    and arrays are only scanned for their closing bracket, so they are skipped over without being built.
+
+    :param document: the json object
+    :return: the start and end index of every key's value in the document
+    """
+    members = {}
+    index = JSON_WHITESPACE.match(document, 0).end()
+    if document[index:index + 1] != '{':
+        raise ValueError('The document is not a json object.')
+    index = JSON_WHITESPACE.match(document, index + 1).end()
+    if document[index:index + 1] == '}':
+        return members
+
+    while True:
+        if document[index:index + 1] != '"':
+            raise ValueError(f'Expected a key at index {index}.')
+        key, index = json.decoder.scanstring(document, index + 1)
+        index = JSON_WHITESPACE.match(document, index).end()
+        if document[index:index + 1] != ':':
+            raise ValueError(f"Expected ':' at index {index}.")
+        value_start = JSON_WHITESPACE.match(document, index + 1).end()
+        index = skip_json_value(document, value_start)
+        members[key] = (value_start, index)
+
+        index = JSON_WHITESPACE.match(document, index).end()
+        if document[index:index + 1] == '}':
+            return members
+        if document[index:index + 1] != ',':
+            raise ValueError(f"Expected ',' or '}}' at index {index}.")
+        index = JSON_WHITESPACE.match(document, index + 1).end()
+
+
+def skip_json_value(document: str, index: int) -> int:
+    """
+    :return: the index right after the json value starting at the index. Objects and arrays are only
+             checked for balanced brackets, their contents are validated when they are decoded
+    """
+    if document[index:index + 1] not in ('{', '['):
+        # a scalar, which is cheap to decode
+        return JSON_DECODER.raw_decode(document, index)[1]
+    depth = 0
+    while True:
+        match = JSON_STRUCTURE.search(document, index)
+        if match is None:
+            raise ValueError('Unterminated json object or array.')
+        token = match.group()
+        if token == '"':
+            string_end = JSON_STRING.match(document, match.start())
+            if string_end is None:
+                raise ValueError(f'Unterminated string at index {match.start()}.')
+            index = string_end.end()
+            continue
+        depth += 1 if token in ('{', '[') else -1
+        index = match.end()
+        if depth == 0:
+            return index
+
+
 def get_public_key():
     global loaded_key
     if loaded_key is not None:
@@ -92,18 +159,33 @@ class StatusResponse(SignableMessage):
 class ApplicationStartPermission(SignableMessage):
     kerberos_username: str
     membership_level: MembershipLevel
-    app_settings: UserApplicationSettings
     session_id: int
     response_timestamp: int
-
-    def __init__(self, kerberos_username: str, membership_level: MembershipLevel, app_settings: UserApplicationSettings,
-                 session_id: int, response_timestamp: int):
+    # the settings are the bulk of the message, so they are only decoded once they are used
+    decoded_app_settings: Optional[UserApplicationSettings]
+    app_settings_json: Optional[dict]
+
+    def __init__(self, kerberos_username: str, membership_level: MembershipLevel,
+                 app_settings: Optional[UserApplicationSettings], session_id: int, response_timestamp: int,
+                 app_settings_json: Optional[dict] = None):
+        """
+        :param app_settings: the settings, or None to decode them from app_settings_json when first used
+        :param app_settings_json: the settings as a json object
+        """
         self.kerberos_username = kerberos_username
         self.membership_level = membership_level
-        self.app_settings = app_settings
+        self.decoded_app_settings = app_settings
+        self.app_settings_json = app_settings_json
         self.session_id = session_id
         self.response_timestamp = response_timestamp
 
+    @property
+    def app_settings(self) -> UserApplicationSettings:
+        if self.decoded_app_settings is None:
+            self.decoded_app_settings = UserApplicationSettings.from_json(self.app_settings_json)
+            self.app_settings_json = None
+        return self.decoded_app_settings
+
     def get_verification_string(self) -> str:
         return self.json_serialize()
 
@@ -119,9 +201,10 @@ class ApplicationStartPermission(SignableMessage):
         return ApplicationStartPermission(
             json_obj['kerberos_username'],
             MembershipLevel[json_obj['membership_level']],
-            UserApplicationSettings.from_json(json_obj['user_app_settings']),
+            None,
             json_obj['session_id'],
-            json_obj['response_timestamp']
+            json_obj['response_timestamp'],
+            app_settings_json=json_obj['user_app_settings']
         )
 
     def __json__(self):
@@ -166,6 +249,47 @@ class SignedDataResponse(SignedMessage):
         return f"SignedApplicationStartPermission(data={self.data}, signature={self.signature})"
 
 
+"""
+A signed response as the server sent it. The signature is checked over the exact bytes the server
+signed, rather than over a re-serialization of the decoded data, and the data is only turned into
+a message once the signature checks out.
+"""
+class SignedRawResponse(SignedMessage):
+    raw_data: bytes
+
+    def __init__(self, signature: str, raw_data: bytes):
+        """
+        :param signature: the base64 signature
+        :param raw_data: the signed json document, byte for byte
+        """
+        super().__init__(signature)
+        self.raw_data = raw_data
+
+    @staticmethod
+    def from_body(body: bytes) -> 'SignedRawResponse':
+        """
+        :param body: a response body of the form {"signature": ..., "data": {...}}. Only the signature
+                     is decoded, the data is located but left as it is until it has been verified
+        """
+        document = body.decode('utf-8')
+        members = find_json_members(document)
+        signature_start, signature_end = members['signature']
+        signature = json.loads(document[signature_start:signature_end])
+        data_start, data_end = members['data']
+        if not isinstance(signature, str):
+            raise ValueError('The signature is not a string.')
+        return SignedRawResponse(signature, document[data_start:data_end].encode('utf-8'))
+
+    def verify_signature(self) -> bool:
+        return self.verify_signature_for(self.raw_data)
+
+    def decode(self, response_type: Type[SignableMessage]) -> SignableMessage:
+        """
+        Decodes the data, which should only be done once the signature checks out.
+        """
+        return response_type.from_json(json.loads(self.raw_data))
+
+
 class SendableCloudMessage:
     path: str = None
 
@@ -176,31 +300,11 @@ class SendableCloudMessage:
         return BASE_URL + self.path
 
     def json_serialize(self):
-        return json.dumps(self, default=lambda o: o.__json__(), indent=4)
+        return json.dumps(self, default=lambda o: o.__json__(), separators=(',', ':'))
 
     def __json__(self):
         ...
 
-    def send_and_get_response(self) -> Union[None, dict]:
-        serialized_json_body = self.json_serialize()
-        try:
-            response = requests.post(self.get_url(), data=serialized_json_body, headers={
-                "Content-Type": "application/json",
-                "User-Agent": "Turbo-Terrier-Client"
-            })
-        except Exception as e:
-            logging.critical("Unable to connect to the cloud server! Is your internet connection working? If this "
-                             "issue persists, please contact the developer.")
-            logging.debug(e)
-            exit(1)
-
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 401:
-            return None
-        else:
-            raise ConnectionError(response.text)
-
 
 class DeviceMeta:
     core_count: int
@@ -283,18 +387,52 @@ class ApplicationStop(SendableCloudMessage):
 class SessionPing(SendableCloudMessage):
     license_key: str
     session_id: int
+    request_rate: float
+    latency_p50: float
+    latency_p95: float
+    latency_p99: float
+    recent_errors: int
+    total_checks: int
+    total_errors: int
     timestamp: int
 
-    def __init__(self, license_key: str, session_id: int, timestamp: int):
+    def __init__(self, license_key: str, session_id: int, timestamp: int, request_rate: float = 0,
+                 latency_p50: float = 0, latency_p95: float = 0, latency_p99: float = 0, recent_errors: int = 0,
+                 total_checks: int = 0, total_errors: int = 0):
+        """
+        The live statistics on the availability checks are all zeros if polling hasn't started.
+
+        :param request_rate: the number of checks per minute, over the last minute
+        :param latency_p50: the median seconds a recent check's request took
+        :param latency_p95: the 95th percentile seconds a recent check's request took
+        :param latency_p99: the 99th percentile seconds a recent check's request took
+        :param recent_errors: the number of checks that failed over the last minute
+        :param total_checks: the number of checks since polling started
+        :param total_errors: the number of checks that failed since polling started
+        """
         super().__init__("/ping")
         self.license_key = license_key
         self.session_id = session_id
+        self.request_rate = request_rate
+        self.latency_p50 = latency_p50
+        self.latency_p95 = latency_p95
+        self.latency_p99 = latency_p99
+        self.recent_errors = recent_errors
+        self.total_checks = total_checks
+        self.total_errors = total_errors
         self.timestamp = timestamp
 
     def __json__(self):
         return {
             "license_key": self.license_key,
             "session_id": self.session_id,
+            "request_rate": self.request_rate,
+            "latency_p50": self.latency_p50,
+            "latency_p95": self.latency_p95,
+            "latency_p99": self.latency_p99,
+            "recent_errors": self.recent_errors,
+            "total_checks": self.total_checks,
+            "total_errors": self.total_errors,
             "timestamp": self.timestamp
         }
 
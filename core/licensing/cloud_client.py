@@ -0,0 +1,174 @@
+import logging
+import random
+import time
+from enum import Enum
+from typing import Type, Any, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.licensing.cloud_actions import SendableCloudMessage, SignableMessage, SignedRawResponse, BASE_URL
+
+CLOUD_HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "Turbo-Terrier-Client"
+}
+
+
+class CloudResultStatus(Enum):
+    SUCCESS = 1  # the server answered, and the response checked out
+    UNAUTHORIZED = 2  # the server doesn't know the license key
+    SERVER_ERROR = 3  # the server answered with an unexpected status code or body
+    UNREACHABLE = 4  # the server couldn't be reached before the deadline
+    INVALID_SIGNATURE = 5  # the response wasn't signed by the server, it may have been tampered with
+    INVALID_TIMESTAMP = 6  # the response predates the request, is the system time correct?
+
+
+"""
+The outcome of a request to the cloud server. Failures are reported here rather than raised, so
+the caller decides whether they matter (e.g. a missed ping shouldn't stop a registration).
+"""
+class CloudResult:
+    status: CloudResultStatus
+    data: Any
+    reason: str
+    attempts: int
+
+    def __init__(self, status: CloudResultStatus, data: Any = None, reason: str = '', attempts: int = 1):
+        """
+        :param status: whether the request succeeded, and if not, why
+        :param data: the response, parsed if a response type was given
+        :param reason: a description of the failure, if any
+        :param attempts: the number of times the request was sent
+        """
+        self.status = status
+        self.data = data
+        self.reason = reason
+        self.attempts = attempts
+
+    def is_success(self) -> bool:
+        return self.status == CloudResultStatus.SUCCESS
+
+    def __str__(self):
+        return f"CloudResult(status={self.status.name}, reason={self.reason}, attempts={self.attempts})"
+
+
+"""
+Talks to the license server over a persistent pooled session. Every call is bounded by a deadline,
+and connection failures, timeouts and server errors are retried with exponential backoff until the
+attempts or the deadline run out.
+"""
+class CloudClient:
+    base_url: str
+    max_attempts: int
+    backoff: float
+    session: requests.Session
+    # the time.monotonic() timestamp of the last request the server answered successfully
+    last_contact: float
+
+    def __init__(self, base_url: str = BASE_URL, pool_size: int = 2, max_attempts: int = 3, backoff: float = 0.5):
+        """
+        :param base_url: the url the message paths are relative to
+        :param pool_size: the max number of connections kept alive
+        :param max_attempts: the max number of times a request is sent
+        :param backoff: the seconds to wait before the first retry, doubled for every retry after
+        """
+        self.base_url = base_url
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.last_contact = float('-inf')
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(CLOUD_HEADERS)
+
+    def send(self, message: SendableCloudMessage, deadline: float = 10) -> CloudResult:
+        """
+        :param message: the message to send
+        :param deadline: the max number of seconds to spend on the call, retries included
+        :return: the result, holding the raw response body on success
+        """
+        body = message.json_serialize()
+        give_up_at = time.monotonic() + deadline
+        result = CloudResult(CloudResultStatus.UNREACHABLE, reason='The deadline passed before the request was sent.',
+                             attempts=0)
+
+        for attempt in range(1, self.max_attempts + 1):
+            time_left = give_up_at - time.monotonic()
+            if time_left <= 0:
+                break
+            result, retryable = self.__attempt(message, body, time_left)
+            result.attempts = attempt
+            if result.is_success():
+                self.last_contact = time.monotonic()
+            if not retryable:
+                return result
+
+            logging.debug(f"Attempt {attempt}/{self.max_attempts} to reach {message.path} failed: {result.reason}")
+            retry_delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1)
+            if attempt == self.max_attempts or time.monotonic() + retry_delay >= give_up_at:
+                break
+            time.sleep(retry_delay)
+
+        return result
+
+    def send_signed(self, message: SendableCloudMessage, response_type: Type[SignableMessage],
+                    send_timestamp: int, deadline: float = 10) -> CloudResult:
+        """
+        Sends the message and checks the signature and timestamp of the server's response.
+
+        :param response_type: the type of message the server responds with
+        :param send_timestamp: the timestamp the message was sent with, the response can't be older
+        :return: the result, holding the parsed response on success
+        """
+        result = self.send(message, deadline)
+        if not result.is_success():
+            return result
+
+        try:
+            signed_response = SignedRawResponse.from_body(result.data)
+            # nothing but the signature is decoded before the data is verified, so a forged response costs
+            # no more than the verification
+            if not signed_response.verify_signature():
+                return CloudResult(CloudResultStatus.INVALID_SIGNATURE, reason='Invalid response signature.',
+                                   attempts=result.attempts)
+            data = signed_response.decode(response_type)
+        except (KeyError, TypeError, ValueError) as e:
+            return CloudResult(CloudResultStatus.SERVER_ERROR, reason=f'Malformed response: {e!r}',
+                               attempts=result.attempts)
+        logging.debug("Signature verified successfully.")
+
+        if not data.response_timestamp >= send_timestamp:
+            return CloudResult(CloudResultStatus.INVALID_TIMESTAMP, reason='The response predates the request.',
+                               attempts=result.attempts)
+
+        return CloudResult(CloudResultStatus.SUCCESS, data, attempts=result.attempts)
+
+    def get_time_since_contact(self) -> float:
+        """
+        :return: the seconds since the server last answered a request successfully, inf if it never has
+        """
+        return time.monotonic() - self.last_contact
+
+    def close(self):
+        self.session.close()
+
+    def __attempt(self, message: SendableCloudMessage, body: str, timeout: float) -> Tuple[CloudResult, bool]:
+        """
+        :return: the result of the attempt, and whether it's worth retrying
+        """
+        try:
+            response = self.session.post(self.base_url + message.path, data=body, timeout=timeout)
+        except requests.RequestException as e:
+            return CloudResult(CloudResultStatus.UNREACHABLE, reason=repr(e)), True
+
+        if response.status_code == 200:
+            return CloudResult(CloudResultStatus.SUCCESS, response.content), False
+        elif response.status_code == 401:
+            return CloudResult(CloudResultStatus.UNAUTHORIZED, reason='The license key was not recognized.'), False
+        else:
+            # other client errors won't go away by retrying
+            return CloudResult(CloudResultStatus.SERVER_ERROR,
+                               reason=f'HTTP {response.status_code}: {response.text[:200]}'), response.status_code >= 500
@@ -0,0 +1,203 @@
+import logging
+import sqlite3
+import threading
+from typing import Callable, List, Optional
+
+from core.licensing.cloud_client import CloudResult, CloudResultStatus
+
+OUTBOX_FILE = "cloud_outbox.db"
+# the max number of pending notifications read and delivered per pass
+BATCH_SIZE = 20
+# the max number of times a notification is sent before it is given up on
+MAX_DELIVERY_ATTEMPTS = 10
+# the seconds to wait after a failed delivery, doubled for every failure in a row
+RETRY_DELAY = 2
+MAX_RETRY_DELAY = 60
+
+# these won't go away by sending the notification again
+PERMANENT_FAILURES = (CloudResultStatus.UNAUTHORIZED, CloudResultStatus.INVALID_SIGNATURE,
+                      CloudResultStatus.INVALID_TIMESTAMP)
+
+
+"""
+A course registration the cloud server hasn't been told about yet.
+"""
+class PendingNotification:
+    id: int
+    session_id: int
+    planner: bool
+    course_id: int
+    course_section: str
+    timestamp: int
+    attempts: int
+
+    def __init__(self, id: int, session_id: int, planner: bool, course_id: int, course_section: str,
+                 timestamp: int, attempts: int):
+        self.id = id
+        self.session_id = session_id
+        self.planner = planner
+        self.course_id = course_id
+        self.course_section = course_section
+        self.timestamp = timestamp
+        self.attempts = attempts
+
+    def __str__(self):
+        return f"PendingNotification(id={self.id}, course_id={self.course_id}, " \
+               f"course_section={self.course_section}, attempts={self.attempts})"
+
+
+"""
+A durable queue of registration notifications. Registrations are written to a local SQLite file and
+delivered to the cloud server by a background thread, in the order they happened, so the registration
+loop never waits on the cloud. Notifications that couldn't be delivered stay in the file and are sent
+the next time the app starts. The license key isn't written to the file, the sender fills it in when
+delivering.
+"""
+class CloudOutbox:
+    connection: sqlite3.Connection
+    send: Callable[[PendingNotification], CloudResult]
+    # guards the connection, which is shared by the registration loop and the sender
+    lock: threading.Lock
+    wake: threading.Event
+    stopping: bool
+    sender: Optional[threading.Thread]
+
+    def __init__(self, send: Callable[[PendingNotification], CloudResult], path: str = OUTBOX_FILE):
+        """
+        :param send: delivers a single notification to the cloud server
+        :param path: the file the queue is kept in
+        """
+        self.send = send
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = False
+        self.sender = None
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # a commit is an append to the write-ahead log, and survives the app crashing
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS registration_notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id INTEGER NOT NULL,
+                planner INTEGER NOT NULL,
+                course_id INTEGER NOT NULL,
+                course_section TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    def start(self):
+        """
+        Starts delivering notifications in the background, including any left over from earlier runs.
+        """
+        if self.sender is not None:
+            return
+        self.sender = threading.Thread(target=self.__deliver_forever, name='CloudOutbox', daemon=True)
+        self.sender.start()
+
+    def put(self, session_id: int, planner: bool, course_id: int, course_section: str, timestamp: int) -> int:
+        """
+        Queues a notification for delivery. This only writes to the local file.
+
+        :return: the id of the queued notification
+        """
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT INTO registration_notifications "
+                "(session_id, planner, course_id, course_section, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (session_id, planner, course_id, course_section, timestamp)
+            )
+        self.wake.set()
+        return cursor.lastrowid
+
+    def get_pending(self, limit: int = BATCH_SIZE) -> List[PendingNotification]:
+        """
+        :return: the oldest notifications that haven't been delivered yet, oldest first
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, session_id, planner, course_id, course_section, timestamp, attempts "
+                "FROM registration_notifications ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [PendingNotification(row[0], row[1], bool(row[2]), row[3], row[4], row[5], row[6]) for row in rows]
+
+    def get_pending_count(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM registration_notifications").fetchone()[0]
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stops the sender after it makes one last attempt to deliver what is pending. Whatever is
+        left stays queued for the next run.
+
+        :param timeout: the max number of seconds to wait for the last attempt
+        """
+        self.stopping = True
+        self.wake.set()
+        if self.sender is not None:
+            self.sender.join(timeout)
+        if self.sender is None or not self.sender.is_alive():
+            with self.lock:
+                self.connection.close()
+
+    def __deliver_forever(self):
+        failures_in_a_row = 0
+        while True:
+            self.wake.clear()
+            delivered_all = self.__deliver_batch()
+            if self.stopping:
+                break
+
+            if delivered_all:
+                failures_in_a_row = 0
+                if self.get_pending_count() == 0:
+                    self.wake.wait()
+            else:
+                failures_in_a_row += 1
+                # wakes up early if we're stopping, to make a last attempt
+                self.wake.wait(min(RETRY_DELAY * 2 ** (failures_in_a_row - 1), MAX_RETRY_DELAY))
+
+        remaining = self.get_pending_count()
+        if remaining > 0:
+            logging.warning(f'{remaining} course registration notification(s) could not be delivered to the cloud '
+                            f'server yet. They will be sent the next time the app starts.')
+
+    def __deliver_batch(self) -> bool:
+        """
+        Sends the pending notifications back to back over the client's kept-alive connection, oldest
+        first, stopping at the first one that should be retried so the order is kept.
+
+        :return: whether every notification in the batch was delivered or given up on
+        """
+        settled = []
+        delivered_all = True
+        for notification in self.get_pending():
+            try:
+                result = self.send(notification)
+            except Exception as e:
+                result = CloudResult(CloudResultStatus.SERVER_ERROR, reason=repr(e))
+            notification.attempts += 1
+
+            if result.is_success():
+                logging.debug(f'Delivered {notification} to the cloud server.')
+                settled += [notification.id]
+            elif result.status in PERMANENT_FAILURES or notification.attempts >= MAX_DELIVERY_ATTEMPTS:
+                logging.error(f'Giving up on delivering {notification} to the cloud server: {result.reason}')
+                settled += [notification.id]
+            else:
+                with self.lock:
+                    self.connection.execute("UPDATE registration_notifications SET attempts = ? WHERE id = ?",
+                                            (notification.attempts, notification.id))
+                delivered_all = False
+                break
+
+        if len(settled) > 0:
+            with self.lock:
+                self.connection.execute("BEGIN")
+                self.connection.executemany("DELETE FROM registration_notifications WHERE id = ?",
+                                            [(id,) for id in settled])
+                self.connection.execute("COMMIT")
+        return delivered_all
@@ -1,11 +1,10 @@
-import threading
-import time
-from typing import Tuple
+from typing import Dict, Optional
 import logging
 
-from core.configuration import UserApplicationSettings
-from core.licensing.cloud_actions import MembershipLevel, ApplicationStart, SignedDataResponse, \
-    ApplicationStartPermission, RegistrationNotification, StatusResponse, ResponseStatus, SessionPing, ApplicationStop
+from core.licensing.cloud_actions import ApplicationStart, DeviceMeta, ApplicationStartPermission, \
+    RegistrationNotification, StatusResponse, SessionPing, ApplicationStop
+from core.licensing.cloud_client import CloudClient, CloudResult, CloudResultStatus
+from core.licensing.heartbeat import Heartbeat
 from core.registrar import RegistrationResult
 from core import util
 from core.status import Status
@@ -15,142 +14,104 @@ def get_base_url() -> str:
     return 'https://license.aseef.dev/bu-registration-bot'
 
 
-def check_license_and_start_session(license_key: str) -> Tuple[str, UserApplicationSettings, MembershipLevel, int]:
+# the deadlines, in seconds, for each kind of request, retries included
+APP_START_DEADLINE = 15
+REGISTRATION_NOTIFICATION_DEADLINE = 10
+PING_DEADLINE = 10
+APP_STOP_DEADLINE = 5
+
+cloud_client = CloudClient()
+
+
+def log_failure(action: str, result: CloudResult):
+    """
+    Logs why a request to the cloud server failed.
+
+    :param action: what the request was for, e.g. 'session ping'
+    """
+    if result.status == CloudResultStatus.UNAUTHORIZED:
+        logging.error(f"Error sending {action}. Your license key no longer exists (for some reason)? Please contact "
+                      f"the developer.")
+    elif result.status == CloudResultStatus.INVALID_SIGNATURE:
+        logging.critical(f"Error! Invalid signature detected for {action}. This application may have been tampered "
+                         f"with. Please contact us for help.")
+    elif result.status == CloudResultStatus.INVALID_TIMESTAMP:
+        logging.critical(f"Error! Invalid timestamp detected for {action}. Is your system time correct? If this "
+                         f"issue persists, please contact us for help.")
+    elif result.status == CloudResultStatus.UNREACHABLE:
+        logging.warning(f"Unable to reach the cloud server for {action} after {result.attempts} attempt(s). Is your "
+                        f"internet connection working?")
+        logging.debug(result.reason)
+    elif result.status == CloudResultStatus.SERVER_ERROR:
+        logging.warning(f"The cloud server failed to handle {action} after {result.attempts} attempt(s).")
+        logging.debug(result.reason)
+
+
+def check_license_and_start_session(license_key: str, device_meta: Optional[DeviceMeta] = None) -> CloudResult:
+    """
+    :param device_meta: the device info to report, probed now if not given
+    :return: the result, holding the ApplicationStartPermission on success
+    """
     send_timestamp = util.get_new_york_timestamp()
-    app_start = ApplicationStart(
-        license_key, util.get_device_meta(), send_timestamp
-    ).send_and_get_response()
-
-    if app_start is not None:
-        start_permission = SignedDataResponse(
-            app_start['signature'], ApplicationStartPermission.from_json(app_start['data'])
-        )
-
-        data: ApplicationStartPermission = start_permission.data
-
-        if not start_permission.verify_signature():
-            logging.critical("Invalid signature for start permission detected. This application may have been "
-                             "tampered with. Please contact us for help.")
-            return exit(1)
-
-        if not data.response_timestamp >= send_timestamp:
-            logging.critical("Invalid timestamp detected for start permission. Is your system time correct?"
-                             "If this issue persists, please contact us for help.")
-            return exit(1)
-
-        logging.debug("Signature verified successfully.")
-
-        membership = data.membership_level
-        session_id = data.session_id
-        kerberos_username = data.kerberos_username
-        config = data.app_settings
-    else:
-        membership = MembershipLevel.Error
-        session_id = -1
-        kerberos_username = None
-        config = None
-
-    return kerberos_username, config, membership, session_id
-
-
-def send_course_register_update(license_key: str, session_id: int, planner: bool, course_id: int, course_section: str) -> ResponseStatus:
+    message = ApplicationStart(license_key, util.get_device_meta() if device_meta is None else device_meta,
+                               send_timestamp)
+    result = cloud_client.send_signed(message, ApplicationStartPermission, send_timestamp, APP_START_DEADLINE)
+    if result.status != CloudResultStatus.UNAUTHORIZED:
+        # an unknown license key is reported by the caller
+        log_failure('start permission', result)
+    return result
+
+
+def send_course_register_update(license_key: str, session_id: int, planner: bool, course_id: int,
+                                course_section: str) -> CloudResult:
+    """
+    :return: the result, holding the StatusResponse on success
+    """
     send_timestamp = util.get_new_york_timestamp()
-    resp = RegistrationNotification(license_key, session_id, planner, course_id, course_section, send_timestamp).send_and_get_response()
-    if resp is None:
-        # probably will never actually happen
-        logging.error("Error. Your license key no longer exists (for some reason)? Please contact the developer.")
-        exit(1)
-    else:
-        status_resp = SignedDataResponse(resp['signature'], StatusResponse.from_json(resp['data']))
+    message = RegistrationNotification(license_key, session_id, planner, course_id, course_section, send_timestamp)
+    result = cloud_client.send_signed(message, StatusResponse, send_timestamp, REGISTRATION_NOTIFICATION_DEADLINE)
+    log_failure('course registration notification', result)
+    return result
 
-        if not status_resp.verify_signature():
-            logging.critical("Error! Invalid signature detected for course registration notification. This "
-                             "application may have been tampered with. Please contact us for help.")
-            exit(1)
 
-        logging.debug("Signature verified successfully.")
-
-        data: StatusResponse = status_resp.data
-        if not data.response_timestamp >= send_timestamp:
-            logging.critical("Error! Invalid timestamp detected for course registration notification. Is your system "
-                             "time correct? If this issue persists, please contact us for help.")
-            return exit(1)
-
-        return data.status
-
-
-# todo add error handling
-def send_ping(license_key: str, session_id: int):
+def send_ping(license_key: str, session_id: int, poll_stats: Optional[Dict[str, float]] = None) -> CloudResult:
+    """
+    :param poll_stats: the live statistics on the availability checks by SessionPing field, if polling has started
+    :return: the result, holding the StatusResponse on success
+    """
     send_timestamp = util.get_new_york_timestamp()
-    resp = SessionPing(license_key, session_id, send_timestamp).send_and_get_response()
-    if resp is None:
-        # probably will never actually happen
-        logging.error("Error. Your license key no longer exists (for some reason)? Please contact the developer.")
-        exit(1)
-    else:
-        status_resp = SignedDataResponse(resp['signature'], StatusResponse.from_json(resp['data']))
-
-        if not status_resp.verify_signature():
-            logging.critical("Error! Invalid signature detected for session ping. This application may have been "
-                             "tampered with. Please contact us for help.")
-            exit(1)
-
-        logging.debug("Signature verified successfully.")
-
-        data: StatusResponse = status_resp.data
-        if not data.response_timestamp >= send_timestamp:
-            logging.critical("Error! Invalid timestamp detected for session ping. Is your system time correct?"
-                             "If this issue persists, please contact us for help.")
-            return exit(1)
-
-        return data.status
-
+    message = SessionPing(license_key, session_id, send_timestamp, **({} if poll_stats is None else poll_stats))
+    result = cloud_client.send_signed(message, StatusResponse, send_timestamp, PING_DEADLINE)
+    log_failure('session ping', result)
+    return result
 
-def start_ping_task(license_key: str, session_id: int) -> threading.Thread:
-    def ping_task():
-        while True:
-            send_ping(license_key, session_id)
-            time.sleep(20)
 
-    # Create a thread object
-    ping_thread = threading.Thread(target=ping_task)
+def start_heartbeat(license_key: str, session_id: int) -> Heartbeat:
+    """
+    Starts pinging the server in the background to keep the session alive.
 
-    # Start the thread
-    ping_thread.start()
+    :return: the heartbeat, to be stopped on shutdown
+    """
+    heartbeat = Heartbeat(lambda poll_stats: send_ping(license_key, session_id, poll_stats), cloud_client)
+    heartbeat.start()
+    return heartbeat
 
-    return ping_thread
 
-def send_app_terminated(license_key: str, session_id: int, registration_result: RegistrationResult):
+def send_app_terminated(license_key: str, session_id: int, registration_result: RegistrationResult) -> CloudResult:
+    """
+    :return: the result, holding the StatusResponse on success
+    """
     send_timestamp = util.get_new_york_timestamp()
-    resp = ApplicationStop(license_key,
-                           session_id,
-                           registration_result.status == Status.SUCCESS,
-                           registration_result.unknown_crash_occurred,
-                           registration_result.reason,
-                           registration_result.avg_cycle_time,
-                           registration_result.std_cycle_time,
-                           registration_result.avg_sleep_time,
-                           registration_result.std_sleep_time,
-                           send_timestamp)\
-        .send_and_get_response()
-    if resp is None:
-        # probably will never actually happen
-        logging.error("Error. Your license key no longer exists (for some reason)? Please contact the developer.")
-        exit(1)
-    else:
-        status_resp = SignedDataResponse(resp['signature'], StatusResponse.from_json(resp['data']))
-
-        if not status_resp.verify_signature():
-            logging.critical("Error! Invalid signature detected for session ping. This application may have been "
-                             "tampered with. Please contact us for help.")
-            exit(1)
-
-        logging.debug("Signature verified successfully.")
-
-        data: StatusResponse = status_resp.data
-        if not data.response_timestamp >= send_timestamp:
-            logging.critical("Error! Invalid timestamp detected for session ping. Is your system time correct?"
-                             "If this issue persists, please contact us for help.")
-            return exit(1)
-
-        return data.status
\ No newline at end of file
+    message = ApplicationStop(license_key,
+                              session_id,
+                              registration_result.status == Status.SUCCESS,
+                              registration_result.unknown_crash_occurred,
+                              registration_result.reason,
+                              registration_result.avg_cycle_time,
+                              registration_result.std_cycle_time,
+                              registration_result.avg_sleep_time,
+                              registration_result.std_sleep_time,
+                              send_timestamp)
+    result = cloud_client.send_signed(message, StatusResponse, send_timestamp, APP_STOP_DEADLINE)
+    log_failure('termination notice', result)
+    return result
@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from core.licensing.cloud_client import CloudClient, CloudResult
+
+# the max number of seconds the cloud server may go without hearing from us
+HEARTBEAT_INTERVAL = 20
+
+
+"""
+Keeps the cloud session alive by pinging the server with the live poll statistics. Pings are
+skipped while other requests to the server keep the session alive anyway, and the heartbeat stops
+as soon as it is asked to, so nothing is sent after the app has begun shutting down.
+"""
+class Heartbeat:
+    send_ping: Callable[[Optional[Dict[str, float]]], CloudResult]
+    cloud_client: CloudClient
+    interval: float
+    get_poll_stats: Optional[Callable[[], Dict[str, float]]]
+    stopped: threading.Event
+    thread: Optional[threading.Thread]
+
+    def __init__(self, send_ping: Callable[[Optional[Dict[str, float]]], CloudResult], cloud_client: CloudClient,
+                 interval: float = HEARTBEAT_INTERVAL):
+        """
+        :param send_ping: pings the server with the given poll statistics
+        :param cloud_client: the client every request to the server goes through
+        :param interval: the max number of seconds between requests to the server
+        """
+        self.send_ping = send_ping
+        self.cloud_client = cloud_client
+        self.interval = interval
+        self.get_poll_stats = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.__run, name='Heartbeat', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stops the heartbeat. A ping that is already being sent is left to finish.
+
+        :param timeout: the max number of seconds to wait for such a ping
+        """
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def set_poll_stats_source(self, get_poll_stats: Optional[Callable[[], Dict[str, float]]]):
+        """
+        :param get_poll_stats: returns the live poll statistics sent with every ping, by SessionPing field
+        """
+        self.get_poll_stats = get_poll_stats
+
+    def __run(self):
+        # the session was just started, so the first ping is only due after an interval
+        next_ping = time.monotonic() + self.interval
+        while not self.stopped.wait(max(next_ping - time.monotonic(), 0)):
+            # any other request the server answered counts as a ping
+            time_since_contact = self.cloud_client.get_time_since_contact()
+            if time_since_contact < self.interval:
+                next_ping = time.monotonic() + self.interval - time_since_contact
+                continue
+
+            get_poll_stats = self.get_poll_stats
+            poll_stats = None if get_poll_stats is None else get_poll_stats()
+            if not self.send_ping(poll_stats).is_success():
+                logging.debug(f'Session ping failed, trying again in {self.interval} seconds.')
+            next_ping = time.monotonic() + self.interval
@@ -0,0 +1,157 @@
+import bisect
+import logging
+import math
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, List, Optional, Set
+
+from core import stats
+from core.stats import RunningStat
+from core.status import Status
+
+DEFAULT_METRICS_HOST = '127.0.0.1'
+METRICS_PREFIX = 'bu_registration_bot_'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# how the statuses are labeled, for availability checks and for registrations
+CHECK_RESULT_LABELS = {Status.SUCCESS: 'open', Status.FAILURE: 'closed', Status.ERROR: 'error'}
+REGISTRATION_OUTCOME_LABELS = {Status.SUCCESS: 'success', Status.FAILURE: 'failure', Status.ERROR: 'error'}
+# the upper bounds, in seconds, of the buckets every histogram is written with. They are the same on
+# every scrape, so the buckets can be compared and aggregated across scrapes and across runs
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+"""
+Builds a page of metrics in the Prometheus text exposition format.
+"""
+class MetricsWriter:
+    lines: List[str]
+    described: Set[str]
+
+    def __init__(self):
+        self.lines = []
+        self.described = set()
+
+    def counter(self, name: str, help_text: str, value: float, labels: Optional[Dict[str, str]] = None):
+        self.sample(name, 'counter', help_text, value, labels)
+
+    def gauge(self, name: str, help_text: str, value: float, labels: Optional[Dict[str, str]] = None):
+        self.sample(name, 'gauge', help_text, value, labels)
+
+    def histogram(self, name: str, help_text: str, stat: Optional[RunningStat],
+                  labels: Optional[Dict[str, str]] = None):
+        """
+        Writes a statistic as a Prometheus histogram with the HISTOGRAM_BUCKETS. The statistic's own
+        log buckets are folded into them by their upper bounds, so a value may be counted one bucket
+        higher than it belongs in if it is within HISTOGRAM_GROWTH of a bucket's bound.
+
+        :param stat: the statistic, or None if nothing was recorded yet, which writes empty buckets
+        """
+        self.describe(name, 'histogram', help_text)
+        labels = {} if labels is None else labels
+        bucket_counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        count, total = 0, 0
+        if stat is not None:
+            with stat.lock:
+                buckets = list(stat.buckets.items())
+                count, total = stat.count, stat.mean * stat.count
+            for bucket, bucket_count in buckets:
+                upper_bound = stats.HISTOGRAM_MIN_VALUE * stats.HISTOGRAM_GROWTH ** bucket
+                bucket_counts[bisect.bisect_left(HISTOGRAM_BUCKETS, upper_bound)] += bucket_count
+        cumulative = 0
+        for upper_bound, bucket_count in zip(HISTOGRAM_BUCKETS, bucket_counts):
+            cumulative += bucket_count
+            self.line(f'{name}_bucket', {**labels, 'le': format_value(upper_bound)}, cumulative)
+        self.line(f'{name}_bucket', {**labels, 'le': '+Inf'}, count)
+        self.line(f'{name}_sum', labels, total)
+        self.line(f'{name}_count', labels, count)
+
+    def sample(self, name: str, metric_type: str, help_text: str, value: float,
+               labels: Optional[Dict[str, str]] = None):
+        self.describe(name, metric_type, help_text)
+        self.line(name, labels, value)
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        if name in self.described:
+            return
+        self.described.add(name)
+        self.lines += [f'# HELP {METRICS_PREFIX}{name} {help_text}', f'# TYPE {METRICS_PREFIX}{name} {metric_type}']
+
+    def line(self, name: str, labels: Optional[Dict[str, str]], value: float):
+        label_string = '' if not labels else \
+            '{' + ','.join(f'{key}="{escape_label_value(str(label))}"' for key, label in labels.items()) + '}'
+        self.lines += [f'{METRICS_PREFIX}{name}{label_string} {format_value(value)}']
+
+    def get_text(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+
+"""
+Serves metrics for Prometheus to scrape at /metrics, from a background thread. The metrics are
+written when scraped, so serving them costs nothing in between.
+"""
+class MetricsServer:
+    write_metrics: Callable[[MetricsWriter], None]
+    server: ThreadingHTTPServer
+    thread: Optional[threading.Thread]
+
+    def __init__(self, write_metrics: Callable[[MetricsWriter], None], port: int, host: str = DEFAULT_METRICS_HOST):
+        """
+        :param write_metrics: writes the current metrics
+        :param port: the port to listen on, 0 picks a free one
+        :param host: the address to listen on, only this machine by default
+        """
+        self.write_metrics = write_metrics
+        self.server = ThreadingHTTPServer((host, port), self.__create_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='MetricsServer', daemon=True)
+        self.thread.start()
+        logging.info(f'Serving metrics at http://{self.server.server_address[0]}:{self.get_port()}/metrics')
+
+    def stop(self):
+        if self.thread is not None:
+            self.server.shutdown()
+        self.server.server_close()
+
+    def get_port(self) -> int:
+        return self.server.server_address[1]
+
+    def __create_handler(self):
+        metrics_server = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                try:
+                    writer = MetricsWriter()
+                    metrics_server.write_metrics(writer)
+                    body = writer.get_text().encode()
+                except Exception as e:
+                    logging.debug(f'Unable to write metrics: {e!r}')
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                ...  # scrapes would drown out the bot's own logs
+
+        return MetricsHandler
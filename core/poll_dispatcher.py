@@ -0,0 +1,318 @@
+import abc
+import asyncio
+import concurrent.futures
+import logging
+import math
+import queue
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple, Callable, Awaitable
+
+from core.bu_course import BUCourseSection
+from core.poll_plan import PollGroup
+from core.rate_controller import AdaptiveRateController
+from core.registration_window import RegistrationWindow, WindowPhase, WindowState
+from core.scheduler import PollScheduler, PollCycle
+from core.status import Status
+
+def get_max_rates(window_state: Optional[WindowState], rate_controller: Optional[AdaptiveRateController]) \
+        -> Optional[Tuple[float, float]]:
+    """
+    :param window_state: the current state of the registration window, if there is one
+    :return: the max number of checks per RATE_PERIOD across all courses and for any one course that the
+             window and the rate controller allow together, or None if neither is in use
+    """
+    rates = None
+    if window_state is not None:
+        rates = window_state.max_requests_total, window_state.max_requests_per_course
+    if rate_controller is not None:
+        # scales whatever the window allows, or the licensed max, down to what the server can take
+        max_total, max_per_course = rates if rates is not None else \
+            (rate_controller.max_requests_total, rate_controller.max_requests_per_course)
+        fraction = rate_controller.get_fraction()
+        rates = max_total * fraction, max_per_course * fraction
+    return rates
+
+
+"""
+What one availability check found.
+"""
+class CheckResult:
+    course_statuses: Dict[BUCourseSection, Status]
+    # the SelectIt value of every open target section, as listed on the page the check got back
+    select_its: Dict[BUCourseSection, str]
+
+    def __init__(self, course_statuses: Dict[BUCourseSection, Status],
+                 select_its: Optional[Dict[BUCourseSection, str]] = None):
+        """
+        :param course_statuses: the status of every target section the check found
+        :param select_its: the SelectIt value of every open target section the check found
+        """
+        self.course_statuses = course_statuses
+        self.select_its = {} if select_its is None else select_its
+
+
+"""
+The outcome of one availability check, stamped with the moment it came back.
+"""
+class PollResult:
+    poll_group: PollGroup
+    course_statuses: Dict[BUCourseSection, Status]
+    select_its: Dict[BUCourseSection, str]
+    detected_at: float
+
+    def __init__(self, poll_group: PollGroup, check_result: CheckResult, detected_at: float):
+        """
+        :param poll_group: the poll group that was checked
+        :param check_result: what the check found
+        :param detected_at: the time.monotonic() timestamp at which the check completed
+        """
+        self.poll_group = poll_group
+        self.course_statuses = check_result.course_statuses
+        self.select_its = check_result.select_its
+        self.detected_at = detected_at
+
+
+"""
+Dispatches availability checks from a background thread as the scheduler permits and streams
+every result onto a queue the moment it completes. This leaves the main thread, which owns
+the browser, free to register for a course as soon as it is reported open while the other
+checks keep going.
+
+The main thread hands over the poll plan and the current poll cycle by swapping references,
+the dispatcher only ever reads them.
+"""
+class PollDispatcher(abc.ABC):
+    scheduler: PollScheduler
+    max_in_flight: int
+    poll_plan: List[PollGroup]
+    poll_cycle: PollCycle
+    results: 'queue.Queue[PollResult]'
+    in_flight: Dict[Tuple[str, str, str, str], PollGroup]
+    in_flight_lock: threading.Lock
+    paused_until: float
+    # varies the check rates around the moment registration opens, if set
+    registration_window: Optional[RegistrationWindow]
+    # adapts the check rates to how the student link is holding up, if set
+    rate_controller: Optional[AdaptiveRateController]
+    stopped: threading.Event
+    thread: Optional[threading.Thread]
+
+    def __init__(self, scheduler: PollScheduler, max_in_flight: int):
+        """
+        :param scheduler: decides which poll group may be checked next
+        :param max_in_flight: the max number of checks running at the same time
+        """
+        self.scheduler = scheduler
+        self.max_in_flight = max_in_flight
+        self.poll_plan = []
+        self.poll_cycle = PollCycle()
+        self.results = queue.Queue()
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        self.paused_until = 0
+        self.registration_window = None
+        self.rate_controller = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='PollDispatcher', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5):
+        """
+        Stops dispatching new checks. Checks that are already running are left to finish, but
+        their results are no longer of interest.
+        """
+        self.stopped.set()
+        self._wake()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def set_poll_plan(self, poll_plan: List[PollGroup]):
+        self.poll_plan = poll_plan
+        self._wake()
+
+    def set_registration_window(self, registration_window: Optional[RegistrationWindow]):
+        self.registration_window = registration_window
+        self._wake()
+
+    def set_rate_controller(self, rate_controller: Optional[AdaptiveRateController]):
+        self.rate_controller = rate_controller
+        self._wake()
+
+    def pause(self, seconds: float):
+        """
+        Holds off dispatching new checks for the given number of seconds.
+        """
+        self.paused_until = time.monotonic() + seconds
+
+    def get_result(self, timeout: float) -> Optional[PollResult]:
+        """
+        :param timeout: the max number of seconds to wait for a result
+        :return: the next completed check, or None if none completed in time
+        """
+        try:
+            return self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _next_dispatch(self) -> Tuple[Optional[PollGroup], Optional[float]]:
+        """
+        :return: the poll group to check now, or None along with how long to wait before asking again.
+                 A wait time of None means to wait for a running check to complete.
+        """
+        pause_time = self.paused_until - time.monotonic()
+        if pause_time > 0:
+            return None, pause_time
+        # wake up for the window's next rate change, however long the current rates would have us wait
+        window_wait = math.inf
+        registration_window = self.registration_window
+        state = None if registration_window is None else registration_window.get_state()
+        if state is not None:
+            window_wait = state.next_change
+        rates = get_max_rates(state, self.rate_controller)
+        if rates is not None and rates != (self.scheduler.get_total_rate(), self.scheduler.max_requests_per_course):
+            self.scheduler.set_rates(*rates)
+        if state is not None and state.phase == WindowPhase.HOLD:
+            return None, window_wait
+        with self.in_flight_lock:
+            if len(self.in_flight) >= self.max_in_flight:
+                return None, None
+            poll_group, wait_time = self.scheduler.next_dispatch(self.poll_plan, set(self.in_flight))
+            if poll_group is not None:
+                self.in_flight[poll_group.key] = poll_group
+                self.poll_cycle.record_dispatch()
+            return poll_group, wait_time if poll_group is not None else min(wait_time, window_wait)
+
+    def _complete(self, poll_group: PollGroup, get_check_result: Callable[[], CheckResult]):
+        detected_at = time.monotonic()
+        try:
+            check_result = get_check_result()
+        except Exception:
+            # the checks handle their own errors, so this should never happen
+            logging.error(traceback.format_exc())
+            logging.error(f'Unexpected error while checking {poll_group}. Read above dump for more info.')
+            check_result = CheckResult({target: Status.ERROR for target in poll_group.targets})
+        with self.in_flight_lock:
+            self.in_flight.pop(poll_group.key, None)
+        self.results.put(PollResult(poll_group, check_result, detected_at))
+        self._wake()
+
+    @abc.abstractmethod
+    def _wake(self):
+        """
+        Makes the dispatcher look at the poll plan again, e.g. after a check completed. Safe to call from any thread.
+        """
+
+    @abc.abstractmethod
+    def _run(self):
+        """
+        Dispatches checks until the dispatcher is stopped, on the dispatcher's thread.
+        """
+
+
+"""
+Runs every check on a thread pool.
+"""
+class ThreadedPollDispatcher(PollDispatcher):
+    thread_pool: concurrent.futures.ThreadPoolExecutor
+    check: Callable[[PollGroup], CheckResult]
+    wakeup: threading.Event
+
+    def __init__(self, scheduler: PollScheduler, max_in_flight: int,
+                 thread_pool: concurrent.futures.ThreadPoolExecutor,
+                 check: Callable[[PollGroup], CheckResult]):
+        """
+        :param thread_pool: the pool the checks run on
+        :param check: checks a poll group, called from the pool's threads
+        """
+        super().__init__(scheduler, max_in_flight)
+        self.thread_pool = thread_pool
+        self.check = check
+        self.wakeup = threading.Event()
+
+    def _wake(self):
+        self.wakeup.set()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            # cleared before looking at the state, so a check completing in between still wakes us
+            self.wakeup.clear()
+            poll_group, wait_time = self._next_dispatch()
+            if poll_group is not None:
+                future = self.thread_pool.submit(self.check, poll_group)
+                future.add_done_callback(lambda done, group=poll_group: self._complete(group, done.result))
+                continue
+
+            idle_start = time.monotonic()
+            self.wakeup.wait(wait_time)
+            self.poll_cycle.record_idle(time.monotonic() - idle_start)
+
+
+"""
+Awaits every check on an event loop owned by the dispatcher thread.
+"""
+class AsyncPollDispatcher(PollDispatcher):
+    check: Callable[[PollGroup], Awaitable[CheckResult]]
+    shutdown: Optional[Callable[[], Awaitable]]
+    loop: Optional[asyncio.AbstractEventLoop]
+    wakeup: Optional[asyncio.Event]
+
+    def __init__(self, scheduler: PollScheduler, max_in_flight: int,
+                 check: Callable[[PollGroup], Awaitable[CheckResult]],
+                 shutdown: Optional[Callable[[], Awaitable]] = None):
+        """
+        :param check: checks a poll group, awaited on the dispatcher's event loop
+        :param shutdown: awaited on the dispatcher's event loop once it stops, e.g. to close the HTTP session
+        """
+        super().__init__(scheduler, max_in_flight)
+        self.check = check
+        self.shutdown = shutdown
+        self.loop = None
+        self.wakeup = None
+
+    def _wake(self):
+        loop, wakeup = self.loop, self.wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # the loop closed in the meantime
+
+    def _run(self):
+        asyncio.run(self.__run())
+
+    async def __run(self):
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        tasks = set()
+        try:
+            while not self.stopped.is_set():
+                self.wakeup.clear()
+                poll_group, wait_time = self._next_dispatch()
+                if poll_group is not None:
+                    task = asyncio.ensure_future(self.check(poll_group))
+                    task.add_done_callback(lambda done, group=poll_group: self.__on_task_done(group, done))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    continue
+
+                idle_start = time.monotonic()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), wait_time)
+                except asyncio.TimeoutError:
+                    pass
+                self.poll_cycle.record_idle(time.monotonic() - idle_start)
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            if self.shutdown is not None:
+                await self.shutdown()
+
+    def __on_task_done(self, poll_group: PollGroup, task: asyncio.Task):
+        if task.cancelled():
+            return  # we are stopping, nobody is waiting for the result anymore
+        self._complete(poll_group, task.result)
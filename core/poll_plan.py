@@ -0,0 +1,59 @@
+from typing import Collection, List, Tuple, Dict
+
+from core.bu_course import BUCourseSection
+
+"""
+A group of target sections that can all be checked with a single browse_schedule.pl request.
+Every section of a course is listed on the same browse page, so one request for the group's
+lead section (the lowest one) returns the rows for all of them.
+"""
+class PollGroup:
+    key: Tuple[str, str, str, str]
+    targets: List[BUCourseSection]
+
+    def __init__(self, key: Tuple[str, str, str, str], targets: List[BUCourseSection]):
+        """
+        :param key: the (semester key, college, department, course code) shared by the targets. The course
+                    code of a section polled on its own is suffixed with the section, see get_section_key
+        :param targets: the target sections, sorted by section
+        """
+        self.key = key
+        self.targets = targets
+
+    def get_lead(self) -> BUCourseSection:
+        return self.targets[0]
+
+    def __str__(self):
+        return f"PollGroup(key={self.key}, sections={[str(target.section) for target in self.targets]})"
+
+
+def get_group_key(bu_course: BUCourseSection) -> Tuple[str, str, str, str]:
+    course = bu_course.course
+    return course.semester.to_semester_key(), course.college.upper(), course.department.upper(), \
+        str(course.course_code)
+
+
+def get_section_key(bu_course: BUCourseSection) -> Tuple[str, str, str, str]:
+    """
+    :return: the key of a poll group checking the section on its own, kept apart from its course's group
+    """
+    semester_key, college, department, course_code = get_group_key(bu_course)
+    return semester_key, college, department, f'{course_code} {bu_course.section.section.upper()}'
+
+
+def build_poll_plan(targets: List[BUCourseSection], unlisted: Collection[BUCourseSection] = ()) -> List[PollGroup]:
+    """
+    Groups the target sections by (semester, college, department, course) so that each
+    group costs one browse request per poll instead of one request per section.
+
+    :param targets: the sections to poll
+    :param unlisted: the sections that weren't listed on their group lead's browse page, each of
+                     which is polled in a group of its own instead
+    :return: the poll groups, in the order their first section appears in targets
+    """
+    grouped: Dict[Tuple[str, str, str, str], List[BUCourseSection]] = {}
+    for target in targets:
+        key = get_section_key(target) if target in unlisted else get_group_key(target)
+        grouped.setdefault(key, []).append(target)
+    return [PollGroup(key, sorted(sections, key=lambda x: x.section.section.upper()))
+            for key, sections in grouped.items()]
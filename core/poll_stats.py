@@ -0,0 +1,94 @@
+import math
+from typing import List
+
+from core import stats
+from core.stats import StatsCollector
+
+# the number of seconds of checks the live statistics are computed over
+STATS_WINDOW = 60
+# the statistics the live statistics are computed from, and the seconds of checks they keep
+WINDOWS = {stats.CHECK_LATENCY: STATS_WINDOW, stats.CHECK_FAILURE_TIME: STATS_WINDOW}
+
+
+def get_percentile(sorted_values: List[float], percentile: float) -> float:
+    """
+    :param sorted_values: the values, in ascending order
+    :param percentile: the percentile to get, between 0 and 100
+    :return: the nearest-rank percentile, or 0 if there are no values
+    """
+    if len(sorted_values) == 0:
+        return 0
+    rank = max(math.ceil(percentile / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+"""
+A point-in-time view of the recent availability checks.
+"""
+class PollStatsSnapshot:
+    request_rate: float
+    latency_p50: float
+    latency_p95: float
+    latency_p99: float
+    recent_errors: int
+    total_checks: int
+    total_errors: int
+
+    def __init__(self, request_rate: float = 0, latency_p50: float = 0, latency_p95: float = 0,
+                 latency_p99: float = 0, recent_errors: int = 0, total_checks: int = 0, total_errors: int = 0):
+        """
+        :param request_rate: the number of checks per minute over the window
+        :param latency_p50: the median seconds a check's request took over the window
+        :param latency_p95: the 95th percentile seconds a check's request took over the window
+        :param latency_p99: the 99th percentile seconds a check's request took over the window
+        :param recent_errors: the number of checks that failed over the window
+        :param total_checks: the number of checks since polling started
+        :param total_errors: the number of checks that failed since polling started
+        """
+        self.request_rate = request_rate
+        self.latency_p50 = latency_p50
+        self.latency_p95 = latency_p95
+        self.latency_p99 = latency_p99
+        self.recent_errors = recent_errors
+        self.total_checks = total_checks
+        self.total_errors = total_errors
+
+    def __json__(self):
+        return {
+            "request_rate": self.request_rate,
+            "latency_p50": self.latency_p50,
+            "latency_p95": self.latency_p95,
+            "latency_p99": self.latency_p99,
+            "recent_errors": self.recent_errors,
+            "total_checks": self.total_checks,
+            "total_errors": self.total_errors
+        }
+
+    def __str__(self):
+        return f"PollStatsSnapshot(request_rate={round(self.request_rate, 1)}/min, " \
+               f"latency_p50={round(self.latency_p50, 3)}s, latency_p95={round(self.latency_p95, 3)}s, " \
+               f"latency_p99={round(self.latency_p99, 3)}s, recent_errors={self.recent_errors}, " \
+               f"total_checks={self.total_checks}, total_errors={self.total_errors})"
+
+
+def get_snapshot(collector: StatsCollector) -> PollStatsSnapshot:
+    """
+    Takes a snapshot of the availability checks recorded to the run's statistics. The collector has to
+    be created with the WINDOWS for the live statistics to cover the recent checks.
+
+    :param collector: the statistics the checks are recorded to, from the poll threads or the event loop
+    """
+    latencies, failures = collector.find(stats.CHECK_LATENCY), collector.find(stats.CHECK_FAILURE_TIME)
+    recent_latencies = [] if latencies is None else latencies.get_recent()
+    recent_failures = [] if failures is None else failures.get_recent()
+    total_checks = 0 if latencies is None else latencies.count
+    total_errors = 0 if failures is None else failures.count
+
+    check_times = sorted(recent_latencies + recent_failures)
+    return PollStatsSnapshot(60 * len(check_times) / STATS_WINDOW,
+                             get_percentile(check_times, 50),
+                             get_percentile(check_times, 95),
+                             get_percentile(check_times, 99),
+                             len(recent_failures),
+                             total_checks + total_errors,
+                             total_errors)
@@ -0,0 +1,235 @@
+import cProfile
+import functools
+import logging
+import marshal
+import os
+import pstats
+import re
+import signal
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# the seconds between stack samples
+PROFILE_INTERVAL = 0.005
+# stacks deeper than this are cut off at the root end
+MAX_STACK_DEPTH = 128
+# from python 3.12, cProfile is built on sys.monitoring, which allows only one profiler to be enabled
+# at a time in the whole process, and it sees the calls of every thread. There is then a single
+# deterministic profile for the process, rather than one per thread.
+SINGLE_PROFILE = sys.version_info >= (3, 12)
+# the name the single profile is written under
+PROCESS_PROFILE_NAME = 'process'
+
+# where a sample's time went, decided by the first of these whose modules are on the stack. A
+# chromedriver command goes over HTTP too, so it has to be checked for before HTTP is.
+CATEGORIES: List[Tuple[str, Tuple[str, ...]]] = [
+    ('chromedriver', ('selenium',)),
+    ('logging', ('logging',)),
+    ('parsing', ('core.student_link_parser', 'bs4', 'html', 'json')),
+    ('http', ('requests', 'urllib3', 'aiohttp', 'http', 'ssl', 'socket')),
+]
+# the thread is blocked waiting on another thread, a queue or a timer when its innermost frame is in one of these
+WAITING_MODULES = ('threading', 'queue', 'selectors', 'concurrent.futures', 'asyncio')
+
+
+def get_category(modules: List[str]) -> str:
+    """
+    :param modules: the module of every frame on the stack, innermost last
+    :return: what the sample's time was spent on
+    """
+    for category, packages in CATEGORIES:
+        if any(is_in_package(module, packages) for module in modules):
+            return category
+    if len(modules) > 0 and is_in_package(modules[-1], WAITING_MODULES):
+        return 'waiting'
+    return 'other'
+
+
+def is_in_package(module: str, packages: Tuple[str, ...]) -> bool:
+    return any(module == package or module.startswith(package + '.') for package in packages)
+
+
+def get_file_name(thread_name: str) -> str:
+    return re.sub(r'[^\w.-]', '_', thread_name)
+
+
+"""
+Profiles the run across every thread. A background thread samples every thread's stack at a fixed
+interval, which costs the profiled threads nothing and yields the flame graphs and the split of time
+between chromedriver, HTTP, parsing and logging. The functions passed through wrap are also profiled
+deterministically, per thread, for exact call counts and times. From python 3.12 the whole process is
+profiled deterministically instead, from start to stop, see SINGLE_PROFILE.
+
+Profiles are written when the profiler is stopped, and whenever the process is sent SIGUSR1 on
+platforms that have it, to a directory holding for every thread:
+
+  - <thread>.folded, its stacks in the collapsed format flamegraph.pl and speedscope read
+  - <thread>.pstats, its deterministic profile, if any of the wrapped functions ran on it, or
+    process.pstats, the whole process' deterministic profile, from python 3.12
+
+along with all-threads.pstats, combining the deterministic profiles, and summary.txt.
+"""
+class RunProfiler:
+    directory: str
+    interval: float
+    # sample counts of every stack (outermost frame first), and of every category, by thread name
+    stacks: Dict[str, Dict[Tuple[str, ...], int]]
+    categories: Dict[str, Dict[str, int]]
+    profiles: Dict[str, cProfile.Profile]
+    local: threading.local
+    lock: threading.Lock
+    write_lock: threading.Lock
+    stopped: threading.Event
+    thread: Optional[threading.Thread]
+    start_time: float
+
+    def __init__(self, directory: str, interval: float = PROFILE_INTERVAL):
+        """
+        :param directory: where profiles are written, created if it doesn't exist
+        :param interval: the seconds between stack samples
+        """
+        self.directory = directory
+        self.interval = interval
+        self.stacks = defaultdict(lambda: defaultdict(lambda: 0))
+        self.categories = defaultdict(lambda: defaultdict(lambda: 0))
+        self.profiles = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.start_time = time.monotonic()
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.start_time = time.monotonic()
+        self.thread = threading.Thread(target=self.__sample_loop, name='Profiler', daemon=True)
+        self.thread.start()
+        if SINGLE_PROFILE:
+            profile = cProfile.Profile()
+            with self.lock:
+                self.profiles[PROCESS_PROFILE_NAME] = profile
+            profile.enable()
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.write())
+            logging.info(f'Profiling the run. Send SIGUSR1 (kill -USR1 {os.getpid()}) to write the profile so far '
+                         f'to {self.directory}.')
+        else:
+            logging.info(f'Profiling the run, the profile is written to {self.directory} on exit.')
+
+    def stop(self):
+        """
+        Stops sampling and writes the profile.
+        """
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(1)
+        if SINGLE_PROFILE and PROCESS_PROFILE_NAME in self.profiles:
+            self.profiles[PROCESS_PROFILE_NAME].disable()
+        self.write()
+
+    def wrap(self, function: Callable) -> Callable:
+        """
+        :return: the function, deterministically profiled on whichever thread calls it. From python 3.12
+                 the function is returned as it is, since the whole process is profiled already
+        """
+        if SINGLE_PROFILE:
+            return function
+
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            if getattr(self.local, 'active', False):
+                return function(*args, **kwargs)  # already being profiled further up the stack
+            profile = self.__get_thread_profile()
+            self.local.active = True
+            profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.disable()
+                self.local.active = False
+
+        return profiled
+
+    def write(self):
+        with self.write_lock:
+            try:
+                self.__write()
+            except Exception as e:
+                logging.error(f'Unable to write the profile to {self.directory}: {e!r}')
+
+    def __get_thread_profile(self) -> cProfile.Profile:
+        thread_name = threading.current_thread().name
+        with self.lock:
+            profile = self.profiles.get(thread_name)
+            if profile is None:
+                profile = self.profiles[thread_name] = cProfile.Profile()
+        return profile
+
+    def __sample_loop(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack: List[str] = []
+                modules: List[str] = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    module = frame.f_globals.get('__name__', '?')
+                    stack.append(f'{module}:{frame.f_code.co_name}')
+                    modules.append(module)
+                    frame = frame.f_back
+                stack.reverse()
+                modules.reverse()
+                thread_name = thread_names.get(thread_id, f'Thread-{thread_id}')
+                with self.lock:
+                    self.stacks[thread_name][tuple(stack)] += 1
+                    self.categories[thread_name][get_category(modules)] += 1
+
+    def __write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            stacks = {thread_name: dict(thread_stacks) for thread_name, thread_stacks in self.stacks.items()}
+            categories = {thread_name: dict(counts) for thread_name, counts in self.categories.items()}
+            profiles = dict(self.profiles)
+
+        for thread_name, thread_stacks in stacks.items():
+            with open(os.path.join(self.directory, f'{get_file_name(thread_name)}.folded'), 'w') as file:
+                for stack, count in sorted(thread_stacks.items()):
+                    file.write(f'{";".join(stack)} {count}\n')
+
+        pstats_files = []
+        for thread_name, profile in profiles.items():
+            path = os.path.join(self.directory, f'{get_file_name(thread_name)}.pstats')
+            # a snapshot, rather than dump_stats, so profiles that are still running aren't disabled
+            profile.snapshot_stats()
+            with open(path, 'wb') as file:
+                marshal.dump(profile.stats, file)
+            pstats_files += [path]
+
+        combined = None
+        if len(pstats_files) > 0:
+            combined = pstats.Stats(*pstats_files)
+            combined.dump_stats(os.path.join(self.directory, 'all-threads.pstats'))
+
+        with open(os.path.join(self.directory, 'summary.txt'), 'w') as file:
+            file.write(f'Profiled for {round(time.monotonic() - self.start_time, 1)} seconds, sampling every '
+                       f'{self.interval * 1000} ms.\n\n')
+            file.write('Time by thread and category (share of samples):\n')
+            for thread_name in sorted(categories):
+                counts = categories[thread_name]
+                total = sum(counts.values())
+                split = ', '.join(f'{category} {count / total:.1%}' for category, count in
+                                  sorted(counts.items(), key=lambda item: -item[1]))
+                file.write(f'  {thread_name} ({total} samples): {split}\n')
+            if combined is not None:
+                file.write('\nSlowest functions across the profiled calls, by cumulative time:\n')
+                combined.stream = file
+                combined.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(25)
+        logging.info(f'Wrote the profile to {self.directory}.')
@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+from enum import Enum
+from typing import Callable, Tuple
+
+# the fraction of the licensed max rates checks start out at
+INITIAL_RATE_FRACTION = 0.5
+# the fraction of the licensed max rates checks are never slowed down below
+MIN_RATE_FRACTION = 0.1
+# the fraction of the licensed max rates added every INCREASE_INTERVAL the student link stays healthy
+ADDITIVE_INCREASE = 0.05
+# the seconds of healthy responses between increases
+INCREASE_INTERVAL = 2
+# the rate is multiplied by these on a slow or failed response, and on a security error page, which
+# is a step away from being logged out
+DECREASE_FACTOR = 0.5
+SECURITY_ERROR_DECREASE_FACTOR = 0.25
+# the seconds after a decrease during which further trouble doesn't decrease the rate again, since
+# the checks already in flight were sent at the old rate
+DECREASE_COOLDOWN = 2
+# a response is slow when it takes this many times the smoothed latency, and at least MIN_SLOW_LATENCY seconds
+SLOW_LATENCY_FACTOR = 3
+MIN_SLOW_LATENCY = 1
+# the weight of the newest response in the smoothed latency and error rate
+SMOOTHING = 0.1
+# the rate isn't increased while the smoothed error rate is above this, so a string of failures has to
+# be followed by a run of clean responses before checks speed up again
+MAX_INCREASE_ERROR_RATE = 0.05
+
+
+class ResponseOutcome(Enum):
+    OK = 1
+    SERVER_ERROR = 2  # a 5xx or 429 response, or no response at all
+    SECURITY_ERROR = 3  # the student link's security error page
+
+
+"""
+Adapts the check rate to how the student link is holding up, additive increase, multiplicative
+decrease. The rate climbs in small steps for as long as responses come back quickly and cleanly and
+recent failures have died down, and is cut by a fraction as soon as one is slow, fails or lands on
+the security error page. The rate is kept as a fraction of the licensed max, so it can never go over it.
+"""
+class AdaptiveRateController:
+    max_requests_total: float
+    max_requests_per_course: float
+    fraction: float
+    # the smoothed seconds a response takes, and the smoothed share of responses that failed
+    latency: float
+    error_rate: float
+    last_change: float
+    last_decrease: float
+    lock: threading.Lock
+    clock: Callable[[], float]
+
+    def __init__(self, max_requests_total: float, max_requests_per_course: float,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param max_requests_total: the licensed max number of checks per RATE_PERIOD across all courses
+        :param max_requests_per_course: the licensed max number of checks per RATE_PERIOD for any one course
+        :param clock: a monotonic clock returning seconds
+        """
+        self.max_requests_total = max_requests_total
+        self.max_requests_per_course = max_requests_per_course
+        self.fraction = INITIAL_RATE_FRACTION
+        self.latency = 0
+        self.error_rate = 0
+        self.clock = clock
+        self.last_change = clock()
+        self.last_decrease = -DECREASE_COOLDOWN
+        self.lock = threading.Lock()
+
+    def record(self, latency: float, outcome: ResponseOutcome):
+        """
+        :param latency: the seconds the response took, or took to fail
+        :param outcome: what came back
+        """
+        now = self.clock()
+        with self.lock:
+            slow = self.latency > 0 and latency > max(self.latency * SLOW_LATENCY_FACTOR, MIN_SLOW_LATENCY)
+            # slow responses count too, so the baseline follows the server if it stays slower for good
+            self.latency = latency if self.latency == 0 else self.latency + SMOOTHING * (latency - self.latency)
+            failed = outcome != ResponseOutcome.OK
+            self.error_rate += SMOOTHING * ((1 if failed else 0) - self.error_rate)
+
+            if failed or slow:
+                if now - self.last_decrease < DECREASE_COOLDOWN:
+                    return
+                factor = SECURITY_ERROR_DECREASE_FACTOR if outcome == ResponseOutcome.SECURITY_ERROR \
+                    else DECREASE_FACTOR
+                fraction = max(MIN_RATE_FRACTION, self.fraction * factor)
+                self.last_change = self.last_decrease = now
+                if fraction == self.fraction:
+                    return  # already as slow as checks go
+                self.fraction = fraction
+                reason = 'a slow response' if not failed else outcome.name.lower().replace('_', ' ')
+                logging.info(f'Slowing checks down to {self.get_rates()[0]:.1f} req/min after {reason} '
+                             f'({latency:.2f}s, smoothed {self.latency:.2f}s, error rate {self.error_rate:.0%}).')
+            elif self.fraction < 1 and self.error_rate <= MAX_INCREASE_ERROR_RATE \
+                    and now - self.last_change >= INCREASE_INTERVAL:
+                self.fraction = min(1.0, self.fraction + ADDITIVE_INCREASE)
+                self.last_change = now
+                logging.debug(f'Speeding checks up to {self.get_rates()[0]:.1f} req/min.')
+
+    def get_fraction(self) -> float:
+        """
+        :return: the fraction of the max rates checks are to be sent at
+        """
+        return self.fraction
+
+    def get_rates(self) -> Tuple[float, float]:
+        """
+        :return: the max number of checks per RATE_PERIOD across all courses and for any one course
+        """
+        return self.max_requests_total * self.fraction, self.max_requests_per_course * self.fraction
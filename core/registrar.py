@@ -1,37 +1,69 @@
+import asyncio
 import concurrent.futures
 import json
 import logging
 import os
-import statistics
 import threading
 import time
 import traceback
 from collections import defaultdict
-from concurrent.futures import Future
-from typing import List, Tuple, Union, Set, Dict
+from enum import Enum
+from typing import List, Tuple, Set, Dict, Optional, AsyncIterator
+from urllib.parse import urljoin, urlparse
 
-import requests
-from bs4 import BeautifulSoup, ResultSet, Tag, NavigableString
-from selenium import webdriver
 from selenium.common import NoSuchElementException
-from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 
-from core import util, secure_storage_handler
+from core import util, secure_storage_handler, student_link_parser
+from core.async_student_link_session import AsyncStudentLinkSession
+from core.browser import BrowserManager, BrowserLifecycle, BrowserFactory
 from core.bu_course import BUCourseSection
 from core.configuration import UserApplicationSettings
 from core.licensing import cloud_util
+from core.licensing.cloud_outbox import CloudOutbox
+from core.licensing.heartbeat import Heartbeat
+from core.poll_dispatcher import PollDispatcher, ThreadedPollDispatcher, AsyncPollDispatcher, CheckResult, \
+    PollResult, get_max_rates
+from core.poll_plan import PollGroup, build_poll_plan
+from core import poll_stats
+from core.poll_stats import PollStatsSnapshot
+from core.profiler import RunProfiler
+from core.rate_controller import AdaptiveRateController, ResponseOutcome
+from core.registration_window import RegistrationWindow, ServerClock, WindowPhase
+from core import stats
+from core.stats import StatsCollector
+from core.metrics import MetricsWriter, CHECK_RESULT_LABELS, REGISTRATION_OUTCOME_LABELS
+from core.scheduler import PollScheduler, PollCycle
 from core.semester import Semester
+from core.session_state import SessionState
 from core.status import Status
-from core.threadsafe.thread_safe_bool import ThreadSafeBoolean
+from core.student_link_session import StudentLinkSession
 from core.threadsafe.thread_safe_int import ThreadSafeInt
+from core.traffic_capture import TrafficCapture, ReplayAdapter
 from core.licensing.cloud_actions import MembershipLevel
 
 STUDENT_LINK_URL = 'https://www.bu.edu/link/bin/uiscgi_studentlink.pl'
 REGISTER_SUCCESS_ICON = 'https://www.bu.edu/link/student/images/checkmark.gif'
 REGISTER_FAILED_ICON = 'https://www.bu.edu/link/student/images/xmark.gif'
+LOGIN_PAGE_TITLE = 'Boston University | Login'
+SECURITY_ERROR_PAGE_TITLE = 'Web Login Service - Message Security Error'
 TOTAL_RETRY_LIMIT = 9  # Note: retry limit should ideally be at least the number of threads + 1 (5)
 PER_COURSE_RETRY_LIMIT = 12  # should b
+POLL_CONCURRENCY = 4  # max number of in-flight availability checks
+ASYNC_POLL_CONCURRENCY = 256  # max number of open connections in the async poll mode
+DEFAULT_BROWSER_IDLE_TIMEOUT = 120  # seconds chrome may sit unused before it is closed in the on demand lifecycle
+RESULT_WAIT_TIME = 1  # max seconds to wait for a check to complete before looking at the session again
+
+
+class PollMode(Enum):
+    THREADED = 1  # availability checks run on a small thread pool
+    ASYNC = 2  # availability checks are awaited concurrently on an asyncio event loop
+
+
+class RegistrationMode(Enum):
+    BROWSER = 1  # registrations are clicked through in chrome
+    HTTP = 2  # registrations are submitted as a single SelectIt request, using chrome only as a fallback
 
 
 class RegistrationResult:
@@ -55,7 +87,7 @@ class RegistrationResult:
 
 
 class Registrar:
-    driver: webdriver
+    browser: BrowserManager
     is_planner: bool
     module: str
     target_courses: List[BUCourseSection]
@@ -66,49 +98,111 @@ class Registrar:
     max_requests_per_second_per_course: int
     session_id: int
     config: UserApplicationSettings
+    poll_mode: PollMode
+    registration_mode: RegistrationMode
+    student_link_url: str
+    register_success_icon: str
+    register_failed_icon: str
+    http_session: StudentLinkSession
+    async_http_session: Optional[AsyncStudentLinkSession]
+    # snapshot of the browser session published by the main thread, read lock-free by poll threads
+    session_state: SessionState
+    # check latency, parse, cycle, sleep, detection to submit and registration times over the whole run
+    stats: StatsCollector
+    # where the statistics are written on exit, if anywhere
+    stats_file: Optional[str]
+    # records the student link traffic of the HTTP session, if enabled
+    traffic_capture: Optional[TrafficCapture]
+    # profiles the poll workers and registrations, if enabled
+    profiler: Optional[RunProfiler]
+    # the epoch timestamp at which registration opens by the student link's clock, if checks are timed around it
+    registration_opens_at: Optional[float]
+    # the phases checks are timed around once polling, if registration_opens_at is known
+    registration_window: Optional[RegistrationWindow]
+    # the student link's clock, estimated from the Date headers of the availability checks
+    server_clock: ServerClock
+    # whether the check rate adapts to the student link's latency and errors, and what adapts it once polling
+    adaptive_rate: bool
+    rate_controller: Optional[AdaptiveRateController]
+    # check results by course and status, registration attempts by outcome and re-logins, for the metrics
+    course_status_counts: Dict[Tuple[BUCourseSection, Status], int]
+    registration_counts: Dict[Status, int]
+    relogin_count: int
+    # the target sections that weren't listed on their course's shared browse page, polled on their own
+    unlisted_targets: Set[BUCourseSection]
+    # set once a poll thread finds an unlisted target, until the poll plan is rebuilt
+    poll_plan_outdated: bool
+    # registration notifications waiting to be delivered to the cloud server
+    cloud_outbox: CloudOutbox
+    # live statistics on the recent availability checks, reported with every session ping
+    heartbeat: Optional[Heartbeat]
 
     thread_pool: concurrent.futures.ThreadPoolExecutor = concurrent.futures. \
-        ThreadPoolExecutor(max_workers=4)
+        ThreadPoolExecutor(max_workers=POLL_CONCURRENCY)
     # for tracking errors, if too many successive errors happen for the same
     # course, we stop trying that course -- defaultdicts are mostly threadsafe on cpython
     course_consecutive_error_counter: Dict[BUCourseSection, int] = defaultdict(lambda: 0)
     # total error counter, if too many successive errors happen, we exit
     all_consecutive_error_counter: ThreadSafeInt = ThreadSafeInt(0)
-    # tracker keeping track of whether we are logged in
-    is_logged_in: ThreadSafeBoolean = ThreadSafeBoolean(False)
 
     def __init__(self, license_key: str,
                  bu_creds: Tuple[str, str],
                  config: UserApplicationSettings,
                  session_id: int,
-                 membership_level: MembershipLevel):
+                 membership_level: MembershipLevel,
+                 poll_mode: PollMode = PollMode.THREADED,
+                 registration_mode: RegistrationMode = RegistrationMode.BROWSER,
+                 browser_lifecycle: BrowserLifecycle = BrowserLifecycle.PERSISTENT,
+                 browser_idle_timeout: float = DEFAULT_BROWSER_IDLE_TIMEOUT,
+                 browser_factory: Optional[BrowserFactory] = None,
+                 heartbeat: Optional[Heartbeat] = None,
+                 stats_file: Optional[str] = None,
+                 student_link_url: str = STUDENT_LINK_URL,
+                 traffic_capture: Optional[TrafficCapture] = None,
+                 traffic_replay: Optional[ReplayAdapter] = None,
+                 profiler: Optional[RunProfiler] = None,
+                 registration_opens_at: Optional[float] = None,
+                 adaptive_rate: bool = False):
         """
         :param license_key: a string license key to the app
         :param bu_creds: the tuple containing a string username and a string password to BU Kerberos
         :param config: the program config
         :param session_id: the session id
         :param membership_level: the membership level
+        :param poll_mode: whether availability checks run on threads or on an asyncio event loop
+        :param registration_mode: whether registrations are submitted through chrome or over HTTP
+        :param browser_lifecycle: whether chrome stays open for the whole run or is closed while idle
+        :param browser_idle_timeout: the number of seconds chrome may sit unused before it is closed, if on demand
+        :param browser_factory: launches the browser, pass the one holding a warm browser to skip a cold start
+        :param heartbeat: keeps the cloud session alive, it is sent the live poll statistics and stopped on exit
+        :param stats_file: the json file the run's statistics are written to on exit, if any
+        :param student_link_url: the url of the student link, e.g. a stand-in for load testing
+        :param traffic_capture: records the HTTP session's requests and responses, closed on exit
+        :param traffic_replay: answers the HTTP session's requests from a capture instead of the network
+        :param profiler: profiles the availability checks and registrations, if given
+        :param registration_opens_at: the epoch timestamp at which registration opens, if known. Checks are kept
+                                      to a trickle until just before then, and land on the server as it opens
+        :param adaptive_rate: whether checks speed up while the student link is healthy and slow down when
+                              it is slow or failing, rather than always going at the max rate
         """
 
         logging.debug(f"User's CPU count is {os.cpu_count()}.")
 
         self.session_id = session_id
-        options = util.get_chrome_options(config.debug_mode)
-        service = Service(
-            executable_path=config.custom_driver.driver_path
-        ) if config.custom_driver.enabled else Service()
-        logging.debug(f"Initializing chrome driver with service_url={service.service_url} path={service.path}...")
-        self.driver = webdriver.Chrome(options=options, service=service)
-        self.driver.set_page_load_timeout(30)
-        if config.save_duo_cookies and secure_storage_handler.has_duo_cookies():
-            logging.info("Loading Duo cookies from secure local storage...")
-            print(secure_storage_handler.get_duo_cookies())
-            util.load_cookies_chrome(self.driver, secure_storage_handler.get_duo_cookies())
-        logging.debug(f"Browser initialized!")
+        self.student_link_url = student_link_url
+        # the registration status icons are served from the same host as the student link
+        self.register_success_icon = urljoin(student_link_url, urlparse(REGISTER_SUCCESS_ICON).path)
+        self.register_failed_icon = urljoin(student_link_url, urlparse(REGISTER_FAILED_ICON).path)
+        self.browser = BrowserManager(config, browser_lifecycle, browser_idle_timeout,
+                                      cookie_overrides=lambda: self.http_session.get_cookies(),
+                                      factory=browser_factory)
+        # launch the browser right away so driver problems surface before we start
+        self.browser.get_driver()
 
         self.config = config
         self.is_planner = not config.real_registrations
         self.module = 'reg/plan/add_planner.pl' if self.is_planner else 'reg/add/confirm_classes.pl'
+        self.session_state = SessionState(self.module)
         self.target_courses = config.target_courses
         # sort courses by their semester
         self.target_courses = sorted(self.target_courses, key=lambda x: x.course.semester.to_semester_key())
@@ -117,28 +211,140 @@ class Registrar:
         self.is_premium = membership_level == MembershipLevel.Full
         self.max_requests_per_second_total = 99 if self.is_premium else 6
         self.max_requests_per_second_per_course = 30 if self.is_premium else 6
+        # pooled keep-alive session shared by all poll threads, sized so every worker keeps its connection
+        # with one to spare for HTTP registrations
+        self.traffic_capture = traffic_capture
+        self.profiler = profiler
+        self.registration_opens_at = registration_opens_at
+        self.registration_window = None
+        self.server_clock = ServerClock()
+        self.adaptive_rate = adaptive_rate
+        self.rate_controller = None
+        self.http_session = StudentLinkSession(self.student_link_url, POLL_CONCURRENCY + 1,
+                                               capture=traffic_capture, replay=traffic_replay)
+        self.poll_mode = poll_mode
+        self.registration_mode = registration_mode
+        self.async_http_session = AsyncStudentLinkSession(self.student_link_url, ASYNC_POLL_CONCURRENCY) \
+            if poll_mode == PollMode.ASYNC else None
+        self.stats = StatsCollector(poll_stats.WINDOWS)
+        self.stats_file = stats_file
+        self.course_status_counts = defaultdict(lambda: 0)
+        self.registration_counts = defaultdict(lambda: 0)
+        self.relogin_count = 0
+        self.unlisted_targets = set()
+        self.poll_plan_outdated = False
+        # every notification is sent with the session it was queued in, and this run's license key
+        self.cloud_outbox = CloudOutbox(lambda n: cloud_util.send_course_register_update(
+            self.license_key, n.session_id, n.planner, n.course_id, n.course_section
+        ))
+        # also delivers the notifications earlier runs couldn't
+        self.cloud_outbox.start()
+        self.heartbeat = heartbeat
+        if heartbeat is not None:
+            # handed over as plain values, the licensing package doesn't know about the poll statistics
+            heartbeat.set_poll_stats_source(lambda: self.get_poll_stats().__json__())
+
+    @property
+    def driver(self) -> WebDriver:
+        """
+        The browser. Accessing it relaunches chrome if it was closed while idle.
+        """
+        return self.browser.get_driver()
 
-    def graceful_exit(self):
+    def graceful_exit(self, status: Status = Status.ERROR, reason: str = 'The app was shut down.',
+                      unknown_crash_occurred: bool = False):
+        """
+        :param status: whether every target course was registered for
+        :param reason: why the app is exiting, reported to the backend
+        :param unknown_crash_occurred: whether the app is exiting because of an uncaught error
+        """
 
+        if self.heartbeat is not None:
+            logging.info('Stopping session pings...')
+            self.heartbeat.stop(cloud_util.PING_DEADLINE)
         logging.info('Closing thread pools...')
         self.thread_pool.shutdown(wait=False)
         logging.info('Logging off...')
-        self.logout()
+        if self.browser.is_running():
+            self.logout()
+        else:
+            # chrome was closed while idle, it isn't worth launching just to log off
+            self.__logout_http()
+        self.http_session.close()
+        if self.traffic_capture is not None:
+            self.traffic_capture.close()
+        logging.info('Delivering pending registration notifications...')
+        self.cloud_outbox.stop(cloud_util.REGISTRATION_NOTIFICATION_DEADLINE)
         logging.info('Sending termination notice to backend...')
+        cycle_time, sleep_time = self.stats.get(stats.CYCLE_TIME), self.stats.get(stats.SLEEP_TIME)
         cloud_util.send_app_terminated(self.license_key,
                                        self.session_id,
                                        RegistrationResult(
-                                           Status.ERROR,
-                                           False,
-                                           "TODO",
-                                           0, 0, 0, 0
+                                           status,
+                                           unknown_crash_occurred,
+                                           reason,
+                                           cycle_time.get_mean(), cycle_time.get_std(),
+                                           sleep_time.get_mean(), sleep_time.get_std()
                                        ))
+        if self.stats_file is not None:
+            logging.info(f'Writing run statistics to {self.stats_file}...')
+            try:
+                self.stats.dump(self.stats_file)
+            except OSError as e:
+                logging.error(f'Unable to write run statistics to {self.stats_file}: {e}')
         logging.info('Closing browser...')
-        try:
-            self.driver.quit()
-        except Exception:
-            # do nothing
-            ...
+        self.browser.quit()
+
+    def get_poll_stats(self) -> PollStatsSnapshot:
+        """
+        :return: the live statistics on the availability checks. Called from the heartbeat's thread.
+        """
+        return poll_stats.get_snapshot(self.stats)
+
+    def write_metrics(self, writer: MetricsWriter):
+        """
+        Writes the current state of the run, for the metrics endpoint. Called from the endpoint's thread.
+        """
+        check_stats = self.get_poll_stats()
+        writer.counter('checks_total', 'Availability checks sent to StudentLink.', check_stats.total_checks)
+        writer.counter('check_errors_total', 'Availability checks that failed.', check_stats.total_errors)
+        writer.gauge('request_rate', 'Availability checks per minute, over the last minute.', check_stats.request_rate)
+        for (course, course_status), count in list(self.course_status_counts.items()):
+            writer.counter('course_results_total', 'Check results by course and availability.', count,
+                           {'course': str(course), 'result': CHECK_RESULT_LABELS[course_status]})
+        # the same limit the dispatcher applies, none is reported when checks go at the licensed max
+        registration_window = self.registration_window
+        window_state = None if registration_window is None else registration_window.get_state()
+        rates = get_max_rates(window_state, self.rate_controller)
+        if rates is not None:
+            holding = window_state is not None and window_state.phase == WindowPhase.HOLD
+            writer.gauge('rate_limit', 'Availability checks per minute the registration window and the adaptive '
+                                       'rate control allow.', 0 if holding else rates[0])
+        writer.gauge('consecutive_errors', 'Checks that failed in a row, across all courses.',
+                     self.all_consecutive_error_counter.get())
+        writer.gauge('logged_in', 'Whether the bot is logged in to StudentLink.',
+                     1 if self.session_state.get().logged_in else 0)
+        writer.counter('relogins_total', 'Times the bot was logged out and logged back in.', self.relogin_count)
+        writer.gauge('target_courses', 'Courses that haven\'t been registered for yet.', len(self.target_courses))
+
+        registration_counts = dict(self.registration_counts)
+        writer.counter('registration_attempts_total', 'Registrations attempted.', sum(registration_counts.values()))
+        for outcome, count in registration_counts.items():
+            writer.counter('registrations_total', 'Registrations attempted, by outcome.', count,
+                           {'outcome': REGISTRATION_OUTCOME_LABELS[outcome]})
+
+        for name, help_text in ((stats.CHECK_LATENCY, 'Seconds an availability check\'s request took.'),
+                                (stats.PARSE_TIME, 'Seconds spent parsing a course listing.'),
+                                (stats.CYCLE_TIME, 'Seconds a poll cycle spent checking.'),
+                                (stats.SLEEP_TIME, 'Seconds a poll cycle spent waiting.'),
+                                (stats.DETECTION_TO_SUBMIT_TIME, 'Seconds from a course found open to its '
+                                                                 'registration being submitted.'),
+                                (stats.REGISTRATION_TIME, 'Seconds a registration attempt took.')):
+            writer.histogram(f'{name}_seconds', help_text, self.stats.find(name))
+        for course in self.config.target_courses:
+            writer.histogram('course_check_latency_seconds', 'Seconds the checks covering a course took.',
+                             self.stats.find(stats.get_course_stat_name(stats.CHECK_LATENCY, course)),
+                             {'course': str(course)})
 
     def __duo_login(self) -> Status:
         try:
@@ -169,7 +375,7 @@ class Registrar:
                                                                                "from a non-main thread."
 
         try:
-            self.driver.get(f"{STUDENT_LINK_URL}?ModuleName=regsched.pl")
+            self.driver.get(f"{self.student_link_url}?ModuleName=regsched.pl")
             logout_button = self.driver.find_element(By.XPATH,
                                                      '//a/img[@src="https://www.bu.edu/link/student/images'
                                                      '/header_logoff.gif"]')
@@ -178,6 +384,20 @@ class Registrar:
         except Exception:
             return Status.ERROR
 
+    def __logout_http(self) -> Status:
+        """
+        Logs off with the HTTP session, following the log off button's link like the browser would.
+        """
+        try:
+            page = self.http_session.get({'ModuleName': 'regsched.pl'}).text
+            logout_url = student_link_parser.parse_logout_url(page)
+            if logout_url is None:
+                return Status.ERROR
+            self.http_session.get_url(urljoin(self.student_link_url, logout_url))
+            return Status.SUCCESS
+        except Exception:
+            return Status.ERROR
+
     def login(self, override_credentials=None) -> Status:
         assert threading.current_thread().__class__.__name__ == '_MainThread', "Error! Attempted kerberos login " \
                                                                                "from a non-main thread."
@@ -190,7 +410,7 @@ class Registrar:
 
         logging.info(F'Logging into {username}\'s account...!')
 
-        self.driver.get(f"{STUDENT_LINK_URL}?ModuleName=regsched.pl")
+        self.driver.get(f"{self.student_link_url}?ModuleName=regsched.pl")
         logging.debug(f"Login page loaded at url={self.driver.current_url}.")
         # its possible it jumps straight to the student link or duo page if we have cookies
         if 'studentlink' not in self.driver.current_url and 'duosecurity' not in self.driver.current_url:
@@ -235,10 +455,23 @@ class Registrar:
             )
 
         logging.info(F'Successfully logged into {username}\'s account!')
-        self.is_logged_in.set_flag(True)
-        logging.debug(f"Login flag is now set to: {self.is_logged_in}")
+        self.__publish_session_state(logged_in=True)
+        logging.debug(f"Session state is now: {self.session_state.get()}")
         return Status.SUCCESS
 
+    def __publish_session_state(self, **changes):
+        """
+        Snapshots the browser's cookies and url and publishes them for the poll threads.
+        Must be called from the main thread since it talks to the WebDriver.
+        """
+        assert threading.current_thread().__class__.__name__ == '_MainThread', "Error! Attempted to publish the " \
+                                                                               "session state from a non-main thread."
+        cookies = tuple(self.driver.get_cookies())
+        self.http_session.sync_cookies(list(cookies))
+        if self.async_http_session is not None:
+            self.async_http_session.sync_cookies(list(cookies))
+        self.session_state.publish(cookies=cookies, current_url=self.driver.current_url, **changes)
+
     """
     It looks like to prevent bot-registrations, BU requires you go through here first before you register.
     Otherwise it will prevent registration with a misleading error. AHAHA SUCK IT!
@@ -250,7 +483,7 @@ class Registrar:
                                                                                "thread."
 
         self.driver.get(
-            f'{STUDENT_LINK_URL}?ModuleName=reg/option/_start.pl'
+            f'{self.student_link_url}?ModuleName=reg/option/_start.pl'
             f'&ViewSem={semester.semester_season.name}%20{semester.semester_year}'
             f'&KeySem={semester.to_semester_key()}'
         )
@@ -264,6 +497,8 @@ class Registrar:
         else:
             register.find_element(By.TAG_NAME, 'a').click()
         time.sleep(0.25)
+        # the registration pages may have handed us new session cookies
+        self.__publish_session_state()
 
     '''
     Finds course listing and tries to register for the class.
@@ -273,150 +508,382 @@ class Registrar:
     def find_courses(self) -> Status.SUCCESS:
         search_start = time.time()
         original: List[BUCourseSection] = self.target_courses.copy()
-        cycle_durations = []
-        sleep_durations = []
-
-        while len(self.target_courses) != 0:  # keep trying until all courses are registered
-
-            # if global error threshold reached
-            if self.all_consecutive_error_counter.get() > TOTAL_RETRY_LIMIT:
-                if self.config.keep_trying:
-                    # first time wait 2 sec, then 4 sec, then 8 sec, then 16, 32, 64, 128, 256, 512, 600 seconds
-                    # the wait times are capped at 600 seconds (10 min)
-                    error_sleep_penalty = 2 ** (self.all_consecutive_error_counter.get() / TOTAL_RETRY_LIMIT)
-                    error_sleep_penalty = min(600, error_sleep_penalty)
-                    logging.warning(f'Number of successive failures has reached a critical threshold. '
-                                    f'Going to sleep for {error_sleep_penalty} seconds.')
-                    time.sleep(error_sleep_penalty)
-                    logging.info(f'System is now awake again and reattempting request.')
-                else:
-                    logging.critical(
-                        'Number of successive failures has reached its threshold. We can no longer continue.')
+
+        # checks are dispatched continuously in the background, and every result is streamed back here
+        # as soon as it completes so open courses are registered for without waiting on the others
+        poll_dispatcher = self.__create_poll_dispatcher()
+        poll_plan = self.__build_poll_plan()
+        poll_dispatcher.set_poll_plan(poll_plan)
+        poll_cycle = poll_dispatcher.poll_cycle
+        poll_dispatcher.start()
+
+        try:
+            while len(self.target_courses) != 0:  # keep trying until all courses are registered
+
+                # the error thresholds (and any back-off) apply once per cycle
+                if not poll_cycle.thresholds_checked:
+                    poll_cycle.thresholds_checked = True
+                    threshold_status, error_sleep_penalty = self.__check_error_thresholds()
+                    if threshold_status == Status.ERROR:
+                        return Status.ERROR
+                    if error_sleep_penalty > 0:
+                        poll_dispatcher.pause(error_sleep_penalty)
+                        time.sleep(error_sleep_penalty)
+                        logging.info(f'System is now awake again and reattempting request.')
+
+                # poll threads flag logouts in the session state, so the driver only needs to be asked then
+                if not self.session_state.get().logged_in and self.__check_if_logged_out() == Status.ERROR:
+                    logging.critical('Re-login failed...! We cannot continue.')
                     return Status.ERROR
 
-            # if all courses have reached their respective error threshold (shouldn't happen)
-            all_courses_failed = True
-            for course in self.target_courses:
-                if self.course_consecutive_error_counter[course] <= PER_COURSE_RETRY_LIMIT or self.config.keep_trying:
-                    all_courses_failed = False
-                    break
-            if all_courses_failed:
-                logging.critical(
-                    'Number of successive failures has reached its threshold for all courses. We can no longer '
-                    'continue.')
-                return Status.ERROR
+                # once logged in, the browser is only needed to register or to log back in
+                self.browser.release_if_idle()
 
-            start = time.time()
+                poll_result = poll_dispatcher.get_result(timeout=RESULT_WAIT_TIME)
+                if poll_result is None:
+                    continue
+                poll_cycle.record_result(poll_result.poll_group.key, poll_result.course_statuses)
+
+                # update the error counters and register for any open course right away
+                registrable_courses = self.__apply_poll_statuses(poll_result.course_statuses)
+                if len(registrable_courses) > 0:
+                    logging.info(f"Found {len(registrable_courses)} registrable course(s)!")
+                for registrable_course in registrable_courses:
+                    if self.__attempt_registration(registrable_course, poll_result.detected_at,
+                                                   poll_result.select_its.get(registrable_course)) == Status.ERROR:
+                        return Status.ERROR
+                if len(registrable_courses) > 0 or self.poll_plan_outdated:
+                    poll_plan = self.__build_poll_plan()
+                    poll_dispatcher.set_poll_plan(poll_plan)
+
+                if poll_cycle.is_complete(poll_plan):
+                    # Check login status
+                    if self.__check_if_logged_out() == Status.ERROR:
+                        logging.critical('Re-login failed...! We cannot continue.')
+                        return Status.ERROR
+
+                    # print the State of the Union
+                    self.__log_progress(search_start, original)
+                    self.__log_poll_cycle(poll_cycle)
+                    poll_plan = self.__build_poll_plan()
+                    poll_dispatcher.set_poll_plan(poll_plan)
+                    poll_cycle = PollCycle()
+                    poll_dispatcher.poll_cycle = poll_cycle
+        finally:
+            poll_dispatcher.stop()
 
-            # calculate the time to sleep
-            # we do it here in advance in case amount of courses change
-            # picks whatever rate is needed to make sure we neither exceed
-            # the total rate nor the course rate
-            actual_rate = min(
-                len(self.target_courses) * self.max_requests_per_second_per_course,
-                self.max_requests_per_second_total
-            )
-            min_wait_time = (len(self.target_courses) / actual_rate) * 60  # min wait time we must reach this cycle
+        # we are done!
+        return Status.SUCCESS
 
-            # Check login status
-            if self.__check_if_logged_out() == Status.ERROR:
-                logging.critical('Re-login failed...! We cannot continue.')
-                return Status.ERROR
+    async def find_courses_async(self) -> Status:
+        """
+        The asyncio equivalent of find_courses. Courses are registered for as soon as a check
+        reports them open, while the rest of the checks keep running.
+        """
+        async for poll_result in self.__watch_results():
+            for course, course_status in poll_result.course_statuses.items():
+                if course_status == Status.SUCCESS and course in self.target_courses:
+                    if await self.register(course, poll_result.select_its.get(course)) == Status.ERROR:
+                        return Status.ERROR
+
+        # watch only gives up early if we can no longer continue
+        return Status.SUCCESS if len(self.target_courses) == 0 else Status.ERROR
+
+    async def poll_once(self) -> Dict[BUCourseSection, Status]:
+        """
+        Checks every target course once, with all poll groups in flight at the same time.
+        The error counters are updated with the results.
 
-            # find registrable courses
-            futures: List[Future[Status]] = []
-            courses_and_results: List[Tuple[BUCourseSection, Future[Status]]] = []
-            for course in self.target_courses:
-                if self.course_consecutive_error_counter[course] > PER_COURSE_RETRY_LIMIT \
-                        and not self.config.keep_trying:
-                    logging.warning(f'Skipping course lookup for {course} due to too many successive failures in '
-                                    f'finding/parsing that course.')
+        :return: the status of every target course that was found
+        """
+        results = await asyncio.gather(*[self.__check_poll_group_async(poll_group)
+                                         for poll_group in self.__build_poll_plan()])
+        course_statuses = self.__merge_poll_results([result.course_statuses for result in results])
+        self.__apply_poll_statuses(course_statuses)
+        return course_statuses
+
+    async def watch(self) -> AsyncIterator[Tuple[BUCourseSection, Status]]:
+        """
+        Continuously polls the target courses at the permitted rate, yielding the status of every
+        course as soon as the check covering it completes. Stops once there are no target courses
+        left, or early if the error thresholds are reached or re-login fails.
+        """
+        async for poll_result in self.__watch_results():
+            for course, course_status in poll_result.course_statuses.items():
+                yield course, course_status
+
+    async def __watch_results(self) -> AsyncIterator[PollResult]:
+        """
+        Backs watch, yielding every check's result as a whole.
+        """
+        search_start = time.time()
+        original: List[BUCourseSection] = self.target_courses.copy()
+
+        # checks run on the dispatcher's own event loop, and aiohttp sessions are bound to the loop
+        # they were created on, so a session left open by poll_once can't be shared with it
+        await self.close_async()
+        poll_dispatcher = self.__create_poll_dispatcher()
+        poll_plan = self.__build_poll_plan()
+        poll_dispatcher.set_poll_plan(poll_plan)
+        poll_cycle = poll_dispatcher.poll_cycle
+        poll_dispatcher.start()
+        loop = asyncio.get_running_loop()
+
+        try:
+            while len(self.target_courses) != 0:
+                if not poll_cycle.thresholds_checked:
+                    poll_cycle.thresholds_checked = True
+                    threshold_status, error_sleep_penalty = self.__check_error_thresholds()
+                    if threshold_status == Status.ERROR:
+                        return
+                    if error_sleep_penalty > 0:
+                        poll_dispatcher.pause(error_sleep_penalty)
+                        await asyncio.sleep(error_sleep_penalty)
+                        logging.info(f'System is now awake again and reattempting request.')
+
+                if not self.session_state.get().logged_in and self.__check_if_logged_out() == Status.ERROR:
+                    logging.critical('Re-login failed...! We cannot continue.')
+                    return
+
+                self.browser.release_if_idle()
+
+                # waited on off the event loop, so the consumer's other tasks keep running meanwhile
+                poll_result = await loop.run_in_executor(None, poll_dispatcher.get_result, RESULT_WAIT_TIME)
+                if poll_result is None:
                     continue
-                submitted_request = self.thread_pool.submit(self.__is_course_available, course)
-                futures += [submitted_request]
-                courses_and_results += [(course, submitted_request)]
-                time.sleep(0.3)  # a small delay to prevent way too many requests together
-                # ^ todo, maybe make this a dynamic val?
-            # wait for the threads to finish
-            concurrent.futures.wait(futures)
-
-            # Check login status
-            if self.__check_if_logged_out() == Status.ERROR:
-                logging.critical('Re-login failed...! We cannot continue.')
-                return Status.ERROR
+                poll_cycle.record_result(poll_result.poll_group.key, poll_result.course_statuses)
+                self.__apply_poll_statuses(poll_result.course_statuses)
+                yield poll_result
+
+                # the consumer may have registered for courses while we were suspended
+                poll_plan = self.__build_poll_plan()
+                poll_dispatcher.set_poll_plan(poll_plan)
+
+                if poll_cycle.is_complete(poll_plan):
+                    self.__log_progress(search_start, original)
+                    self.__log_poll_cycle(poll_cycle)
+                    poll_cycle = PollCycle()
+                    poll_dispatcher.poll_cycle = poll_cycle
+        finally:
+            poll_dispatcher.stop()
+
+    async def register(self, course: BUCourseSection, select_it: Optional[str] = None) -> Status:
+        """
+        Registers for the course. The HTTP registration mode submits the registration on the thread pool,
+        so the consumer's other tasks keep running meanwhile. Registering through the browser, which
+        may only be used from the main thread, still blocks, so the event loop must be on the main thread.
 
-            # get the list of courses that we can potentially register for
-            # and set the error counters here as well
-            registrable_courses: List[BUCourseSection] = []
-            for bu_course, future_result in courses_and_results:
-                course_status = future_result.result()
-                if course_status == Status.SUCCESS:
-                    registrable_courses += [bu_course]
-                    self.__reset_error_counter(bu_course)
-                elif course_status == Status.FAILURE:
-                    self.__reset_error_counter(bu_course)
-                elif course_status == Status.ERROR:
-                    self.__increment_error_counter(bu_course)
-
-            logging.info(f"Found {'no' if len(registrable_courses) == 0 else len(registrable_courses)} "
-                         f"registrable course(s){'.' if len(registrable_courses) == 0 else '!'}")
-
-            # for all registrable courses, register for them ASAP
-            for registrable_course in registrable_courses:
-                logging.info(f"Attempting to register for {registrable_course}!")
-                result = self.__register_course(registrable_course)
-                if result == Status.SUCCESS:
-                    self.target_courses.remove(registrable_course)
-                    cloud_util.send_course_register_update(self.license_key,
-                                                           self.session_id,
-                                                           self.is_planner,
-                                                           registrable_course.course.course_id,
-                                                           registrable_course.section.section)
-                elif result == Status.FAILURE:
-                    continue  # NEVER SURRENDER!!
-                else:
-                    logging.critical('Irrecoverable error occurred. Exiting...')
-                    return Status.ERROR
+        :param select_it: the SelectIt value of the course on the page that found it open, which lets
+                          the HTTP registration mode submit the registration without the browser
+        """
+        logging.info(f"Attempting to register for {course}!")
+        registration_start = time.monotonic()
+        result = None
+        if self.registration_mode == RegistrationMode.HTTP and select_it is not None:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.thread_pool, self.__attempt_registration_http, course, select_it)
+        return self.__finish_registration(course, result, None, registration_start)
+
+    async def close_async(self):
+        if self.async_http_session is not None:
+            await self.async_http_session.close()
+
+    def __check_error_thresholds(self) -> Tuple[Status, float]:
+        """
+        :return: ERROR if too many successive failures happened for us to continue. Otherwise SUCCESS along
+                 with how many seconds to back off for before the next cycle.
+        """
+        # if global error threshold reached
+        if self.all_consecutive_error_counter.get() > TOTAL_RETRY_LIMIT:
+            if self.config.keep_trying:
+                # first time wait 2 sec, then 4 sec, then 8 sec, then 16, 32, 64, 128, 256, 512, 600 seconds
+                # the wait times are capped at 600 seconds (10 min)
+                error_sleep_penalty = 2 ** (self.all_consecutive_error_counter.get() / TOTAL_RETRY_LIMIT)
+                error_sleep_penalty = min(600, error_sleep_penalty)
+                logging.warning(f'Number of successive failures has reached a critical threshold. '
+                                f'Going to sleep for {error_sleep_penalty} seconds.')
+                return Status.SUCCESS, error_sleep_penalty
+            else:
+                logging.critical(
+                    'Number of successive failures has reached its threshold. We can no longer continue.')
+                return Status.ERROR, 0
+
+        # if all courses have reached their respective error threshold (shouldn't happen)
+        all_courses_failed = True
+        for course in self.target_courses:
+            if self.course_consecutive_error_counter[course] <= PER_COURSE_RETRY_LIMIT or self.config.keep_trying:
+                all_courses_failed = False
+                break
+        if all_courses_failed:
+            logging.critical(
+                'Number of successive failures has reached its threshold for all courses. We can no longer '
+                'continue.')
+            return Status.ERROR, 0
+
+        return Status.SUCCESS, 0
+
+    def __build_poll_plan(self) -> List[PollGroup]:
+        courses_to_poll: List[BUCourseSection] = []
+        for course in self.target_courses:
+            if self.course_consecutive_error_counter[course] > PER_COURSE_RETRY_LIMIT \
+                    and not self.config.keep_trying:
+                logging.warning(f'Skipping course lookup for {course} due to too many successive failures in '
+                                f'finding/parsing that course.')
+                continue
+            courses_to_poll += [course]
+        # sections of the same course share a browse page, so they share a request
+        self.poll_plan_outdated = False
+        return build_poll_plan(courses_to_poll, self.unlisted_targets)
+
+    def __create_scheduler(self) -> PollScheduler:
+        return PollScheduler(self.max_requests_per_second_total, self.max_requests_per_second_per_course)
+
+    def __create_poll_dispatcher(self) -> PollDispatcher:
+        if self.poll_mode == PollMode.ASYNC:
+            poll_dispatcher = AsyncPollDispatcher(self.__create_scheduler(), ASYNC_POLL_CONCURRENCY,
+                                                  self.__check_poll_group_async, self.close_async)
+        else:
+            check_poll_group = self.__check_poll_group if self.profiler is None else \
+                self.profiler.wrap(self.__check_poll_group)
+            poll_dispatcher = ThreadedPollDispatcher(self.__create_scheduler(), POLL_CONCURRENCY,
+                                                     self.thread_pool, check_poll_group)
+        if self.registration_opens_at is not None:
+            self.registration_window = RegistrationWindow(
+                self.registration_opens_at, self.server_clock,
+                self.max_requests_per_second_total, self.max_requests_per_second_per_course
+            )
+            poll_dispatcher.set_registration_window(self.registration_window)
+        if self.adaptive_rate:
+            self.rate_controller = AdaptiveRateController(self.max_requests_per_second_total,
+                                                          self.max_requests_per_second_per_course)
+            poll_dispatcher.set_rate_controller(self.rate_controller)
+        return poll_dispatcher
+
+    def __merge_poll_results(self, results: List[Dict[BUCourseSection, Status]]) -> Dict[BUCourseSection, Status]:
+        course_statuses: Dict[BUCourseSection, Status] = {}
+        for result in results:
+            for bu_course, course_status in result.items():
+                # a section can show up on several pages, if any of them has it open we try to register
+                if course_statuses.get(bu_course) != Status.SUCCESS:
+                    course_statuses[bu_course] = course_status
+        return course_statuses
+
+    def __apply_poll_statuses(self, course_statuses: Dict[BUCourseSection, Status]) -> List[BUCourseSection]:
+        """
+        Updates the error counters with the poll results.
 
-            # print the State of the Union
-            logging.info('----------------------------------')
-            duration = (time.time() - search_start)
-            logging.info(f'Running Time: {round(duration / 60 / 60, 2)} hours.')
-            logging.info(f'Registration Mode: {"PLANNER" if self.is_planner else "REAL"}')
-            logging.info(
-                f'Course Status: {(len(original) - len(self.target_courses))}/{len(original)} courses registered')
-            # print unregistered courses
-            logging.info(f"  Unregistered:")
-            for u in self.target_courses:
-                logging.info(f"   - {u}")
-            # print registered courses
-            logging.info(f"  Registered:" + ('' if len(original) - len(self.target_courses) > 0 else ' None'))
-            for r in set(original) - set(self.target_courses):
-                logging.info(f"   - {r}")
-
-            execution_time = time.time() - start
-            time_to_wait = min_wait_time - execution_time
-            if time_to_wait > 0:
-                time.sleep(time_to_wait)
-
-            cycle_durations += [execution_time]
-            sleep_durations += [time_to_wait]
-            cycle_durations = cycle_durations[-25:]
-            sleep_durations = sleep_durations[-25:]
-
-            logging.debug(f'Current Cycle Duration: {round(execution_time, 3)} seconds')
-            logging.debug(f'Average Cycle Duration (c={len(cycle_durations)}): '
-                          f'{round(statistics.mean(cycle_durations), 3)} seconds')
-            logging.debug(f'Current Sleep Time [25]: {round(max(time_to_wait, 0), 3)} seconds')
-            logging.debug(f'Average Sleep Time [25]: {round(statistics.mean(sleep_durations), 3)} seconds')
-            logging.info(
-                f'Request Rate: {60 * len(self.target_courses) / round(time_to_wait + execution_time, 4)} req/min')
-            logging.info('----------------------------------')
+        :return: the courses that we can potentially register for
+        """
+        registrable_courses: List[BUCourseSection] = []
+        for bu_course, course_status in course_statuses.items():
+            self.course_status_counts[(bu_course, course_status)] += 1
+            if bu_course not in self.target_courses:
+                continue  # registered for while the check was in flight
+            if course_status == Status.SUCCESS:
+                registrable_courses += [bu_course]
+                self.__reset_error_counter(bu_course)
+            elif course_status == Status.FAILURE:
+                self.__reset_error_counter(bu_course)
+            elif course_status == Status.ERROR:
+                self.__increment_error_counter(bu_course)
+        return registrable_courses
+
+    def __attempt_registration(self, registrable_course: BUCourseSection, detected_at: Optional[float] = None,
+                               select_it: Optional[str] = None) -> Status:
+        """
+        :param detected_at: the time.monotonic() timestamp at which the course was seen open, if known
+        :param select_it: the SelectIt value of the course on the page that found it open, if known
+        """
+        logging.info(f"Attempting to register for {registrable_course}!")
+        registration_start = time.monotonic()
+        result = None
+        if self.registration_mode == RegistrationMode.HTTP and select_it is not None:
+            result = self.__attempt_registration_http(registrable_course, select_it, detected_at)
+            # the submit time was already recorded by the HTTP attempt
+            detected_at = None
+        return self.__finish_registration(registrable_course, result, detected_at, registration_start)
+
+    def __attempt_registration_http(self, registrable_course: BUCourseSection, select_it: str,
+                                    detected_at: Optional[float] = None) -> Optional[Status]:
+        """
+        Doesn't touch the browser, so it may be called from any thread.
 
-        # we are done!
-        return Status.SUCCESS
+        :return: the outcome of the registration, or None if it should be retried through chrome
+        """
+        register_course_http = self.__register_course_http
+        if self.profiler is not None:
+            register_course_http = self.profiler.wrap(register_course_http)
+        return register_course_http(registrable_course, select_it, detected_at)
+
+    def __finish_registration(self, registrable_course: BUCourseSection, result: Optional[Status],
+                              detected_at: Optional[float], registration_start: float) -> Status:
+        """
+        Registers through chrome unless the HTTP attempt already had an outcome, then records the outcome.
+        Must be called from the main thread, since it may talk to the WebDriver.
 
-    def __register_course(self, course: BUCourseSection) -> Status.SUCCESS:
+        :param result: the outcome of the HTTP attempt, None if it wasn't made or should be retried through chrome
+        :param registration_start: the time.monotonic() timestamp at which the registration attempt started
+        """
+        if result is None:
+            register_course = self.__register_course
+            if self.profiler is not None:
+                register_course = self.profiler.wrap(register_course)
+            result = register_course(registrable_course, detected_at)
+        self.stats.record(stats.REGISTRATION_TIME, time.monotonic() - registration_start)
+        self.registration_counts[result] += 1
+        if result == Status.SUCCESS:
+            self.target_courses.remove(registrable_course)
+            # delivered in the background, so the next registration doesn't wait on the cloud
+            self.cloud_outbox.put(self.session_id,
+                                  self.is_planner,
+                                  registrable_course.course.course_id,
+                                  registrable_course.section.section,
+                                  util.get_new_york_timestamp())
+        elif result == Status.FAILURE:
+            pass  # NEVER SURRENDER!!
+        else:
+            logging.critical('Irrecoverable error occurred. Exiting...')
+        return result
+
+    def __record_detection_to_submit(self, course: BUCourseSection, detected_at: float):
+        detection_to_submit = time.monotonic() - detected_at
+        self.stats.record(stats.DETECTION_TO_SUBMIT_TIME, detection_to_submit)
+        logging.info(f'Submitting registration for {course} {round(detection_to_submit * 1000)} ms after it '
+                     f'was found open.')
+
+    def __log_progress(self, search_start: float, original: List[BUCourseSection]):
+        logging.info('----------------------------------')
+        duration = (time.time() - search_start)
+        logging.info(f'Running Time: {round(duration / 60 / 60, 2)} hours.')
+        logging.info(f'Registration Mode: {"PLANNER" if self.is_planner else "REAL"}')
+        logging.info(
+            f'Course Status: {(len(original) - len(self.target_courses))}/{len(original)} courses registered')
+        # print unregistered courses
+        logging.info(f"  Unregistered:")
+        for u in self.target_courses:
+            logging.info(f"   - {u}")
+        # print registered courses
+        logging.info(f"  Registered:" + ('' if len(original) - len(self.target_courses) > 0 else ' None'))
+        for r in set(original) - set(self.target_courses):
+            logging.info(f"   - {r}")
+
+    def __log_poll_cycle(self, poll_cycle: PollCycle):
+        execution_time = poll_cycle.get_duration() - poll_cycle.idle_time
+        self.stats.record(stats.CYCLE_TIME, execution_time)
+        self.stats.record(stats.SLEEP_TIME, poll_cycle.idle_time)
+
+        logging.debug(f'Current Cycle Duration: {round(execution_time, 3)} seconds')
+        logging.debug(f'Cycle Duration: {self.stats.get(stats.CYCLE_TIME)}')
+        logging.debug(f'Current Sleep Time: {round(poll_cycle.idle_time, 3)} seconds')
+        logging.debug(f'Sleep Time: {self.stats.get(stats.SLEEP_TIME)}')
+        for name in (stats.CHECK_LATENCY, stats.PARSE_TIME, stats.DETECTION_TO_SUBMIT_TIME, stats.REGISTRATION_TIME):
+            if self.stats.find(name) is not None:
+                logging.debug(f'{name}: {self.stats.get(name)}')
+        logging.info(
+            f'Request Rate: {60 * poll_cycle.checks_dispatched / round(poll_cycle.get_duration(), 4)} req/min')
+        logging.info('----------------------------------')
+
+    def __register_course(self, course: BUCourseSection, detected_at: Optional[float] = None) -> Status.SUCCESS:
 
         assert threading.current_thread().__class__.__name__ == '_MainThread', "Error! Attempted course registration " \
                                                                                "login from a non-main thread."
@@ -430,84 +897,74 @@ class Registrar:
             self.navigate(course.course.semester)
 
         params_browse = self.__get_parameters(course)
-        url_with_params = f"{STUDENT_LINK_URL}?{'&'.join([f'{key}={value}' for key, value in params_browse.items()])}"
+        url_with_params = f"{self.student_link_url}?{'&'.join([f'{key}={value}' for key, value in params_browse.items()])}"
         self.driver.get(url_with_params)
 
         try:
-            tr_elements = self.driver.find_element(By.NAME, 'SelectForm') \
-                .find_element(By.TAG_NAME, 'table') \
-                .find_element(By.TAG_NAME, 'tbody') \
-                .find_elements(By.TAG_NAME, 'tr')  # note: the tbody tag is injected by chrome
-
-            found = False
-
-            for tr_element in tr_elements:
-                table_columns = tr_element.find_elements(By.TAG_NAME, 'td')
-
-                if len(table_columns) < 11:
-                    continue
+            # scan chrome's page source with the same parser the poller uses rather than walking
+            # the table one find_element round-trip at a time
+            course_table = student_link_parser.parse_course_table(self.driver.page_source,
+                                                                  verify=self.config.debug_mode)
+            course_row = course_table.find(course.get_registration_string())
 
-                if table_columns[0].get_attribute("innerHTML") == '':
-                    continue
-
-                course_name_tag = table_columns[2]
-                course_id_tag = table_columns[0]
-
-                # self note: the spaces inside this text are really \xa0 but selenium seems to take care of that
-                if course_name_tag.text == course.get_registration_string():
-                    found = True
-                    try:
-                        # this call will produce an error if the class is blocked from registration
-                        course_id_tag.find_element(By.CSS_SELECTOR, "input[name='SelectIt']").click()
-                        logging.info(F'Registration for {course} is open! Attempting to register now...')
-
-                        button = self.driver.find_element(By.XPATH, "//input[@type='button']")
-                        button.click()
-
-                        # real registration requires accepting an alert
-                        if not self.is_planner:
-                            alert = self.driver.switch_to.alert
-                            alert.accept()
-
-                        if self.driver.title == 'Add Classes - Confirmation':
-                            status_element = self.driver.find_element(By.XPATH, "//tr[@ALIGN='center'][@Valign='top']")
-                            status_icon_url = status_element.find_element(By.TAG_NAME, "img").get_attribute('src')
-                            if status_icon_url == REGISTER_SUCCESS_ICON:
-                                return Status.SUCCESS
-                            elif status_icon_url == REGISTER_FAILED_ICON:
-                                reason_element = status_element.find_elements(By.TAG_NAME, 'td')[-1].find_element(
-                                    By.TAG_NAME, 'font')
-                                reason = reason_element.text
-                                logging.warning(F'Failed to register for {course} because: \'{reason}\'')
-                                if reason == "You're already registered for this class":
-                                    return Status.SUCCESS  # since we are already registered, lets call it a "success"
-                                return Status.FAILURE
-                            else:  # this case should never happen if I made this right
-                                logging.critical("Unknown registration state. This should NEVER happen!")
-                                return Status.ERROR
-                        elif self.driver.title == 'Error':
-                            logging.warning(f'Can not register yet for {course}...')
-                        else:  # the planner doesn't have a confirmation state
-                            logging.info(F'Successfully registered for {course}!')
-                            return Status.SUCCESS
-
-                    except NoSuchElementException:
-                        logging.warning(
-                            f"Can not register yet for {course} because registration is blocked (full class?)")
-
-                    # reset error counters
-                    self.__reset_error_counter(course)
-
-            if not found:
+            if course_row is None:
                 logging.error(f'Error, {course} does not exist! Have you entered the correct course?')
+                return Status.FAILURE
+
+            try:
+                # blocked classes (full, restricted...) have no SelectIt checkbox
+                if not course_row.has_select_it():
+                    raise NoSuchElementException(f"No SelectIt checkbox found for {course}")
+                self.driver.find_element(By.CSS_SELECTOR,
+                                         f"input[name='SelectIt'][value='{course_row.select_it}']").click()
+                logging.info(F'Registration for {course} is open! Attempting to register now...')
+
+                button = self.driver.find_element(By.XPATH, "//input[@type='button']")
+                if detected_at is not None:
+                    self.__record_detection_to_submit(course, detected_at)
+                button.click()
+
+                # real registration requires accepting an alert
+                if not self.is_planner:
+                    alert = self.driver.switch_to.alert
+                    alert.accept()
+
+                if self.driver.title == 'Add Classes - Confirmation':
+                    status_element = self.driver.find_element(By.XPATH, "//tr[@ALIGN='center'][@Valign='top']")
+                    status_icon_url = status_element.find_element(By.TAG_NAME, "img").get_attribute('src')
+                    if status_icon_url == self.register_success_icon:
+                        return Status.SUCCESS
+                    elif status_icon_url == self.register_failed_icon:
+                        reason_element = status_element.find_elements(By.TAG_NAME, 'td')[-1].find_element(
+                            By.TAG_NAME, 'font')
+                        reason = reason_element.text
+                        logging.warning(F'Failed to register for {course} because: \'{reason}\'')
+                        if reason == "You're already registered for this class":
+                            return Status.SUCCESS  # since we are already registered, lets call it a "success"
+                        return Status.FAILURE
+                    else:  # this case should never happen if I made this right
+                        logging.critical("Unknown registration state. This should NEVER happen!")
+                        return Status.ERROR
+                elif self.driver.title == 'Error':
+                    logging.warning(f'Can not register yet for {course}...')
+                else:  # the planner doesn't have a confirmation state
+                    logging.info(F'Successfully registered for {course}!')
+                    return Status.SUCCESS
+
+            except NoSuchElementException:
+                logging.warning(
+                    f"Can not register yet for {course} because registration is blocked (full class?)")
+
+            # reset error counters
+            self.__reset_error_counter(course)
 
             return Status.FAILURE
 
         except Exception as e:
             # if we got logged out log back in
-            if self.driver.title == 'Boston University | Login':
+            if self.driver.title == LOGIN_PAGE_TITLE:
                 logging.warning(f'Failed to attempt registration for {course} because we are logged out!')
-                self.is_logged_in.set_flag(False)
+                self.session_state.mark_logged_out()
                 if self.__check_if_logged_out() == Status.ERROR:
                     logging.critical('Re-login failed...! We cannot continue.')
                     return Status.ERROR
@@ -526,77 +983,236 @@ class Registrar:
 
                 return Status.FAILURE
 
-    def __is_course_available(self, course: BUCourseSection) -> Status:
-        # make sure they are on the correct page
-        if self.driver.current_url.__contains__(f'{STUDENT_LINK_URL}?ModuleName={self.module}'):
-            logging.error(F"Unexpected state. Driver is current on url={self.driver.current_url} "
-                          F"but state expected the URL to be {STUDENT_LINK_URL}?ModuleName={self.module}.")
-            return Status.ERROR
+    def __register_course_http(self, course: BUCourseSection, select_it: str, detected_at: Optional[float] = None) \
+            -> Optional[Status]:
+        """
+        Submits the registration the same way the browse page's form does, as a single GET carrying the
+        SelectIt value the poller parsed, without going through chrome.
 
-        params_browse = self.__get_parameters(course)
-        headers = self.__get_headers()
-        page_title = ''
-        res = None
+        :param select_it: the SelectIt value of the course on the page that found it open
+        :return: the outcome of the registration, or None if the response wasn't recognized and the
+                 registration should be retried through chrome
+        """
+        params = {'SelectIt': select_it}
+        params.update(self.__get_parameters(course))
+        params['ModuleName'] = self.module
+        params['PreregKeySem'] = ''
 
+        if detected_at is not None:
+            self.__record_detection_to_submit(course, detected_at)
         try:
-            res = requests.get(STUDENT_LINK_URL, params=params_browse, headers=headers)
+            page = self.http_session.get(params).text
+            page_title = student_link_parser.parse_title(page)
+        except Exception:
+            logging.warning(f'Failed to submit the registration for {course} over HTTP. Retrying in the browser...')
+            logging.debug(traceback.format_exc())
+            return None
 
-            parser = BeautifulSoup(res.text, 'html.parser')
-            page_title = parser.find('title').text
+        if page_title == LOGIN_PAGE_TITLE or page_title == SECURITY_ERROR_PAGE_TITLE:
+            # the browser path logs back in for us
+            self.session_state.mark_logged_out()
+            return None
+        elif page_title == 'Error':
+            logging.warning(f'Can not register yet for {course}...')
+            self.__reset_error_counter(course)
+            return Status.FAILURE
+        elif page_title != 'Add Classes - Confirmation':
+            if self.is_planner:
+                # the planner doesn't have a confirmation state, the same as in the browser
+                logging.info(F'Successfully registered for {course}!')
+                return Status.SUCCESS
+            logging.debug(f'Unrecognized response page \'{page_title}\' to the registration for {course}. '
+                          f'Retrying in the browser...')
+            return None
 
-            assert page_title == 'Add Classes - Display', f"Incorrect page. Expected to be on the page \'Add " \
-                                                          f"Classes - Display\' but instead ended up on " \
-                                                          f"the page \'{page_title}\'."
+        confirmation = student_link_parser.parse_registration_confirmation(page)
+        status_icon_url = None if confirmation is None else urljoin(self.student_link_url, confirmation.icon_url)
+        if status_icon_url == self.register_success_icon:
+            logging.info(F'Successfully registered for {course}!')
+            return Status.SUCCESS
+        elif status_icon_url == self.register_failed_icon:
+            logging.warning(F'Failed to register for {course} because: \'{confirmation.reason}\'')
+            if confirmation.reason == "You're already registered for this class":
+                return Status.SUCCESS  # since we are already registered, lets call it a "success"
+            self.__reset_error_counter(course)
+            return Status.FAILURE
+        else:
+            logging.debug(f'Unrecognized registration confirmation {confirmation} for {course}. '
+                          f'Retrying in the browser...')
+            return None
 
-            table_rows: ResultSet = parser.find('form').find('table').find_all('tr')
+    def __check_poll_group(self, poll_group: PollGroup) -> CheckResult:
+        """
+        Checks every section in the poll group with a single browse request. Any other target
+        section that happens to be listed on the returned page is reported as well.
 
-            assert len(table_rows) > 0, "Error. No course rows found. This shouldn't happen!"
+        :return: the status of every target section found, always including the group's sections
+        """
+        # runs on the poll threads, so only the published snapshot may be consulted -- never the driver
+        course_statuses = self.__check_poll_preconditions(poll_group)
+        if course_statuses is not None:
+            return CheckResult(course_statuses)
 
-            for table_row in table_rows:
-                table_columns: ResultSet = table_row.find_all('td')
+        page_title = ''
+        page = None
+        request_start = time.monotonic()
 
-                if len(table_columns) < 11 or table_columns[0].text == '':
-                    continue
+        try:
+            sent_at = time.time()
+            response = self.http_session.get(self.__get_parameters(poll_group.get_lead()))
+            self.server_clock.observe(response.headers.get('Date'), sent_at, time.time())
+            page = response.text
+            request_time = time.monotonic() - request_start
+            page_title = student_link_parser.parse_title(page)
+            self.__record_response(request_time, page_title, response.status_code)
+            course_table = self.__parse_browse_page(page_title, page)
+            parse_time = time.monotonic() - request_start - request_time
+        except Exception as e:
+            self.stats.record(stats.CHECK_FAILURE_TIME, time.monotonic() - request_start)
+            if page is None and self.rate_controller is not None:
+                # no response came back at all
+                self.rate_controller.record(time.monotonic() - request_start, ResponseOutcome.SERVER_ERROR)
+            course_statuses = self.__handle_poll_error(poll_group, e, page_title, page)
+            if Status.ERROR in course_statuses.values():
+                time.sleep(2)  # Sleep for a couple second as to delay the next request a bit
+            return CheckResult(course_statuses)
 
-                course_name_tag: Union[Tag, NavigableString] = table_columns[2]
-                course_id_tag: Union[Tag, NavigableString] = table_columns[0]
-                course_name_str = course_name_tag.text.replace('\xa0', ' ')
+        self.__record_check_times(poll_group, request_time, parse_time)
+        return self.__harvest_course_table(poll_group, course_table)
 
-                # Note: course codes for summer are suffixed with an S
-                if course_name_str == course.get_registration_string():
-                    # TODO: add a debug message displaying the reason class is closed
-                    #  and the number of seats
-                    if course_id_tag.select_one(selector="input[name='SelectIt']"):
-                        return Status.SUCCESS
-                    else:
-                        return Status.FAILURE
+    async def __check_poll_group_async(self, poll_group: PollGroup) -> CheckResult:
+        """
+        The asyncio equivalent of __check_poll_group.
+        """
+        course_statuses = self.__check_poll_preconditions(poll_group)
+        if course_statuses is not None:
+            return CheckResult(course_statuses)
 
-            logging.warning(f"Warning. The course \'{course}\' does not exist (yet?).")
-            return Status.FAILURE
+        page_title = ''
+        page = None
+        request_start = time.monotonic()
 
+        try:
+            sent_at = time.time()
+            response = await self.async_http_session.get(self.__get_parameters(poll_group.get_lead()))
+            self.server_clock.observe(response.headers.get('Date'), sent_at, time.time())
+            page = response.text
+            request_time = time.monotonic() - request_start
+            page_title = student_link_parser.parse_title(page)
+            self.__record_response(request_time, page_title, response.status_code)
+            course_table = self.__parse_browse_page(page_title, page)
+            parse_time = time.monotonic() - request_start - request_time
         except Exception as e:
+            self.stats.record(stats.CHECK_FAILURE_TIME, time.monotonic() - request_start)
+            if page is None and self.rate_controller is not None:
+                # no response came back at all
+                self.rate_controller.record(time.monotonic() - request_start, ResponseOutcome.SERVER_ERROR)
+            course_statuses = self.__handle_poll_error(poll_group, e, page_title, page)
+            if Status.ERROR in course_statuses.values():
+                await asyncio.sleep(2)  # Sleep for a couple second as to delay the next request a bit
+            return CheckResult(course_statuses)
+
+        self.__record_check_times(poll_group, request_time, parse_time)
+        return self.__harvest_course_table(poll_group, course_table)
+
+    def __record_response(self, request_time: float, page_title: str, status_code: int):
+        """
+        Tells the rate controller, if any, how the student link answered a check.
 
-            if self.driver.title == "Boston University | Login" or \
-                    page_title == 'Web Login Service - Message Security Error':
-                logging.warning(f'Failed to check class status for {course} because we are no longer logged in...')
-                # we don't increment fail counters for this
-                # also, since this is a different thread, we can't relog from here
-                self.is_logged_in.set_flag(False)
-                return Status.FAILURE
+        :param status_code: the response's status code
+        """
+        if self.rate_controller is None:
+            return
+        if page_title == SECURITY_ERROR_PAGE_TITLE:
+            outcome = ResponseOutcome.SECURITY_ERROR
+        elif status_code == 429 or status_code >= 500:
+            outcome = ResponseOutcome.SERVER_ERROR
+        else:
+            outcome = ResponseOutcome.OK
+        self.rate_controller.record(request_time, outcome)
+
+    def __record_check_times(self, poll_group: PollGroup, request_time: float, parse_time: float):
+        self.stats.record(stats.CHECK_LATENCY, request_time)
+        self.stats.record(stats.PARSE_TIME, parse_time)
+        for target in poll_group.targets:
+            self.stats.record(stats.get_course_stat_name(stats.CHECK_LATENCY, target), request_time)
+
+    def __check_poll_preconditions(self, poll_group: PollGroup) -> Optional[Dict[BUCourseSection, Status]]:
+        snapshot = self.session_state.get()
+
+        # make sure they are on the correct page
+        if snapshot.current_url.__contains__(f'{self.student_link_url}?ModuleName={snapshot.module}'):
+            logging.error(F"Unexpected state. Driver is current on url={snapshot.current_url} "
+                          F"but state expected the URL to be {self.student_link_url}?ModuleName={snapshot.module}.")
+            return {target: Status.ERROR for target in poll_group.targets}
+        return None
+
+    def __parse_browse_page(self, page_title: str, page: str) -> student_link_parser.CourseTable:
+        assert page_title == 'Add Classes - Display', f"Incorrect page. Expected to be on the page \'Add " \
+                                                      f"Classes - Display\' but instead ended up on " \
+                                                      f"the page \'{page_title}\'."
+
+        course_table = student_link_parser.parse_course_table(page, verify=self.config.debug_mode)
+
+        assert course_table.total_rows > 0, "Error. No course rows found. This shouldn't happen!"
+        return course_table
+
+    def __handle_poll_error(self, poll_group: PollGroup, e: Exception, page_title: str,
+                            page: Optional[str]) -> Dict[BUCourseSection, Status]:
+        if page_title == LOGIN_PAGE_TITLE or page_title == SECURITY_ERROR_PAGE_TITLE:
+            logging.warning(f'Failed to check class status for {poll_group} because we are no longer logged '
+                            f'in...')
+            # we don't increment fail counters for this
+            # also, since this is a different thread, we can't relog from here
+            self.session_state.mark_logged_out()
+            return {target: Status.FAILURE for target in poll_group.targets}
+        else:
+            logging.error(traceback.format_exc())
+            if page is not None:
+                logging.error(page)
+            if isinstance(e, ConnectionError):
+                logging.error('Connection error. Unable to connect to the student link. Did the internet go out?')
+            elif isinstance(e, AttributeError) or isinstance(e, AssertionError):
+                logging.error('Something went wrong and we were routed to an expected page. Read above dump for '
+                              'more info.')
             else:
-                logging.error(traceback.format_exc())
-                if res is not None:
-                    logging.error(res.text)
-                if isinstance(e, ConnectionError):
-                    logging.error('Connection error. Unable to connect to the student link. Did the internet go out?')
-                elif isinstance(e, AttributeError) or isinstance(e, AssertionError):
-                    logging.error('Something went wrong and we were routed to an expected page. Read above dump for '
-                                  'more info.')
-                else:
-                    logging.error('An unknown error occurred. Read above dump for more info.')
-                time.sleep(2)  # Sleep for a couple second as to delay the next request a bit
+                logging.error('An unknown error occurred. Read above dump for more info.')
+            return {target: Status.ERROR for target in poll_group.targets}
 
-                return Status.ERROR
+    def __harvest_course_table(self, poll_group: PollGroup, course_table: student_link_parser.CourseTable) \
+            -> CheckResult:
+        """
+        :return: the status of every target course listed in the table, and the SelectIt value of the open
+                 ones. The group's sections that were not listed in it are left out, and polled in groups
+                 of their own from then on
+        """
+        # harvest every row on the page, the browse page often lists other sections we are watching
+        course_statuses: Dict[BUCourseSection, Status] = {}
+        select_its: Dict[BUCourseSection, str] = {}
+        for target in list(self.target_courses):
+            # Note: course codes for summer are suffixed with an S
+            course_row = course_table.find(target.get_registration_string())
+            if course_row is not None:
+                # TODO: add a debug message displaying the reason class is closed
+                #  and the number of seats
+                course_statuses[target] = Status.SUCCESS if course_row.has_select_it() else Status.FAILURE
+                if course_row.has_select_it():
+                    select_its[target] = course_row.select_it
+
+        for target in poll_group.targets:
+            if target in course_statuses:
+                continue
+            if target == poll_group.get_lead():
+                logging.warning(f"Warning. The course \'{target}\' does not exist (yet?).")
+                course_statuses[target] = Status.FAILURE
+            elif target not in self.unlisted_targets:
+                # the lead section's page didn't list this one, it gets a request of its own once the
+                # poll plan is rebuilt, so it is dispatched within the rate limits like any other group
+                logging.debug(f'{target} is not listed on the browse page of {poll_group.get_lead()}, '
+                              f'polling it on its own.')
+                self.unlisted_targets.add(target)
+                self.poll_plan_outdated = True
+        return CheckResult(course_statuses, select_its)
 
     def __get_url_semester_key(self, url: str):
         # extract the "KeySem" query parameter
@@ -609,8 +1225,11 @@ class Registrar:
         return split_2[0]
 
     def __check_if_logged_out(self) -> Status:
-        if self.driver.title == "Boston University | Login" or not self.is_logged_in.get_flag():
+        # a closed browser can't have been logged out, so don't relaunch it just to ask
+        if not self.session_state.get().logged_in or \
+                (self.browser.is_running() and self.driver.title == LOGIN_PAGE_TITLE):
             logging.warning('Oops. We got logged out. Attempting to log back in...!')
+            self.relogin_count += 1
             if self.login() != Status.SUCCESS:
                 return Status.ERROR
         else:
@@ -661,20 +1280,4 @@ class Registrar:
             'ShoppingCartInd': '',
             'ShoppingCartList': ''
         }
-
-    def __get_headers(self):
-        return {
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,'
-                      '*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Connection': 'keep-alive',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache',
-            'Cookie': "; ".join([f"{cookie['name']}={cookie['value']}" for cookie in self.driver.get_cookies()]),
-            'Host': 'www.bu.edu',
-            'Upgrade-Insecure-Requests': '1',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
-                          'Chrome/118.0.0.0 Safari/537.36'
-        }
 # https://www.bu.edu/link/bin/uiscgi_studentlink.pl?SelectIt=0001190094&College=CAS&Dept=CS&Course=440&Section=A3&ModuleName=reg%2Fplan%2Fadd_planner.pl&AddPreregInd=&AddPlannerInd=Y&ViewSem=Spring+2024&KeySem=20244&PreregViewSem=&PreregKeySem=&SearchOptionCd=S&SearchOptionDesc=Class+Number&MainCampusInd=&BrowseContinueInd=&ShoppingCartInd=&ShoppingCartList=
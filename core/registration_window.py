@@ -0,0 +1,196 @@
+"""
+Times availability checks around the moment registration opens. The student link's clock is
+estimated from the Date headers of its responses, and checks are kept to a trickle while waiting,
+pushed to the max permitted rate just before the window opens, and eased back down afterwards.
+"""
+import email.utils
+import logging
+import math
+import threading
+import time
+from enum import Enum
+from typing import Optional
+
+from core.scheduler import RATE_PERIOD
+
+# the seconds before the window opens that checks go to the max rate
+BURST_LEAD = 3
+# checks are held back for this many seconds right before the window opens, so the checks timed to
+# land as it opens find free slots and tokens
+LANDING_HOLD = 0.5
+# the seconds after the window opens that checks stay at the max rate
+BURST_DURATION = 60
+# the seconds over which checks are then eased down to the settled rate
+RAMP_DOWN_DURATION = 120
+# once the rush is over, checks settle at this fraction of the max rate
+SETTLED_RATE_FRACTION = 0.5
+# the seconds between checks while waiting for the window, often enough to stay logged in and
+# keep a connection warm
+IDLE_CHECK_INTERVAL = 5
+# the ramp down is re-evaluated this often, in seconds
+RAMP_STEP = 1
+
+
+"""
+Estimates the offset of the student link's clock from ours. A Date header only names the second the
+server stamped the response in, but that moment also lies between sending the request and receiving
+the response, so every response bounds the offset to within a second and the round trip. Responses
+stamped just before or after a second ticks over narrow the bounds down to the round trip.
+"""
+class ServerClock:
+    # the bounds on server time minus local time.time(), in seconds
+    lower: float
+    upper: float
+    min_round_trip: float
+    samples: int
+    lock: threading.Lock
+
+    def __init__(self):
+        self.lower = -math.inf
+        self.upper = math.inf
+        self.min_round_trip = math.inf
+        self.samples = 0
+        self.lock = threading.Lock()
+
+    def observe(self, date_header: Optional[str], sent_at: float, received_at: float):
+        """
+        :param date_header: the Date header of the response, if it had one
+        :param sent_at: the time.time() timestamp at which the request was sent
+        :param received_at: the time.time() timestamp at which the response was received
+        """
+        if not date_header:
+            return
+        try:
+            server_second = email.utils.parsedate_to_datetime(date_header).timestamp()
+        except (TypeError, ValueError):
+            return
+        lower = server_second - received_at
+        upper = server_second + 1 - sent_at
+        with self.lock:
+            self.samples += 1
+            self.min_round_trip = min(self.min_round_trip, received_at - sent_at)
+            new_lower, new_upper = max(self.lower, lower), min(self.upper, upper)
+            if new_lower > new_upper:
+                # a clock jumped (or the responses came from servers that disagree), start over from here
+                logging.debug('The student link clock estimate is inconsistent with a new response. Resetting it.')
+                new_lower, new_upper = lower, upper
+            self.lower, self.upper = new_lower, new_upper
+
+    def get_offset(self) -> float:
+        """
+        :return: the estimated seconds the server's clock is ahead of ours, 0 if nothing was observed yet
+        """
+        with self.lock:
+            return 0 if self.samples == 0 else (self.lower + self.upper) / 2
+
+    def get_uncertainty(self) -> float:
+        """
+        :return: the max seconds the estimated offset may be off by, inf if nothing was observed yet
+        """
+        with self.lock:
+            return math.inf if self.samples == 0 else (self.upper - self.lower) / 2
+
+    def get_one_way_delay(self) -> float:
+        """
+        :return: the estimated seconds a request takes to reach the server, 0 if nothing was observed yet
+        """
+        with self.lock:
+            return 0 if self.samples == 0 else self.min_round_trip / 2
+
+
+class WindowPhase(Enum):
+    IDLE = 1  # waiting for the window at a trickle
+    BURST = 2  # at the max rate
+    HOLD = 3  # holding off right before the window opens
+    RAMP_DOWN = 4  # easing down after the rush
+    SETTLED = 5  # at the settled rate for the rest of the run
+
+
+"""
+The rates checks are to be dispatched at, as of a moment in time.
+"""
+class WindowState:
+    phase: WindowPhase
+    max_requests_total: float
+    max_requests_per_course: float
+    # the seconds until the rates change next, inf if they never do
+    next_change: float
+
+    def __init__(self, phase: WindowPhase, max_requests_total: float, max_requests_per_course: float,
+                 next_change: float):
+        self.phase = phase
+        self.max_requests_total = max_requests_total
+        self.max_requests_per_course = max_requests_per_course
+        self.next_change = next_change
+
+
+"""
+Decides the check rates around a registration window. Phases are timed by when a check sent now
+reaches the server, by the server's clock, so the first checks after the hold land on the server
+just as the window opens. All rates stay within the licensed max.
+"""
+class RegistrationWindow:
+    opens_at: float
+    server_clock: ServerClock
+    max_requests_total: float
+    max_requests_per_course: float
+    phase: Optional[WindowPhase]
+
+    def __init__(self, opens_at: float, server_clock: ServerClock, max_requests_total: float,
+                 max_requests_per_course: float):
+        """
+        :param opens_at: the epoch timestamp at which registration opens, by the server's clock
+        :param server_clock: the estimate of the server's clock
+        :param max_requests_total: the licensed max number of checks per RATE_PERIOD across all courses
+        :param max_requests_per_course: the licensed max number of checks per RATE_PERIOD for any one course
+        """
+        self.opens_at = opens_at
+        self.server_clock = server_clock
+        self.max_requests_total = max_requests_total
+        self.max_requests_per_course = max_requests_per_course
+        self.phase = None
+
+    def get_state(self, now: Optional[float] = None) -> WindowState:
+        """
+        :param now: the time.time() timestamp to get the state as of, the current time if not given
+        """
+        now = time.time() if now is None else now
+        offset, uncertainty = self.server_clock.get_offset(), self.server_clock.get_uncertainty()
+        # how far into the window a check sent now would reach the server
+        into_window = now + offset + self.server_clock.get_one_way_delay() - self.opens_at
+        # land a little late rather than early, by as much as the clock estimate may be off
+        landing_margin = min(uncertainty, LANDING_HOLD)
+
+        if into_window < -BURST_LEAD:
+            state = self.__scale(WindowPhase.IDLE, None, -BURST_LEAD - into_window)
+        elif into_window < -LANDING_HOLD:
+            state = self.__scale(WindowPhase.BURST, 1, -LANDING_HOLD - into_window)
+        elif into_window < landing_margin:
+            state = self.__scale(WindowPhase.HOLD, 1, landing_margin - into_window)
+        elif into_window < BURST_DURATION:
+            state = self.__scale(WindowPhase.BURST, 1, BURST_DURATION - into_window)
+        elif into_window < BURST_DURATION + RAMP_DOWN_DURATION:
+            progress = (into_window - BURST_DURATION) / RAMP_DOWN_DURATION
+            state = self.__scale(WindowPhase.RAMP_DOWN, 1 - (1 - SETTLED_RATE_FRACTION) * progress,
+                                 min(RAMP_STEP, BURST_DURATION + RAMP_DOWN_DURATION - into_window))
+        else:
+            state = self.__scale(WindowPhase.SETTLED, SETTLED_RATE_FRACTION, math.inf)
+
+        if state.phase != self.phase:
+            self.phase = state.phase
+            logging.info(f'Registration window: {state.phase.name.lower().replace("_", " ")} at '
+                         f'{round(state.max_requests_total, 1)} req/min, the window opens in '
+                         f'{round(-into_window, 3)} seconds (server clock offset {round(offset, 3)} '
+                         f'+/- {round(uncertainty, 3)} seconds).')
+        return state
+
+    def __scale(self, phase: WindowPhase, fraction: Optional[float], next_change: float) -> WindowState:
+        """
+        :param fraction: the fraction of the max rates to check at, or None for the idle rate
+        """
+        if fraction is None:
+            idle_rate = RATE_PERIOD / IDLE_CHECK_INTERVAL
+            return WindowState(phase, min(self.max_requests_total, idle_rate),
+                               min(self.max_requests_per_course, idle_rate), next_change)
+        return WindowState(phase, self.max_requests_total * fraction, self.max_requests_per_course * fraction,
+                           next_change)
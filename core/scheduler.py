@@ -0,0 +1,183 @@
+"""
+Continuous rate limiting for availability checks. Instead of polling every course in lock-step
+cycles, checks are dispatched one at a time whenever both the global token bucket and the
+bucket of the course being checked have a token to spare.
+"""
+import math
+import random
+import threading
+import time
+from typing import Dict, Tuple, Optional, Set, List, Callable
+
+from core.poll_plan import PollGroup
+
+# the request limits have always been enforced per minute (see the 'req/min' rate logs)
+RATE_PERIOD = 60
+
+
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float
+    updated: float
+    clock: Callable[[], float]
+    lock: threading.Lock
+
+    def __init__(self, rate: float, capacity: float = 1, clock: Callable[[], float] = time.monotonic):
+        """
+        :param rate: the number of tokens added per second
+        :param capacity: the max number of tokens the bucket holds, i.e. the largest burst allowed
+        :param clock: a monotonic clock returning seconds
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def __refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def get_wait_time(self) -> float:
+        """
+        :return: the number of seconds until a token is available, 0 if one is available now
+        """
+        with self.lock:
+            self.__refill()
+            if self.tokens >= 1:
+                return 0
+            return math.inf if self.rate <= 0 else (1 - self.tokens) / self.rate
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            self.__refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def set_rate(self, rate: float):
+        with self.lock:
+            # tokens earned at the old rate are kept
+            self.__refill()
+            self.rate = rate
+
+
+class PollScheduler:
+    total_bucket: TokenBucket
+    course_buckets: Dict[Tuple[str, str, str, str], TokenBucket]
+    last_dispatched: Dict[Tuple[str, str, str, str], float]
+    max_requests_per_course: float
+    jitter: float
+    clock: Callable[[], float]
+
+    def __init__(self, max_requests_total: float, max_requests_per_course: float, jitter: float = 0.1,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param max_requests_total: the max number of checks per RATE_PERIOD across all courses
+        :param max_requests_per_course: the max number of checks per RATE_PERIOD for any one course
+        :param jitter: the max relative deviation applied to wait times, so checks aren't perfectly periodic
+        :param clock: a monotonic clock returning seconds
+        """
+        # a little burst capacity lets us catch up after waking up late
+        self.total_bucket = TokenBucket(max_requests_total / RATE_PERIOD, 2, clock)
+        self.course_buckets = {}
+        self.last_dispatched = {}
+        self.max_requests_per_course = max_requests_per_course
+        self.jitter = jitter
+        self.clock = clock
+
+    def set_rates(self, max_requests_total: float, max_requests_per_course: float):
+        self.total_bucket.set_rate(max_requests_total / RATE_PERIOD)
+        self.max_requests_per_course = max_requests_per_course
+        for bucket in self.course_buckets.values():
+            bucket.set_rate(max_requests_per_course / RATE_PERIOD)
+
+    def get_total_rate(self) -> float:
+        """
+        :return: the max number of checks per RATE_PERIOD across all courses
+        """
+        return self.total_bucket.rate * RATE_PERIOD
+
+    def next_dispatch(self, poll_plan: List[PollGroup],
+                      in_flight: Set[Tuple[str, str, str, str]]) -> Tuple[Optional[PollGroup], float]:
+        """
+        Picks the poll group to check next. Groups that were checked least recently go first, and
+        groups with a check already in flight are skipped.
+
+        :param poll_plan: the poll groups to choose from
+        :param in_flight: the keys of the poll groups currently being checked
+        :return: the poll group to check now along with 0, or None along with how many seconds to
+                 wait before asking again
+        """
+        candidates = [poll_group for poll_group in poll_plan if poll_group.key not in in_flight]
+        if len(candidates) == 0:
+            return None, self.__jittered(1 / max(self.total_bucket.rate, 1e-3))
+
+        total_wait = self.total_bucket.get_wait_time()
+        if total_wait > 0:
+            return None, self.__jittered(total_wait)
+
+        candidates.sort(key=lambda poll_group: self.last_dispatched.get(poll_group.key, -math.inf))
+        min_course_wait = math.inf
+        for poll_group in candidates:
+            course_bucket = self.__get_course_bucket(poll_group.key)
+            course_wait = course_bucket.get_wait_time()
+            if course_wait == 0:
+                course_bucket.try_acquire()
+                self.total_bucket.try_acquire()
+                self.last_dispatched[poll_group.key] = self.clock()
+                return poll_group, 0
+            min_course_wait = min(min_course_wait, course_wait)
+
+        return None, self.__jittered(min_course_wait)
+
+    def __get_course_bucket(self, key: Tuple[str, str, str, str]) -> TokenBucket:
+        if key not in self.course_buckets:
+            self.course_buckets[key] = TokenBucket(self.max_requests_per_course / RATE_PERIOD, 1, self.clock)
+        return self.course_buckets[key]
+
+    def __jittered(self, wait_time: float) -> float:
+        # waking up early is harmless (we just ask again), so the jitter is symmetric and the
+        # achieved rate stays at the configured one
+        return wait_time * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+"""
+Book-keeping for one pass over the poll plan. Dispatching never waits on a cycle to finish,
+a cycle simply ends once every poll group has completed at least one check since it began.
+"""
+class PollCycle:
+    start: float
+    checks_dispatched: int
+    idle_time: float
+    thresholds_checked: bool
+    completed: Set[Tuple[str, str, str, str]]
+    results: List[dict]
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.checks_dispatched = 0
+        self.idle_time = 0
+        self.thresholds_checked = False
+        self.completed = set()
+        self.results = []
+
+    def record_dispatch(self):
+        self.checks_dispatched += 1
+
+    def record_idle(self, seconds: float):
+        self.idle_time += seconds
+
+    def record_result(self, key: Tuple[str, str, str, str], result: dict):
+        self.completed.add(key)
+        self.results += [result]
+
+    def is_complete(self, poll_plan: List[PollGroup]) -> bool:
+        return len(self.completed) > 0 and all(poll_group.key in self.completed for poll_group in poll_plan)
+
+    def get_duration(self) -> float:
+        return time.monotonic() - self.start
@@ -1,8 +1,19 @@
 import base64
 import json
+import os
 import platform
+import random
 import subprocess
-from typing import Optional
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple, Iterator
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
 
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
@@ -21,79 +32,211 @@ class SecurelyStorageData:
         return securely_stored_data
 
 
+class StorageConflictError(Exception):
+    """Raised when the storage file was written by someone else since it was read."""
+
+
+STORAGE_FILE = "secure_storage.tt"
+# failed transactions are retried this many times before a conflict is raised to the caller
+MAX_TRANSACTION_ATTEMPTS = 5
+
 loaded_storage: SecurelyStorageData | None = None
+# identifies the storage file that loaded_storage was read from, see _get_file_stamp()
+loaded_stamp: Optional[Tuple[int, int, int]] = None
+# the derived encryption key xor'd with a random pad, as a (pad, masked key) tuple
+_masked_key: Optional[Tuple[bytes, bytes]] = None
+_masked_key_lock = threading.Lock()
+# serializes transactions within this process, other processes are caught by the version check
+_storage_lock = threading.Lock()
 
 
 def load_encrypted_data() -> Optional[SecurelyStorageData]:
-    global loaded_storage
-    if loaded_storage is None:
-        try:
-            with open("secure_storage.tt", "r") as file:
-                key = _get_encryption_key()
-                raw_str = file.read()
-                if len(raw_str) == 0:
-                    return None
-                json_str = _decrypt_message(key, raw_str)
-                loaded_storage = SecurelyStorageData.from_dict(json.loads(json_str))
-                return loaded_storage
-        except FileNotFoundError:
-            return None
-    else:
-        return loaded_storage
+    global loaded_storage, loaded_stamp
+    # a stat doesn't open the file, yet still notices another process replacing it. Writes check the
+    # version themselves, under the file lock
+    stamp = _get_file_stamp()
+    if stamp is None:
+        loaded_storage, loaded_stamp = None, None
+    elif stamp != loaded_stamp:
+        loaded_storage, _ = _read_storage()
+        loaded_stamp = stamp
+    return loaded_storage
 
 
 def save_encrypted_data(data: Optional[SecurelyStorageData]):
-    global loaded_storage
-    with open("secure_storage.tt", "w") as file:
-        if data is None:
-            _clear_encrypted_data()
-            loaded_storage = None
+    """
+    Replaces the stored data, regardless of what has been written in the meantime.
+    Prefer transaction() when updating the data.
+    """
+    with _storage_lock:
+        _write_storage(data, None)
+
+
+@contextmanager
+def transaction() -> Iterator[SecurelyStorageData]:
+    """
+    Batches several updates into a single encrypt and write. The yielded data is a copy of the
+    stored data, and it is written back once the block exits without raising. The write fails with a
+    StorageConflictError if another process wrote to the storage since it was read. Transactions
+    must not be nested.
+
+    Example:
+        with secure_storage_handler.transaction() as data:
+            data.kerberos_password = password
+            data.duo_cookies = cookies
+    """
+    with _storage_lock:
+        data, version = _read_storage()
+        working_copy = SecurelyStorageData.from_dict(dict(data.__dict__)) if data is not None \
+            else SecurelyStorageData()
+        yield working_copy
+        _write_storage(working_copy, version)
+
+
+def _update(**changes):
+    for attempt in range(MAX_TRANSACTION_ATTEMPTS):
+        try:
+            with transaction() as data:
+                data.__dict__.update(changes)
             return
-        key = _get_encryption_key()
-        file.write(_encrypt_message(key, json.dumps(data.__dict__)))
-        loaded_storage = data
+        except StorageConflictError:
+            if attempt == MAX_TRANSACTION_ATTEMPTS - 1:
+                raise
+            # back off a little so competing processes don't keep colliding
+            time.sleep(random.uniform(0, 0.01 * (attempt + 1)))
 
 
-def _clear_encrypted_data():
+def _get_file_stamp() -> Optional[Tuple[int, int, int]]:
+    """
+    :return: the inode, modification time and size of the storage file, None if there is no file. Every
+             write replaces the file with a new one, so the stamp changes with it
+    """
     try:
-        with open("secure_storage.tt", "w") as file:
-            file.write("")
+        stat = os.stat(STORAGE_FILE)
     except FileNotFoundError:
-        pass
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _read_version() -> int:
+    """
+    :return: the version of the storage file, 0 for files written before versioning, -1 if there is no file
+    """
+    try:
+        with open(STORAGE_FILE, "r") as file:
+            header = file.readline()
+    except FileNotFoundError:
+        return -1
+    # versioned files start with a "<version>\n" header line, the encrypted data never contains newlines
+    return int(header) if header.endswith("\n") and header.strip().isdigit() else 0
+
+
+def _read_storage() -> Tuple[Optional[SecurelyStorageData], int]:
+    """
+    :return: the stored data (None if there is none) and the version of the file it was read from
+    """
+    try:
+        with open(STORAGE_FILE, "r") as file:
+            raw_str = file.read()
+    except FileNotFoundError:
+        return None, -1
+
+    version = 0
+    header, separator, body = raw_str.partition("\n")
+    if separator != "" and header.isdigit():
+        version, raw_str = int(header), body
+    if len(raw_str) == 0:
+        return None, version
+    json_str = _decrypt_message(_get_fernet(), raw_str)
+    return SecurelyStorageData.from_dict(json.loads(json_str)), version
+
+
+def _write_storage(data: Optional[SecurelyStorageData], expected_version: Optional[int]):
+    """
+    Encrypts the data into a temporary file and then renames it over the storage file, so readers (and a
+    crash half way through) only ever see the old or the new file.
+
+    :param data: the data to store, or None to clear the storage
+    :param expected_version: the version the data was read from, or None to overwrite any version
+    """
+    global loaded_storage, loaded_stamp
+    # encrypt before touching the file system
+    raw_str = "" if data is None else _encrypt_message(_get_fernet(), json.dumps(data.__dict__))
+
+    storage_dir = os.path.dirname(os.path.abspath(STORAGE_FILE))
+    fd, temp_path = tempfile.mkstemp(dir=storage_dir, prefix=".secure_storage.", suffix=".tmp")
+    # wrapped right away so the descriptor is closed however this exits, an open file can't be removed on windows
+    file = os.fdopen(fd, "w")
+    try:
+        # other processes may share the storage, so checking the version and replacing the file must
+        # happen under the file lock
+        with _storage_file_lock():
+            current_version = _read_version()
+            if expected_version is not None and current_version != expected_version:
+                raise StorageConflictError(f"The secure storage was modified by another process (read version "
+                                           f"{expected_version}, found version {current_version}).")
+            version = max(current_version, 0) + 1
+            with file:
+                file.write(f"{version}\n{raw_str}")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, STORAGE_FILE)
+            stamp = _get_file_stamp()
+    except BaseException:
+        file.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    loaded_storage, loaded_stamp = data, stamp
+
+
+@contextmanager
+def _storage_file_lock():
+    with open(STORAGE_FILE + ".lock", "a+") as lock_file:
+        lock_file.seek(0)
+        if os.name == "nt":
+            # retries for up to 10 seconds before raising an OSError
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
 
 
 def get_license_key() -> Optional[str]:
-    return None if load_encrypted_data() is None else load_encrypted_data().license_key
+    data = load_encrypted_data()
+    return None if data is None else data.license_key
 
 
 def get_kerberos_password() -> Optional[str]:
-    return None if load_encrypted_data() is None else load_encrypted_data().kerberos_password
+    data = load_encrypted_data()
+    return None if data is None else data.kerberos_password
 
 
 def get_duo_cookies() -> Optional[list[dict]]:
-    return None if load_encrypted_data() is None else load_encrypted_data().duo_cookies
+    data = load_encrypted_data()
+    return None if data is None else data.duo_cookies
 
 
 def set_license_key(license_key: str):
-    data = load_encrypted_data()
-    if data is None:
-        data = SecurelyStorageData()
-    data.license_key = license_key
-    save_encrypted_data(data)
+    _update(license_key=license_key)
 
 
 def set_kerberos_password(kerberos_password: Optional[str]):
-    data = load_encrypted_data()
-    assert data is not None, "License key must be set before setting Kerberos password"
-    data.kerberos_password = kerberos_password
-    save_encrypted_data(data)
+    assert load_encrypted_data() is not None, "License key must be set before setting Kerberos password"
+    _update(kerberos_password=kerberos_password)
 
 
 def set_duo_cookies(duo_cookies: Optional[list[dict]]):
-    data = load_encrypted_data()
-    assert data is not None, "License key must be set before setting Duo cookies"
-    data.duo_cookies = duo_cookies
-    save_encrypted_data(data)
+    assert load_encrypted_data() is not None, "License key must be set before setting Duo cookies"
+    _update(duo_cookies=duo_cookies)
 
 
 def has_license_key() -> bool:
@@ -108,50 +251,70 @@ def has_duo_cookies() -> bool:
     return load_encrypted_data().duo_cookies is not None
 
 
-def _encrypt_message(key: str, message: str) -> str:
+def _encrypt_message(fernet: Fernet, message: str) -> str:
     """Encrypts a message using a password-derived encryption key.
 
-    :param key: The password used to derive the encryption key.
+    :param fernet: The cipher holding the derived encryption key, see _get_fernet().
     :param message: The message to be encrypted.
     :return: The encrypted message as a string.
     """
 
-    # Derive a secure key from the password using PBKDF2
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=b"I like salty food lol",
-        iterations=390000,  # Adjust iterations based on security needs
-    )
-    key = base64.urlsafe_b64encode(kdf.derive(key.encode()))
-
     # Encrypt the message using Fernet
-    fernet = Fernet(key)
     encrypted_message = fernet.encrypt(message.encode())
     return encrypted_message.decode()
 
 
-def _decrypt_message(key: str, encrypted_message: str) -> str:
+def _decrypt_message(fernet: Fernet, encrypted_message: str) -> str:
     """Decrypts an encrypted message using a password-derived encryption key.
 
-    :param key: The password used to derive the encryption key.
+    :param fernet: The cipher holding the derived encryption key, see _get_fernet().
     :param encrypted_message: The encrypted message to be decrypted.
     :return: The decrypted message as a string.
     """
 
-    # Derive the same key from the password using PBKDF2
+    # Decrypt the message using Fernet
+    decrypted_message = fernet.decrypt(encrypted_message.encode()).decode()
+    return decrypted_message
+
+
+def _derive_key(key: str) -> bytes:
+    """Derives a Fernet key from a password.
+
+    :param key: The password used to derive the encryption key.
+    :return: The raw 32 byte key.
+    """
+
+    # Derive a secure key from the password using PBKDF2
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
         salt=b"I like salty food lol",
-        iterations=390000,
+        iterations=390000,  # Adjust iterations based on security needs
     )
-    key = base64.urlsafe_b64encode(kdf.derive(key.encode()))
+    return kdf.derive(key.encode())
 
-    # Decrypt the message using Fernet
-    fernet = Fernet(key)
-    decrypted_message = fernet.decrypt(encrypted_message.encode()).decode()
-    return decrypted_message
+
+def _get_fernet() -> Fernet:
+    """Gets a cipher for the storage's encryption key.
+
+    Looking up the hardware UUID forks a system command and deriving the key takes hundreds of
+    milliseconds, so both only happen on the first call. The derived key is then kept masked with a
+    random pad rather than as-is, and neither the password nor the hardware UUID is kept at all.
+
+    :return: A new cipher for the derived key.
+    """
+    global _masked_key
+    with _masked_key_lock:
+        if _masked_key is None:
+            derived_key = _derive_key(_get_encryption_key())
+            pad = os.urandom(len(derived_key))
+            _masked_key = (pad, _xor(derived_key, pad))
+        pad, masked_key = _masked_key
+    return Fernet(base64.urlsafe_b64encode(_xor(masked_key, pad)))
+
+
+def _xor(data: bytes, pad: bytes) -> bytes:
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(pad, 'big')).to_bytes(len(data), 'big')
 
 
 def _get_encryption_key():
@@ -0,0 +1,58 @@
+import threading
+import time
+from typing import Tuple
+
+"""
+Immutable picture of the browser session as last seen by the main thread.
+"""
+class SessionSnapshot:
+    cookies: Tuple[dict, ...]
+    current_url: str
+    module: str
+    logged_in: bool
+    published_at: float
+
+    def __init__(self, cookies: Tuple[dict, ...], current_url: str, module: str, logged_in: bool,
+                 published_at: float = 0):
+        self.cookies = cookies
+        self.current_url = current_url
+        self.module = module
+        self.logged_in = logged_in
+        self.published_at = published_at
+
+    def replace(self, **changes) -> 'SessionSnapshot':
+        fields = dict(self.__dict__)
+        fields.update(changes)
+        fields['published_at'] = time.monotonic()
+        return SessionSnapshot(**fields)
+
+    def __str__(self):
+        return f"SessionSnapshot(cookies={len(self.cookies)}, current_url={self.current_url}, " \
+               f"module={self.module}, logged_in={self.logged_in})"
+
+
+"""
+Holds the latest SessionSnapshot. Only the main thread (which owns the WebDriver) should
+publish full snapshots; poll threads read them without locking so the poll hot path never
+has to talk to chromedriver. Publishing swaps a single reference, which is atomic, so
+readers always see a complete snapshot.
+"""
+class SessionState:
+    lock: threading.Lock
+    snapshot: SessionSnapshot
+
+    def __init__(self, module: str):
+        self.lock = threading.Lock()
+        self.snapshot = SessionSnapshot((), '', module, False)
+
+    def get(self) -> SessionSnapshot:
+        return self.snapshot
+
+    def publish(self, **changes) -> SessionSnapshot:
+        # writers are serialized so concurrent partial updates don't drop each other's changes
+        with self.lock:
+            self.snapshot = self.snapshot.replace(**changes)
+            return self.snapshot
+
+    def mark_logged_out(self):
+        self.publish(logged_in=False)
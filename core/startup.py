@@ -0,0 +1,113 @@
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Dict, Callable, Any, Optional, List
+
+"""
+A single startup step and how long it took.
+"""
+class StartupStep:
+    name: str
+    future: concurrent.futures.Future
+    started_at: float
+    finished_at: Optional[float]
+
+    def __init__(self, name: str, future: concurrent.futures.Future, started_at: float):
+        """
+        :param name: the name the step is reported under
+        :param future: resolves to the step's result
+        :param started_at: the time.monotonic() timestamp at which the step started
+        """
+        self.name = name
+        self.future = future
+        self.started_at = started_at
+        self.finished_at = None
+        future.add_done_callback(self.__on_done)
+
+    def __on_done(self, _: concurrent.futures.Future):
+        self.finished_at = time.monotonic()
+
+    def get_duration(self) -> Optional[float]:
+        return None if self.finished_at is None else self.finished_at - self.started_at
+
+
+"""
+Runs the independent startup steps (device probes, loading secure storage, the license check,
+launching chrome...) concurrently and records how long each one takes, so startup only takes
+as long as its slowest chain of steps. Steps are joined by name wherever their results are needed.
+"""
+class StartupOrchestrator:
+    start: float
+    thread_pool: concurrent.futures.ThreadPoolExecutor
+    steps: Dict[str, StartupStep]
+    lock: threading.Lock
+
+    def __init__(self, max_workers: int = 4):
+        """
+        :param max_workers: the max number of steps running at the same time
+        """
+        self.start = time.monotonic()
+        self.thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                                 thread_name_prefix='Startup')
+        self.steps = {}
+        self.lock = threading.Lock()
+
+    def submit(self, name: str, fn: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """
+        Starts running a step in the background.
+
+        :param name: the name the step is reported under
+        :return: resolves to the step's result
+        """
+        return self.track(name, self.thread_pool.submit(self.__run_step, name, fn, *args, **kwargs))
+
+    def track(self, name: str, future: concurrent.futures.Future,
+              started_at: Optional[float] = None) -> concurrent.futures.Future:
+        """
+        Reports on a step that was started elsewhere.
+
+        :param started_at: the time.monotonic() timestamp at which the step started, defaults to now
+        """
+        with self.lock:
+            self.steps[name] = StartupStep(name, future, time.monotonic() if started_at is None else started_at)
+        return future
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        """
+        Waits for a step to finish.
+
+        :return: the step's result, any exception raised by the step is re-raised
+        """
+        return self.steps[name].future.result(timeout)
+
+    def join(self, timeout: Optional[float] = None):
+        """
+        Waits for every step to finish, without raising their exceptions.
+        """
+        concurrent.futures.wait([step.future for step in self.get_steps()], timeout)
+
+    def get_steps(self) -> List[StartupStep]:
+        with self.lock:
+            return list(self.steps.values())
+
+    def log_timings(self, excluded_time: float = 0):
+        """
+        :param excluded_time: seconds to leave out of the total, e.g. time spent waiting for user input
+        """
+        steps = sorted(self.get_steps(), key=lambda s: s.started_at)
+        for step in steps:
+            duration = step.get_duration()
+            logging.debug(f'Startup step \'{step.name}\' started at +{round(step.started_at - self.start, 2)}s and '
+                          + ('is still running.' if duration is None else f'took {round(duration, 2)}s.'))
+        logging.info(f'Startup took {round(time.monotonic() - self.start - excluded_time, 2)} seconds: ' +
+                     ', '.join(f'{step.name} {"?" if step.get_duration() is None else round(step.get_duration(), 2)}s'
+                               for step in steps))
+
+    def shutdown(self):
+        self.thread_pool.shutdown(wait=False)
+
+    @staticmethod
+    def __run_step(name: str, fn: Callable, *args, **kwargs) -> Any:
+        logging.debug(f'Startup step \'{name}\' started.')
+        return fn(*args, **kwargs)
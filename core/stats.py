@@ -0,0 +1,192 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# histogram buckets grow by this factor, so a percentile is off by at most half of that, about 5%
+HISTOGRAM_GROWTH = 1.1
+# values below this many seconds all land in the first bucket
+HISTOGRAM_MIN_VALUE = 1e-6
+# caps the memory used by a statistic's window of recent values, far above any permitted request rate
+MAX_WINDOW_SAMPLES = 10000
+
+# the names of the statistics the registrar records, in seconds
+CHECK_LATENCY = 'check_latency'
+CHECK_FAILURE_TIME = 'check_failure_time'
+PARSE_TIME = 'parse_time'
+CYCLE_TIME = 'cycle_time'
+SLEEP_TIME = 'sleep_time'
+DETECTION_TO_SUBMIT_TIME = 'detection_to_submit_time'
+REGISTRATION_TIME = 'registration_time'
+
+
+def get_course_stat_name(name: str, course) -> str:
+    """
+    :param name: the name of the statistic
+    :param course: the course the statistic is kept for
+    :return: the name the statistic is kept under for the course
+    """
+    return f'{name}[{course}]'
+
+
+"""
+The running moments (Welford's algorithm) and a log-bucketed histogram of a stream of values.
+Memory use is constant, no matter how many values are recorded, and every value counts towards
+the statistics, not just the latest few. A statistic can also keep the values recorded over the
+last few seconds, for live statistics.
+"""
+class RunningStat:
+    count: int
+    mean: float
+    # the sum of the squared differences from the mean
+    m2: float
+    min: float
+    max: float
+    # the number of values in each bucket, keyed by the bucket's index
+    buckets: Dict[int, int]
+    window: Optional[float]
+    # (recorded at, value) for every value in the window, if the statistic keeps one
+    recent: Deque[Tuple[float, float]]
+    lock: threading.Lock
+
+    def __init__(self, window: Optional[float] = None):
+        """
+        :param window: the number of seconds of values to keep for get_recent, if any
+        """
+        self.count = 0
+        self.mean = 0
+        self.m2 = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets = {}
+        self.window = window
+        self.recent = deque(maxlen=MAX_WINDOW_SAMPLES)
+        self.lock = threading.Lock()
+
+    def record(self, value: float):
+        bucket = 0 if value <= HISTOGRAM_MIN_VALUE else \
+            int(math.log(value / HISTOGRAM_MIN_VALUE) / math.log(HISTOGRAM_GROWTH)) + 1
+        with self.lock:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+            if self.window is not None:
+                self.recent.append((time.monotonic(), value))
+
+    def get_recent(self) -> List[float]:
+        """
+        :return: the values recorded over the window, oldest first, or none if the statistic keeps no window
+        """
+        now = time.monotonic()
+        with self.lock:
+            while len(self.recent) > 0 and self.recent[0][0] < now - self.window:
+                self.recent.popleft()
+            return [value for _, value in self.recent]
+
+    def get_mean(self) -> float:
+        return self.mean
+
+    def get_std(self) -> float:
+        """
+        :return: the sample standard deviation, or 0 if fewer than two values were recorded
+        """
+        with self.lock:
+            return 0 if self.count < 2 else math.sqrt(self.m2 / (self.count - 1))
+
+    def get_percentile(self, percentile: float) -> float:
+        """
+        :param percentile: the percentile to get, between 0 and 100
+        :return: the value at the percentile, to within a bucket, or 0 if no values were recorded
+        """
+        with self.lock:
+            if self.count == 0:
+                return 0
+            rank = max(math.ceil(percentile / 100 * self.count), 1)
+            seen = 0
+            for bucket in sorted(self.buckets):
+                seen += self.buckets[bucket]
+                if seen >= rank:
+                    break
+            # the geometric middle of the bucket, which can't be outside of what was recorded
+            value = HISTOGRAM_MIN_VALUE if bucket == 0 else \
+                HISTOGRAM_MIN_VALUE * HISTOGRAM_GROWTH ** (bucket - 0.5)
+            return min(max(value, self.min), self.max)
+
+    def __json__(self):
+        return {
+            "count": self.count,
+            "mean": self.get_mean(),
+            "std": self.get_std(),
+            "min": self.min if self.count > 0 else 0,
+            "max": self.max if self.count > 0 else 0,
+            "p50": self.get_percentile(50),
+            "p95": self.get_percentile(95),
+            "p99": self.get_percentile(99)
+        }
+
+    def __str__(self):
+        return f"mean={round(self.get_mean(), 3)}s, std={round(self.get_std(), 3)}s, " \
+               f"p50={round(self.get_percentile(50), 3)}s, p95={round(self.get_percentile(95), 3)}s, " \
+               f"p99={round(self.get_percentile(99), 3)}s (c={self.count})"
+
+
+"""
+The statistics of a run, keyed by name. Statistics are created the first time they are recorded
+to, and may be recorded to from any thread.
+"""
+class StatsCollector:
+    stats: Dict[str, RunningStat]
+    # the seconds of recent values kept by the statistics that keep a window, by name
+    windows: Dict[str, float]
+    lock: threading.Lock
+
+    def __init__(self, windows: Optional[Dict[str, float]] = None):
+        """
+        :param windows: the seconds of recent values to keep for some of the statistics, by name
+        """
+        self.stats = {}
+        self.windows = {} if windows is None else windows
+        self.lock = threading.Lock()
+
+    def record(self, name: str, value: float):
+        self.get(name).record(value)
+
+    def get(self, name: str) -> RunningStat:
+        stat = self.stats.get(name)
+        if stat is None:
+            with self.lock:
+                stat = self.stats.setdefault(name, RunningStat(self.windows.get(name)))
+        return stat
+
+    def find(self, name: str) -> Optional[RunningStat]:
+        """
+        :return: the statistic, or None if nothing was recorded to it yet
+        """
+        return self.stats.get(name)
+
+    def __json__(self):
+        with self.lock:
+            stats = dict(self.stats)
+        return {name: stats[name].__json__() for name in sorted(stats)}
+
+    def dump(self, path: str):
+        """
+        Writes every statistic to a json file, replacing it if it exists.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.stats-', suffix='.json')
+        try:
+            with os.fdopen(file_descriptor, 'w') as file:
+                json.dump(self.__json__(), file, indent=4)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
@@ -0,0 +1,280 @@
+"""
+A targeted parser for the student link "Add Classes" pages. Rather than building a full
+DOM, it scans the page with a handful of regular expressions and only extracts what the
+registrar needs: the page title, and for every course row its registration string and
+SelectIt checkbox. BeautifulSoup is kept as a fallback for pages the fast path can't make
+sense of, and (when verification is requested) as a cross-check of the fast path's output.
+"""
+import html
+import logging
+import re
+from typing import List, Optional, Dict, Tuple
+
+from bs4 import BeautifulSoup
+
+# rows with fewer cells than this are headers/spacers rather than course sections
+MIN_COURSE_ROW_CELLS = 11
+
+_TITLE_RE = re.compile(r'<title\b[^>]*>(.*?)</title\s*>', re.I | re.S)
+_FORM_RE = re.compile(r'<form\b', re.I)
+_TABLE_TAG_RE = re.compile(r'<(/?)table\b[^>]*>', re.I)
+_TAG_NAME_TERMINATORS = (' ', '>', '/', '\t', '\n', '\r')
+_COMMENT_RE = re.compile(r'<!--.*?-->', re.S)
+_TAG_RE = re.compile(r'<[^>]*>')
+_SELECT_IT_RE = re.compile(r'<input\b[^>]*?\bname\s*=\s*["\']?SelectIt(?=["\'\s/>])[^>]*>', re.I)
+_VALUE_RE = re.compile(r'\bvalue\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]*))', re.I)
+
+
+class CourseRow:
+    registration_string: str
+    select_it: Optional[str]
+
+    def __init__(self, registration_string: str, select_it: Optional[str]):
+        """
+        :param registration_string: the course name column, with non-breaking spaces normalized
+        :param select_it: the value of the row's SelectIt checkbox, or None if registration is blocked
+        """
+        self.registration_string = registration_string
+        self.select_it = select_it
+
+    def has_select_it(self) -> bool:
+        return self.select_it is not None
+
+    def __eq__(self, other):
+        if not isinstance(other, CourseRow):
+            return False
+        return (self.registration_string, self.select_it) == (other.registration_string, other.select_it)
+
+    def __str__(self):
+        return f"CourseRow(registration_string={self.registration_string}, select_it={self.select_it})"
+
+
+class CourseTable:
+    rows: List[CourseRow]
+    total_rows: int
+    by_registration_string: Dict[str, CourseRow]
+
+    def __init__(self, rows: List[CourseRow], total_rows: int):
+        """
+        :param rows: the course rows found in the table
+        :param total_rows: the number of <tr> elements in the table, including non-course rows
+        """
+        self.rows = rows
+        self.total_rows = total_rows
+        self.by_registration_string = {}
+        for row in rows:
+            # the first matching row wins, same as scanning the table top to bottom
+            self.by_registration_string.setdefault(row.registration_string, row)
+
+    def find(self, registration_string: str) -> Optional[CourseRow]:
+        return self.by_registration_string.get(registration_string)
+
+    def __eq__(self, other):
+        if not isinstance(other, CourseTable):
+            return False
+        return (self.rows, self.total_rows) == (other.rows, other.total_rows)
+
+
+class RegistrationConfirmation:
+    icon_url: str
+    reason: str
+
+    def __init__(self, icon_url: str, reason: str):
+        """
+        :param icon_url: the src of the status icon, as written in the page
+        :param reason: the text of the row's last cell, which explains why a registration failed
+        """
+        self.icon_url = icon_url
+        self.reason = reason
+
+    def __str__(self):
+        return f"RegistrationConfirmation(icon_url={self.icon_url}, reason={self.reason})"
+
+
+def parse_title(page: str) -> str:
+    match = _TITLE_RE.search(page)
+    if match is not None:
+        return _text(match.group(1))
+    # raises an AttributeError if the page has no title, same as the BeautifulSoup path always did
+    return BeautifulSoup(page, 'html.parser').find('title').text
+
+
+def parse_course_table(page: str, verify: bool = False) -> CourseTable:
+    """
+    Extracts the course rows from the table inside the page's form.
+
+    :param page: the raw html of an "Add Classes" page
+    :param verify: whether to cross-check the fast parser against BeautifulSoup
+    :return: the parsed course table
+    """
+    table = _fast_course_table(page)
+    if table is None:
+        logging.debug("Fast parser was unable to locate the course table. Falling back to BeautifulSoup.")
+        return _bs4_course_table(page)
+
+    if verify:
+        expected = _bs4_course_table(page)
+        if expected != table:
+            logging.warning("Fast parser output disagrees with BeautifulSoup. Using the BeautifulSoup result.")
+            return expected
+
+    return table
+
+
+def _text(fragment: str) -> str:
+    if '<' in fragment:
+        fragment = _TAG_RE.sub('', _COMMENT_RE.sub('', fragment))
+    if '&' in fragment:
+        fragment = html.unescape(fragment)
+    return fragment
+
+
+def _find_course_table_html(page: str) -> Optional[str]:
+    form = _FORM_RE.search(page)
+    if form is None:
+        return None
+
+    # find the first table in the form, accounting for tables nested inside of it
+    depth = 0
+    start = -1
+    for tag in _TABLE_TAG_RE.finditer(page, form.end()):
+        if tag.group(1) == '':
+            if depth == 0:
+                start = tag.end()
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                return page[start:tag.start()]
+    return None
+
+
+def _tag_contents(html_str: str, lowered: str, tag: str, pos: int) -> Optional[Tuple[int, int, int]]:
+    """
+    Finds the next <tag ...>...</tag> pair at or after pos using plain string searches.
+
+    :return: a (content start, content end, position after the closing tag) tuple, or None if there are no
+             more complete tags
+    """
+    open_tag = '<' + tag
+    close_tag = '</' + tag
+    while True:
+        start = lowered.find(open_tag, pos)
+        if start < 0:
+            return None
+        # make sure we found <tr and not something like <track
+        if lowered[start + len(open_tag):start + len(open_tag) + 1] not in _TAG_NAME_TERMINATORS:
+            pos = start + len(open_tag)
+            continue
+        content_start = lowered.find('>', start) + 1
+        content_end = lowered.find(close_tag, content_start)
+        if content_start == 0 or content_end < 0:
+            return None
+        tag_end = lowered.find('>', content_end) + 1
+        return content_start, content_end, tag_end if tag_end > 0 else len(html_str)
+
+
+def _fast_course_table(page: str) -> Optional[CourseTable]:
+    table_html = _find_course_table_html(page)
+    if table_html is None:
+        return None
+    # searching a lower-cased copy is far cheaper than case-insensitive regular expressions
+    lowered = table_html.lower()
+
+    rows: List[CourseRow] = []
+    total_rows = 0
+    pos = 0
+    while True:
+        row = _tag_contents(table_html, lowered, 'tr', pos)
+        if row is None:
+            break
+        row_start, row_end, pos = row
+        total_rows += 1
+
+        if lowered.count('<td', row_start, row_end) < MIN_COURSE_ROW_CELLS:
+            continue
+
+        # only the first and third cells are needed
+        cells = []
+        cell_pos = row_start
+        for _ in range(3):
+            cell = _tag_contents(table_html, lowered, 'td', cell_pos)
+            if cell is None or cell[1] > row_end:
+                break
+            cells += [table_html[cell[0]:cell[1]]]
+            cell_pos = cell[2]
+        if len(cells) < 3:
+            # malformed row, let BeautifulSoup deal with it
+            return None
+
+        course_id_cell = cells[0]
+        if _text(course_id_cell) == '':
+            continue
+
+        select_it = None
+        select_it_match = _SELECT_IT_RE.search(course_id_cell)
+        if select_it_match is not None:
+            value_match = _VALUE_RE.search(select_it_match.group(0))
+            select_it = '' if value_match is None else \
+                html.unescape(value_match.group(1) or value_match.group(2) or value_match.group(3) or '')
+
+        rows.append(CourseRow(_text(cells[2]).replace('\xa0', ' '), select_it))
+
+    if total_rows == 0 and '<tr' in lowered:
+        # rows exist but we couldn't match them (unclosed tags?), let BeautifulSoup deal with it
+        return None
+
+    return CourseTable(rows, total_rows)
+
+
+def _bs4_course_table(page: str) -> CourseTable:
+    parser = BeautifulSoup(page, 'html.parser')
+    table_rows = parser.find('form').find('table').find_all('tr')
+
+    rows: List[CourseRow] = []
+    for table_row in table_rows:
+        table_columns = table_row.find_all('td')
+        if len(table_columns) < MIN_COURSE_ROW_CELLS or table_columns[0].text == '':
+            continue
+        select_it = table_columns[0].select_one(selector="input[name='SelectIt']")
+        rows.append(CourseRow(table_columns[2].text.replace('\xa0', ' '),
+                              None if select_it is None else select_it.get('value', '')))
+
+    return CourseTable(rows, len(table_rows))
+
+
+def parse_registration_confirmation(page: str) -> Optional[RegistrationConfirmation]:
+    """
+    Extracts the status of the first class on an "Add Classes - Confirmation" page. This is only
+    parsed once per registration attempt, so it goes through BeautifulSoup and mirrors the lookups
+    the browser path does.
+
+    :return: the status icon and reason, or None if the page has no status row
+    """
+    parser = BeautifulSoup(page, 'html.parser')
+    for table_row in parser.find_all('tr'):
+        if table_row.get('align') != 'center' or table_row.get('valign') != 'top':
+            continue
+        status_icon = table_row.find('img')
+        table_columns = table_row.find_all('td')
+        if status_icon is None or len(table_columns) == 0:
+            return None
+        reason = table_columns[-1].find('font')
+        return RegistrationConfirmation(status_icon.get('src', ''),
+                                        table_columns[-1].text if reason is None else reason.text)
+    return None
+
+
+def parse_logout_url(page: str) -> Optional[str]:
+    """
+    Finds the link behind the log off button in the student link's page header. Only parsed once, on
+    exit, so it goes through BeautifulSoup.
+
+    :return: the link as it appears on the page, or None if the page has no log off button
+    """
+    parser = BeautifulSoup(page, 'html.parser')
+    for image in parser.find_all('img'):
+        link = image.find_parent('a')
+        if image.get('src', '').endswith('header_logoff.gif') and link is not None and link.get('href'):
+            return link['href']
+    return None
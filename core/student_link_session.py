@@ -0,0 +1,100 @@
+import logging
+from typing import List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+
+from core.traffic_capture import TrafficCapture, CaptureAdapter, ReplayAdapter
+
+try:
+    # urllib3 transparently decodes brotli bodies when this package is present,
+    # so only advertise 'br' when we can actually decode it
+    import brotli  # noqa: F401
+
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+DEFAULT_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,'
+              '*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Connection': 'keep-alive',
+    'Cache-Control': 'no-cache',
+    'Pragma': 'no-cache',
+    'Upgrade-Insecure-Requests': '1',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/118.0.0.0 Safari/537.36'
+}
+
+"""
+A pooled keep-alive HTTP session for talking to the student link outside of the browser.
+Connections (and with them, their TLS sessions) are kept alive and reused across polls
+so that we only pay for the TCP + TLS handshake once per pooled connection.
+"""
+class StudentLinkSession:
+    base_url: str
+    pool_size: int
+    timeout: float
+    session: requests.Session
+
+    def __init__(self, base_url: str, pool_size: int, timeout: float = 15,
+                 capture: Optional[TrafficCapture] = None, replay: Optional[ReplayAdapter] = None):
+        """
+        :param base_url: the student link url all requests are sent to
+        :param pool_size: the max number of connections kept alive, should match the poll concurrency
+        :param timeout: the connect/read timeout in seconds for every request
+        :param capture: records every request and response, if given
+        :param replay: answers every request from a capture instead of the network, if given
+        """
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        if replay is not None:
+            adapter = replay
+        elif capture is not None:
+            adapter = CaptureAdapter(capture, pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        else:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(DEFAULT_HEADERS)
+
+    def sync_cookies(self, cookies: List[dict]):
+        """
+        Replaces the session's cookie jar with the cookies exported by the browser.
+
+        :param cookies: the cookies as returned by selenium's get_cookies()
+        """
+        jar = RequestsCookieJar()
+        for cookie in cookies:
+            jar.set(cookie['name'], cookie['value'],
+                    domain=cookie.get('domain', ''),
+                    path=cookie.get('path', '/'),
+                    secure=cookie.get('secure', False))
+        # swapping the whole jar is atomic, so in-flight polls see either the old or the new cookies
+        self.session.cookies = jar
+        logging.debug(f"Synced {len(cookies)} browser cookie(s) into the HTTP session.")
+
+    def get_cookies(self) -> List[dict]:
+        """
+        :return: the session's current cookies, in the format selenium's get_cookies() uses
+        """
+        return [{'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path,
+                 'secure': cookie.secure} for cookie in self.session.cookies]
+
+    def get(self, params: dict) -> requests.Response:
+        return self.session.get(self.base_url, params=params, timeout=self.timeout)
+
+    def get_url(self, url: str) -> requests.Response:
+        """
+        :param url: a link found on a student link page, e.g. the log off button's
+        """
+        return self.session.get(url, timeout=self.timeout)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,314 @@
+import gzip
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl, urlencode, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+REDACTED = 'REDACTED'
+# headers carrying the session or credentials, their values are never written
+REDACTED_HEADERS = {'cookie', 'set-cookie', 'authorization', 'proxy-authorization'}
+# query parameters and form fields carrying credentials or single sign-on tokens
+REDACTED_PARAMS = {'j_username', 'j_password', 'passcode', 'SAMLRequest', 'SAMLResponse', 'RelayState',
+                   'sig_request', 'sig_response'}
+# the body is stored decoded, so the headers describing its encoding on the wire no longer apply
+DROPPED_RESPONSE_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+# parameter names are matched regardless of case, like the old form field patterns always were
+REDACTED_PARAM_NAMES = {param.lower() for param in REDACTED_PARAMS}
+
+# every input tag of a page, and the name and value attributes in it, in whatever order they come
+INPUT_TAG_PATTERN = re.compile(r'<input\b(?:"[^"]*"|\'[^\']*\'|[^"\'>])*>', re.IGNORECASE)
+INPUT_ATTRIBUTE_PATTERN = re.compile(r'(?<![\w-])(name|value)(\s*=\s*)("[^"]*"|\'[^\']*\'|[^\s"\'>]*)', re.IGNORECASE)
+# the parameters wherever a page carries them url encoded, e.g. in a link, a form action or a script
+ENCODED_PARAM_PATTERN = re.compile(r'(?<![\w-])(' + '|'.join(re.escape(param) for param in REDACTED_PARAMS) +
+                                   r')=([^&\s"\'<>#]*)', re.IGNORECASE)
+
+
+def redact_url(url: str, secrets: Iterable[str] = ()) -> str:
+    """
+    :param secrets: strings to blank out wherever they appear, e.g. the kerberos username
+    :return: the url with the credential and token parameters blanked out
+    """
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    params = [(key, REDACTED if key.lower() in REDACTED_PARAM_NAMES else value)
+              for key, value in parse_qsl(query, keep_blank_values=True)]
+    return redact_secrets(urlunsplit((scheme, netloc, path, urlencode(params), fragment)), secrets)
+
+
+def redact_headers(headers, secrets: Iterable[str] = ()) -> Dict[str, str]:
+    return {key: REDACTED if key.lower() in REDACTED_HEADERS else redact_secrets(value, secrets)
+            for key, value in headers.items()}
+
+
+def redact_body(body: str, secrets: Iterable[str] = ()) -> str:
+    """
+    :return: the page with the values of the credential and token form fields blanked out, along with
+             the credential and token parameters of any url or form data in it
+    """
+    body = INPUT_TAG_PATTERN.sub(redact_input, body)
+    body = ENCODED_PARAM_PATTERN.sub(rf'\1={REDACTED}', body)
+    return redact_secrets(body, secrets)
+
+
+def redact_input(match: re.Match) -> str:
+    tag = match.group(0)
+    redacted = any(attribute.lower() == 'name' and value.strip('"\'').lower() in REDACTED_PARAM_NAMES
+                   for attribute, _, value in INPUT_ATTRIBUTE_PATTERN.findall(tag))
+    if not redacted:
+        return tag
+    return INPUT_ATTRIBUTE_PATTERN.sub(lambda attribute: attribute.group(0) if attribute.group(1).lower() != 'value'
+                                       else f'{attribute.group(1)}{attribute.group(2)}"{REDACTED}"', tag)
+
+
+def redact_secrets(text: str, secrets: Iterable[str]) -> str:
+    for secret in secrets:
+        text = text.replace(secret, REDACTED)
+    return text
+
+
+def get_exchange_key(method: str, url: str) -> Tuple[str, str, Tuple[Tuple[str, str], ...]]:
+    """
+    :return: what a request is matched on when replayed: its method, path and (redacted) query
+             parameters, so recordings replay against any host
+    """
+    _, _, path, query, _ = urlsplit(redact_url(url))
+    return method.upper(), path, tuple(sorted(parse_qsl(query, keep_blank_values=True)))
+
+
+"""
+A recorded StudentLink request and the response it got.
+"""
+class CapturedExchange:
+    method: str
+    url: str
+    request_headers: Dict[str, str]
+    status_code: int
+    reason: str
+    response_headers: Dict[str, str]
+    body: str
+    encoding: Optional[str]
+    # the seconds the response took to arrive
+    elapsed: float
+    recorded_at: float
+
+    def __init__(self, method: str, url: str, request_headers: Dict[str, str], status_code: int, reason: str,
+                 response_headers: Dict[str, str], body: str, encoding: Optional[str], elapsed: float,
+                 recorded_at: float):
+        self.method = method
+        self.url = url
+        self.request_headers = request_headers
+        self.status_code = status_code
+        self.reason = reason
+        self.response_headers = response_headers
+        self.body = body
+        self.encoding = encoding
+        self.elapsed = elapsed
+        self.recorded_at = recorded_at
+
+    @staticmethod
+    def from_json(json_obj):
+        return CapturedExchange(json_obj['method'], json_obj['url'], json_obj['request_headers'],
+                                json_obj['status_code'], json_obj['reason'], json_obj['response_headers'],
+                                json_obj['body'], json_obj['encoding'], json_obj['elapsed'],
+                                json_obj['recorded_at'])
+
+    def __json__(self):
+        return {
+            "method": self.method,
+            "url": self.url,
+            "request_headers": self.request_headers,
+            "status_code": self.status_code,
+            "reason": self.reason,
+            "response_headers": self.response_headers,
+            "body": self.body,
+            "encoding": self.encoding,
+            "elapsed": self.elapsed,
+            "recorded_at": self.recorded_at
+        }
+
+    def __str__(self):
+        return f"CapturedExchange(method={self.method}, url={self.url}, status_code={self.status_code})"
+
+
+"""
+Appends every StudentLink request/response pair to a gzipped json lines file, with cookies,
+credentials and sign-on tokens redacted before anything is written. Every exchange is flushed as it
+is recorded, so a capture cut short by a crash can still be read up to its last exchange.
+"""
+class TrafficCapture:
+    path: str
+    secrets: List[str]
+    lock: threading.Lock
+    file: Optional[gzip.GzipFile]
+    exchange_count: int
+
+    def __init__(self, path: str, secrets: Iterable[str] = ()):
+        """
+        :param path: the file exchanges are appended to, created if it doesn't exist
+        :param secrets: strings to blank out wherever they appear, e.g. the kerberos credentials
+        """
+        self.path = path
+        # longest first, so a secret containing another one is blanked out whole
+        self.secrets = sorted((secret for secret in secrets if secret), key=len, reverse=True)
+        self.lock = threading.Lock()
+        self.file = gzip.open(path, 'ab')
+        self.exchange_count = 0
+
+    def record(self, response: requests.Response, elapsed: float):
+        """
+        :param response: a response whose body was already read
+        :param elapsed: the seconds the response took to arrive
+        """
+        request = response.request
+        response_headers = redact_headers(response.headers, self.secrets)
+        exchange = CapturedExchange(request.method,
+                                    redact_url(request.url, self.secrets),
+                                    redact_headers(request.headers, self.secrets),
+                                    response.status_code,
+                                    response.reason or '',
+                                    {key: value for key, value in response_headers.items()
+                                     if key.lower() not in DROPPED_RESPONSE_HEADERS},
+                                    redact_body(response.text, self.secrets),
+                                    response.encoding,
+                                    elapsed,
+                                    time.time())
+        line = (json.dumps(exchange.__json__(), separators=(',', ':')) + '\n').encode()
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(line)
+            self.file.flush()
+            self.exchange_count += 1
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                logging.info(f'Captured {self.exchange_count} StudentLink exchange(s) to {self.path}.')
+
+
+def load_exchanges(path: str) -> List[CapturedExchange]:
+    """
+    :return: every exchange in a capture file, in the order they were recorded
+    """
+    exchanges: List[CapturedExchange] = []
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                exchanges += [CapturedExchange.from_json(json.loads(line))]
+    except (EOFError, json.JSONDecodeError):
+        # the capture was cut short, everything before the cut is still good
+        logging.warning(f'The capture {path} ends abruptly, loaded the first {len(exchanges)} exchange(s) of it.')
+    return exchanges
+
+
+"""
+Captures every exchange sent through a pooled requests session.
+"""
+class CaptureAdapter(HTTPAdapter):
+    capture: TrafficCapture
+
+    def __init__(self, capture: TrafficCapture, **kwargs):
+        """
+        :param capture: where exchanges are recorded to
+        :param kwargs: passed on to HTTPAdapter, e.g. the pool size
+        """
+        self.capture = capture
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        request_start = time.monotonic()
+        response = super().send(request, **kwargs)
+        # the session reads the whole body anyway, this just does it a moment sooner
+        response.content
+        try:
+            self.capture.record(response, time.monotonic() - request_start)
+        except Exception as e:
+            # a broken capture should never break polling
+            logging.debug(f'Unable to capture the exchange with {request.url}: {e!r}')
+        return response
+
+
+"""
+Answers requests with the responses of a capture, without touching the network. Requests are matched
+on their method, path and query parameters, and every match is answered with the next recorded
+response, the last one being repeated once they run out, so a short capture can back a long run.
+Requests nothing was recorded for are matched on their module alone, and fail like an unreachable
+server if that fails too.
+"""
+class ReplayAdapter(BaseAdapter):
+    exchanges: Dict[tuple, List[CapturedExchange]]
+    exchanges_by_module: Dict[tuple, List[CapturedExchange]]
+    positions: Dict[tuple, int]
+    replay_latency: bool
+    lock: threading.Lock
+
+    def __init__(self, exchanges: List[CapturedExchange], replay_latency: bool = False):
+        """
+        :param exchanges: the recorded exchanges, in the order they were recorded
+        :param replay_latency: whether every response is held back for as long as it took when recorded
+        """
+        super().__init__()
+        self.exchanges = {}
+        self.exchanges_by_module = {}
+        for exchange in exchanges:
+            key = get_exchange_key(exchange.method, exchange.url)
+            self.exchanges.setdefault(key, []).append(exchange)
+            self.exchanges_by_module.setdefault(self.__get_module_key(key), []).append(exchange)
+        self.positions = {}
+        self.replay_latency = replay_latency
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def from_file(path: str, replay_latency: bool = False) -> 'ReplayAdapter':
+        return ReplayAdapter(load_exchanges(path), replay_latency)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        exchange = self.__next_exchange(request)
+        if exchange is None:
+            raise requests.exceptions.ConnectionError(f'No response was recorded for {request.method} '
+                                                      f'{redact_url(request.url)}.', request=request)
+        if self.replay_latency:
+            time.sleep(exchange.elapsed)
+
+        response = requests.Response()
+        response.status_code = exchange.status_code
+        response.reason = exchange.reason
+        response.headers = CaseInsensitiveDict(exchange.response_headers)
+        response.encoding = exchange.encoding
+        response._content = exchange.body.encode(exchange.encoding or 'utf-8')
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        ...  # there are no connections to close
+
+    def __next_exchange(self, request) -> Optional[CapturedExchange]:
+        key = get_exchange_key(request.method, request.url)
+        recorded = self.exchanges.get(key)
+        if recorded is None:
+            key = self.__get_module_key(key)
+            recorded = self.exchanges_by_module.get(key)
+            if recorded is None:
+                return None
+            # kept apart from the positions of exact matches
+            key = ('module',) + key
+        with self.lock:
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+        return recorded[min(position, len(recorded) - 1)]
+
+    @staticmethod
+    def __get_module_key(key: tuple) -> tuple:
+        method, path, params = key
+        return method, path, tuple(param for param in params if param[0] == 'ModuleName')
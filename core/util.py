@@ -100,6 +100,21 @@ def get_new_york_timestamp():
     return int(current_time.timestamp())
 
 
+def parse_new_york_time(text: str) -> float:
+    """
+    :param text: a time on the US East Coast, as YYYY-MM-DD HH:MM or YYYY-MM-DD HH:MM:SS
+    :return: the epoch timestamp of that time
+    """
+    for time_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            local_time = datetime.strptime(text.strip(), time_format)
+        except ValueError:
+            continue
+        # localize, rather than replace tzinfo, so the offset accounts for daylight saving time
+        return pytz.timezone("America/New_York").localize(local_time).timestamp()
+    raise ValueError(f"'{text}' is not a time formatted as YYYY-MM-DD HH:MM[:SS]")
+
+
 def register_logger(debug: bool, colors: bool):
     os.makedirs(get_logs_dir(), exist_ok=True)
 
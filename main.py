@@ -1,50 +1,148 @@
+import argparse
+import atexit
 import logging
 import time
 import traceback
 from getpass import getpass
 
-from selenium import webdriver
 from selenium.common import SessionNotCreatedException, NoSuchDriverException
-from selenium.webdriver.chrome.service import Service
 
 from core import util, secure_storage_handler
 from core.licensing import cloud_util
-from core.licensing.cloud_actions import MembershipLevel
-from core.registrar import Registrar, Status
+from core.licensing.cloud_actions import MembershipLevel, ApplicationStartPermission
+from core.licensing.cloud_client import CloudResultStatus
+from core.browser import BrowserLifecycle, BrowserFactory, get_launch_options
+from core.registrar import Registrar, Status, PollMode, RegistrationMode, DEFAULT_BROWSER_IDLE_TIMEOUT
+from core.profiler import RunProfiler, PROFILE_INTERVAL
 from core.semester import Semester, SemesterSeason
+from core.metrics import MetricsServer, DEFAULT_METRICS_HOST
+from core.startup import StartupOrchestrator
+from core.traffic_capture import TrafficCapture
 from core.util import LogColors
 from core.util import color_message
 
 
 def update_secure_storage_preferences(config):
-    if secure_storage_handler.has_kerberos_password() and not config.save_password:
-        logging.info("Clearing password from secure storage because you updated your password storage preference.")
-        secure_storage_handler.set_kerberos_password(None)
+    clear_password = secure_storage_handler.has_kerberos_password() and not config.save_password
+    clear_duo_cookies = secure_storage_handler.has_duo_cookies() and not config.save_duo_cookies
 
-    if secure_storage_handler.has_duo_cookies() and not config.save_duo_cookies:
+    if clear_password:
+        logging.info("Clearing password from secure storage because you updated your password storage preference.")
+    if clear_duo_cookies:
         logging.info(
             "Clearing duo cookies from secure storage because you updated your duo cookies storage preference.")
-        secure_storage_handler.set_duo_cookies(None)
+
+    if clear_password or clear_duo_cookies:
+        # both are cleared with a single write
+        with secure_storage_handler.transaction() as data:
+            if clear_password:
+                data.kerberos_password = None
+            if clear_duo_cookies:
+                data.duo_cookies = None
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='BU Registration Bot')
+    parser.add_argument('--poll-mode', choices=[mode.name.lower() for mode in PollMode],
+                        default=PollMode.THREADED.name.lower(),
+                        help='run availability checks on a thread pool or on an asyncio event loop')
+    parser.add_argument('--registration-mode', choices=[mode.name.lower() for mode in RegistrationMode],
+                        default=RegistrationMode.BROWSER.name.lower(),
+                        help='submit registrations through the browser or directly over HTTP')
+    parser.add_argument('--browser-lifecycle', choices=[lifecycle.name.lower() for lifecycle in BrowserLifecycle],
+                        default=BrowserLifecycle.PERSISTENT.name.lower(),
+                        help='keep chrome open for the whole run or close it while idle and relaunch it on demand')
+    parser.add_argument('--browser-idle-timeout', type=float, default=DEFAULT_BROWSER_IDLE_TIMEOUT,
+                        help='seconds chrome may sit unused before it is closed when launched on demand')
+    parser.add_argument('--stats-file', default=None,
+                        help='write latency and timing statistics for the run to this json file on exit')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve Prometheus metrics at http://<metrics-host>:<port>/metrics, off if not given')
+    parser.add_argument('--metrics-host', default=DEFAULT_METRICS_HOST,
+                        help='the address the metrics endpoint listens on')
+    parser.add_argument('--profile-dir', default=None,
+                        help='profile every thread of the run and write flame graph stacks and pstats to this '
+                             'directory on exit, or when sent SIGUSR1')
+    parser.add_argument('--profile-interval', type=float, default=PROFILE_INTERVAL,
+                        help='seconds between the profiler\'s stack samples')
+    parser.add_argument('--capture-file', default=None,
+                        help='record the student link requests and responses sent over HTTP, with cookies and '
+                             'credentials redacted, to this gzipped file')
+    parser.add_argument('--registration-opens-at', default=None,
+                        help='when registration opens, as "YYYY-MM-DD HH:MM[:SS]" in New York time. Checks are '
+                             'kept to a trickle until then and sent at the max rate as it opens, timed by the '
+                             'student link\'s clock')
+    parser.add_argument('--adaptive-rate', action='store_true',
+                        help='speed checks up while the student link responds quickly and cleanly, and slow them '
+                             'down when it is slow or erroring, never going over the licensed max rate')
+    parsed_args = parser.parse_args(args)
+    if parsed_args.capture_file is not None and parsed_args.poll_mode != PollMode.THREADED.name.lower():
+        parser.error('--capture-file requires the threaded poll mode')
+    if parsed_args.registration_opens_at is not None:
+        try:
+            parsed_args.registration_opens_at = util.parse_new_york_time(parsed_args.registration_opens_at)
+        except ValueError as e:
+            parser.error(f'--registration-opens-at: {e}')
+    return parsed_args
+
 
 def main() -> int:
+    args = parse_args()
+
     # setup logger
     util.register_logger(False, False)
 
+    profiler = None
+    if args.profile_dir is not None:
+        profiler = RunProfiler(args.profile_dir, args.profile_interval)
+        profiler.start()
+        # registered first, so it runs last and sees the whole shutdown
+        atexit.register(profiler.stop)
+
+    startup_start = time.monotonic()
+    user_wait_time = 0
+
+    # none of these depend on each other, so they all run at the same time
+    startup = StartupOrchestrator()
+    atexit.register(startup.shutdown)
+    # chrome takes a few seconds to start, so get it going while we check the license. This assumes the
+    # default launch options, if the config asks for others the browser is replaced later on
+    browser_factory = BrowserFactory()
+    startup.track('chrome launch', browser_factory.prelaunch())
+    atexit.register(browser_factory.close)
+    startup.submit('device info', util.get_device_meta)
+    startup.submit('secure storage', secure_storage_handler.load_encrypted_data)
+
+    startup.result('secure storage')
     license_key = secure_storage_handler.get_license_key()
     if license_key is None:
+        prompt_start = time.monotonic()
         license_key = input("Please enter your license key: ")
+        user_wait_time += time.monotonic() - prompt_start
         secure_storage_handler.set_license_key(license_key)
 
     logging.info("Connecting to the cloud server...")
     # check license
-    kerberos_username, config, membership, session_id = cloud_util.check_license_and_start_session(
-        license_key
-    )
+    license_check = startup.submit(
+        'license check', lambda: cloud_util.check_license_and_start_session(license_key,
+                                                                            startup.result('device info'))
+    ).result()
 
-    if kerberos_username is None:
+    if license_check.status == CloudResultStatus.UNAUTHORIZED:
         logging.error("Error! Unable to verify your license. Please check your license key and try again.")
         secure_storage_handler.save_encrypted_data(None)
         return 1
+    elif not license_check.is_success():
+        # the reason was already logged, and the license key may well be fine, so it's kept
+        logging.critical("Unable to start a session with the cloud server. If this issue persists, please contact "
+                         "the developer.")
+        return 1
+
+    start_permission: ApplicationStartPermission = license_check.data
+    kerberos_username = start_permission.kerberos_username
+    config = start_permission.app_settings
+    membership = start_permission.membership_level
+    session_id = start_permission.session_id
 
     if config.debug_mode:
         util.register_logger(True, config.console_colors)
@@ -56,18 +154,18 @@ def main() -> int:
         # update secure storage preferences
         update_secure_storage_preferences(config)
 
-        # start the ping task
-        # todo: since this is async, it still tries to ping after the app has initiated shutdown
-        cloud_util.start_ping_task(license_key, session_id)
+        # keep the cloud session alive, the registrar stops the heartbeat once it begins shutting down
+        heartbeat = cloud_util.start_heartbeat(license_key, session_id)
+        atexit.register(heartbeat.stop, 0)
 
-        logging.debug("Testing browser drivers by booting up a dummy browser...")
-        service = Service(executable_path=config.custom_driver.driver_path) if config.custom_driver.enabled else Service()
-        logging.debug(f"Initializing dummy browser service with service_url={service.service_url} path={service.path}...")
+        logging.debug("Testing browser drivers by booting up a browser...")
+        launch_options = get_launch_options(config)
         try:
-            dummy_driver = webdriver.Chrome(options=util.get_chrome_options(), service=service)
-            logging.debug("Successfully loaded chrome drivers! Exiting dummy browser.")
-            dummy_driver.close()
-            dummy_driver.quit()
+            # the browser that passes the test is kept warm and handed over to the registrar
+            browser_factory.put(browser_factory.acquire(*launch_options), *launch_options)
+            logging.debug("Successfully loaded chrome drivers! Keeping the browser for the registrar.")
+            startup.join()
+            startup.log_timings(user_wait_time)
         except OSError:
             logging.critical(traceback.format_exc())
             logging.critical(f"Unable to launch chrome drivers due to an OS Error. Do you have the correct drivers? "
@@ -163,45 +261,62 @@ def main() -> int:
             logging.info(color_message("  * ", LogColors.BRIGHT_GREEN) + color_message(f"{course}", LogColors.WHITE))
 
         time.sleep(1)
+        prompt_start = time.monotonic()
         input("Press enter to continue...")
+        user_wait_time += time.monotonic() - prompt_start
 
         # start main program
         username = kerberos_username
         password = secure_storage_handler.get_kerberos_password()
         if password is None:
+            prompt_start = time.monotonic()
             password = getpass(f'Password for {username} [won\'t be display on screen]: ')
+            user_wait_time += time.monotonic() - prompt_start
             if config.save_password:
                 logging.info("Saving password to secure storage based on your configured preferences...")
                 secure_storage_handler.set_kerberos_password(password)
 
-        registrar = Registrar(license_key, (username, password), config, session_id, membership)
-
+        traffic_capture = None if args.capture_file is None else \
+            TrafficCapture(args.capture_file, secrets=(username, password))
+        registrar = Registrar(license_key, (username, password), config, session_id, membership,
+                              PollMode[args.poll_mode.upper()], RegistrationMode[args.registration_mode.upper()],
+                              BrowserLifecycle[args.browser_lifecycle.upper()], args.browser_idle_timeout,
+                              browser_factory, heartbeat, args.stats_file, traffic_capture=traffic_capture,
+                              profiler=profiler, registration_opens_at=args.registration_opens_at,
+                              adaptive_rate=args.adaptive_rate)
+        if args.metrics_port is not None:
+            metrics_server = MetricsServer(registrar.write_metrics, args.metrics_port, args.metrics_host)
+            metrics_server.start()
+            atexit.register(metrics_server.stop)
 
         logging.debug(f"Now attempting to login for user {username} with credentials {'*' * len(password)}...")
         if registrar.login() != Status.SUCCESS:
             logging.critical('Login failed! Invalid credentials or duo authorization failure?')
-            registrar.graceful_exit()
+            registrar.graceful_exit(Status.ERROR, 'Login failed.')
             return 1
+        logging.info(f"Started up and logged in after {round(time.monotonic() - startup_start - user_wait_time, 2)} "
+                     f"seconds (not counting {round(user_wait_time, 2)} seconds spent waiting for input).")
         time.sleep(3)
         registrar.navigate(semester=Semester(SemesterSeason.Spring, 2024))
         time.sleep(5)
-        if registrar.find_courses() == Status.SUCCESS:
+        find_courses = registrar.find_courses if profiler is None else profiler.wrap(registrar.find_courses)
+        if find_courses() == Status.SUCCESS:
             logging.info('Successfully registered for all courses :)')
 
-            registrar.graceful_exit()
+            registrar.graceful_exit(Status.SUCCESS, 'Registered for all courses.')
             return 0
         else:
             logging.warning(f'Unable to register for {len(config.target_courses)} courses ;(')
-            registrar.graceful_exit()
+            registrar.graceful_exit(Status.ERROR, f'Unable to register for {len(registrar.target_courses)} courses.')
             return 1
     except KeyboardInterrupt as e:
         logging.warning('Program interrupted. Cleaning up and exiting...')
-        registrar.graceful_exit()
+        registrar.graceful_exit(Status.ERROR, 'Interrupted by the user.')
         return 1
     except Exception:
         logging.error(traceback.format_exc())
         logging.error('Ran into an uncaught error while executing this program. See above stack for more info.')
-        registrar.graceful_exit()
+        registrar.graceful_exit(Status.ERROR, traceback.format_exc(limit=3), unknown_crash_occurred=True)
         return 1
 
 
@@ -215,7 +330,6 @@ if __name__ == "__main__":
 # TODO: if internet goes out, can reconnect with out crashing
 # TODO: too many unnecessary logs **
 # TODO: support for 'registering for ONE of these' **
-# TODO: add support to automatically register as soon as registration starts **
 # TODO: support for switching sections **
 # TODO: smtp and/or phone message support
 # TODO: Setup auto building for multiple OS
@@ -0,0 +1,14 @@
+"""
+A clock that only moves when told to, for anything that takes a clock.
+"""
+class FakeClock:
+    now: float
+
+    def __init__(self, now: float = 0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
@@ -0,0 +1,115 @@
+import threading
+import time
+from typing import List
+
+import pytest
+
+from core.licensing import cloud_outbox
+from core.licensing.cloud_client import CloudResult, CloudResultStatus
+from core.licensing.cloud_outbox import CloudOutbox, PendingNotification
+
+SESSION_ID = 7
+NEXT_SESSION_ID = 8
+
+
+class FakeSender:
+    """
+    Answers every notification with the next of the given statuses, then with SUCCESS.
+    """
+    statuses: List[CloudResultStatus]
+    sent: List[PendingNotification]
+    # the attempts every notification had been sent in before, as it was sent
+    previous_attempts: List[int]
+
+    def __init__(self, *statuses: CloudResultStatus):
+        self.statuses = list(statuses)
+        self.sent = []
+        self.previous_attempts = []
+        self.lock = threading.Lock()
+
+    def __call__(self, notification: PendingNotification) -> CloudResult:
+        with self.lock:
+            self.sent += [notification]
+            self.previous_attempts += [notification.attempts]
+            status = self.statuses.pop(0) if len(self.statuses) > 0 else CloudResultStatus.SUCCESS
+        return CloudResult(status, reason=status.name)
+
+    def get_sent_sections(self) -> List[str]:
+        with self.lock:
+            return [notification.course_section for notification in self.sent]
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(cloud_outbox, 'RETRY_DELAY', 0.01)
+    monkeypatch.setattr(cloud_outbox, 'MAX_RETRY_DELAY', 0.05)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'outbox.db')
+
+
+def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_notifications_are_delivered_in_order(path):
+    sender = FakeSender()
+    outbox = CloudOutbox(sender, path)
+    for section in ('A1', 'A2', 'A3'):
+        outbox.put(SESSION_ID, False, 111, section, 1000)
+    outbox.start()
+    wait_until(lambda: outbox.get_pending_count() == 0)
+    outbox.stop(5)
+    assert sender.get_sent_sections() == ['A1', 'A2', 'A3']
+    assert all(notification.session_id == SESSION_ID for notification in sender.sent)
+
+
+def test_failed_deliveries_are_retried_without_reordering(path):
+    sender = FakeSender(CloudResultStatus.UNREACHABLE, CloudResultStatus.SERVER_ERROR)
+    outbox = CloudOutbox(sender, path)
+    outbox.put(SESSION_ID, False, 111, 'A1', 1000)
+    outbox.put(SESSION_ID, False, 111, 'A2', 1000)
+    outbox.start()
+    wait_until(lambda: outbox.get_pending_count() == 0)
+    outbox.stop(5)
+    # A2 is held back until A1 goes through
+    assert sender.get_sent_sections() == ['A1', 'A1', 'A1', 'A2']
+    assert sender.previous_attempts == [0, 1, 2, 0]
+
+
+def test_permanent_failures_and_exhausted_retries_are_given_up(path, monkeypatch):
+    monkeypatch.setattr(cloud_outbox, 'MAX_DELIVERY_ATTEMPTS', 2)
+    sender = FakeSender(CloudResultStatus.UNAUTHORIZED, CloudResultStatus.UNREACHABLE, CloudResultStatus.UNREACHABLE)
+    outbox = CloudOutbox(sender, path)
+    outbox.put(SESSION_ID, False, 111, 'A1', 1000)
+    outbox.put(SESSION_ID, False, 111, 'A2', 1000)
+    outbox.put(SESSION_ID, False, 111, 'A3', 1000)
+    outbox.start()
+    wait_until(lambda: outbox.get_pending_count() == 0)
+    outbox.stop(5)
+    assert sender.get_sent_sections() == ['A1', 'A2', 'A2', 'A3']
+
+
+def test_undelivered_notifications_are_replayed_by_the_next_run(path):
+    outbox = CloudOutbox(FakeSender(), path)
+    outbox.put(SESSION_ID, True, 111, 'A1', 1000)
+    outbox.stop()  # never started, like an app that crashed before delivering
+
+    # the next run has a session of its own
+    sender = FakeSender()
+    outbox = CloudOutbox(sender, path)
+    outbox.put(NEXT_SESSION_ID, False, 222, 'B1', 2000)
+    assert [str(notification) for notification in outbox.get_pending()] == \
+           ['PendingNotification(id=1, course_id=111, course_section=A1, attempts=0)',
+            'PendingNotification(id=2, course_id=222, course_section=B1, attempts=0)']
+    outbox.start()
+    wait_until(lambda: outbox.get_pending_count() == 0)
+    outbox.stop(5)
+    # every notification is delivered with the session it was queued in
+    assert [(notification.session_id, notification.planner, notification.course_section)
+            for notification in sender.sent] == [(SESSION_ID, True, 'A1'), (NEXT_SESSION_ID, False, 'B1')]
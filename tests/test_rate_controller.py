@@ -0,0 +1,95 @@
+import pytest
+
+from core.rate_controller import AdaptiveRateController, ResponseOutcome, INITIAL_RATE_FRACTION, \
+    MIN_RATE_FRACTION, ADDITIVE_INCREASE, INCREASE_INTERVAL, DECREASE_FACTOR, SECURITY_ERROR_DECREASE_FACTOR, \
+    DECREASE_COOLDOWN
+from core.poll_dispatcher import get_max_rates
+from core.registration_window import WindowState, WindowPhase
+from tests.fake_clock import FakeClock
+
+MAX_TOTAL = 120
+MAX_PER_COURSE = 30
+
+
+def make_controller():
+    clock = FakeClock()
+    return AdaptiveRateController(MAX_TOTAL, MAX_PER_COURSE, clock), clock
+
+
+def record_healthy(controller: AdaptiveRateController, clock: FakeClock, seconds: float, latency: float = 0.1):
+    for _ in range(int(seconds / 0.5)):
+        clock.advance(0.5)
+        controller.record(latency, ResponseOutcome.OK)
+
+
+def test_rates_are_a_fraction_of_the_max():
+    controller, _ = make_controller()
+    assert controller.get_fraction() == INITIAL_RATE_FRACTION
+    assert controller.get_rates() == (MAX_TOTAL * INITIAL_RATE_FRACTION, MAX_PER_COURSE * INITIAL_RATE_FRACTION)
+
+
+def test_healthy_responses_increase_additively_up_to_the_max():
+    controller, clock = make_controller()
+    record_healthy(controller, clock, INCREASE_INTERVAL)
+    assert controller.get_fraction() == pytest.approx(INITIAL_RATE_FRACTION + ADDITIVE_INCREASE)
+    record_healthy(controller, clock, 1000)
+    assert controller.get_fraction() == 1
+    assert controller.get_rates() == (MAX_TOTAL, MAX_PER_COURSE)
+
+
+def test_failures_decrease_multiplicatively_once_per_cooldown():
+    controller, clock = make_controller()
+    clock.advance(DECREASE_COOLDOWN)
+    controller.record(0.1, ResponseOutcome.SERVER_ERROR)
+    assert controller.get_fraction() == pytest.approx(INITIAL_RATE_FRACTION * DECREASE_FACTOR)
+    # checks already in flight were sent at the old rate
+    controller.record(0.1, ResponseOutcome.SERVER_ERROR)
+    assert controller.get_fraction() == pytest.approx(INITIAL_RATE_FRACTION * DECREASE_FACTOR)
+
+    clock.advance(DECREASE_COOLDOWN)
+    controller.record(0.1, ResponseOutcome.SECURITY_ERROR)
+    assert controller.get_fraction() == pytest.approx(
+        max(MIN_RATE_FRACTION, INITIAL_RATE_FRACTION * DECREASE_FACTOR * SECURITY_ERROR_DECREASE_FACTOR))
+
+
+def test_rate_never_drops_below_the_floor():
+    controller, clock = make_controller()
+    for _ in range(20):
+        clock.advance(DECREASE_COOLDOWN)
+        controller.record(0.1, ResponseOutcome.SECURITY_ERROR)
+    assert controller.get_fraction() == MIN_RATE_FRACTION
+
+
+def test_slow_responses_decrease_the_rate():
+    controller, clock = make_controller()
+    record_healthy(controller, clock, 1000)
+    clock.advance(DECREASE_COOLDOWN)
+    controller.record(5, ResponseOutcome.OK)
+    assert controller.get_fraction() == pytest.approx(DECREASE_FACTOR)
+
+
+def test_rate_holds_until_the_error_rate_settles():
+    controller, clock = make_controller()
+    for _ in range(5):
+        clock.advance(DECREASE_COOLDOWN)
+        controller.record(0.1, ResponseOutcome.SERVER_ERROR)
+    fraction = controller.get_fraction()
+    # healthy responses, but the recent failures keep the rate where it is for a while
+    clock.advance(INCREASE_INTERVAL)
+    controller.record(0.1, ResponseOutcome.OK)
+    assert controller.get_fraction() == fraction
+    record_healthy(controller, clock, 60)
+    assert controller.get_fraction() > fraction
+
+
+def test_max_rates_combine_the_window_and_the_controller():
+    controller, _ = make_controller()
+    ramp = WindowState(WindowPhase.RAMP_DOWN, MAX_TOTAL / 2, MAX_PER_COURSE / 2, 10)
+    assert get_max_rates(None, None) is None
+    assert get_max_rates(ramp, None) == (MAX_TOTAL / 2, MAX_PER_COURSE / 2)
+    assert get_max_rates(None, controller) == controller.get_rates()
+    # the window's rates are scaled down by the controller, so neither limit is ever exceeded
+    total, per_course = get_max_rates(ramp, controller)
+    assert total == pytest.approx(MAX_TOTAL / 2 * INITIAL_RATE_FRACTION)
+    assert per_course == pytest.approx(MAX_PER_COURSE / 2 * INITIAL_RATE_FRACTION)
+    assert total <= min(ramp.max_requests_total, controller.get_rates()[0])
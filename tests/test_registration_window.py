@@ -0,0 +1,84 @@
+import email.utils
+import math
+
+import pytest
+
+from core import registration_window
+from core.registration_window import RegistrationWindow, ServerClock, WindowPhase, BURST_LEAD, LANDING_HOLD, \
+    BURST_DURATION, RAMP_DOWN_DURATION, SETTLED_RATE_FRACTION, IDLE_CHECK_INTERVAL
+from core.scheduler import RATE_PERIOD
+
+OPENS_AT = 1_700_000_000
+MAX_TOTAL = 120
+MAX_PER_COURSE = 30
+
+
+def make_window(server_clock: ServerClock = None) -> RegistrationWindow:
+    return RegistrationWindow(OPENS_AT, ServerClock() if server_clock is None else server_clock,
+                              MAX_TOTAL, MAX_PER_COURSE)
+
+
+def test_phases_with_an_unobserved_clock():
+    window = make_window()
+    idle = window.get_state(OPENS_AT - 600)
+    assert idle.phase == WindowPhase.IDLE
+    assert idle.max_requests_total == min(MAX_TOTAL, RATE_PERIOD / IDLE_CHECK_INTERVAL)
+    assert idle.next_change == pytest.approx(600 - BURST_LEAD)
+
+    burst = window.get_state(OPENS_AT - BURST_LEAD + 0.1)
+    assert burst.phase == WindowPhase.BURST
+    assert (burst.max_requests_total, burst.max_requests_per_course) == (MAX_TOTAL, MAX_PER_COURSE)
+
+    assert window.get_state(OPENS_AT - LANDING_HOLD / 2).phase == WindowPhase.HOLD
+    # without a single Date header the clock may be off by any amount, so the hold lasts at most LANDING_HOLD
+    assert window.get_state(OPENS_AT + LANDING_HOLD / 2).phase == WindowPhase.HOLD
+    assert window.get_state(OPENS_AT + LANDING_HOLD).phase == WindowPhase.BURST
+    assert window.get_state(OPENS_AT + BURST_DURATION - 1).phase == WindowPhase.BURST
+
+
+def test_ramp_down_eases_to_the_settled_rate():
+    window = make_window()
+    start = window.get_state(OPENS_AT + BURST_DURATION)
+    middle = window.get_state(OPENS_AT + BURST_DURATION + RAMP_DOWN_DURATION / 2)
+    assert start.phase == middle.phase == WindowPhase.RAMP_DOWN
+    assert start.max_requests_total == pytest.approx(MAX_TOTAL)
+    assert middle.max_requests_total == pytest.approx(MAX_TOTAL * (1 + SETTLED_RATE_FRACTION) / 2)
+    assert middle.next_change == pytest.approx(registration_window.RAMP_STEP)
+
+    settled = window.get_state(OPENS_AT + BURST_DURATION + RAMP_DOWN_DURATION)
+    assert settled.phase == WindowPhase.SETTLED
+    assert settled.max_requests_total == pytest.approx(MAX_TOTAL * SETTLED_RATE_FRACTION)
+    assert settled.max_requests_per_course == pytest.approx(MAX_PER_COURSE * SETTLED_RATE_FRACTION)
+    assert settled.next_change == math.inf
+
+
+def test_server_clock_narrows_the_offset_with_every_response():
+    server_clock = ServerClock()
+    assert server_clock.get_offset() == 0 and server_clock.get_uncertainty() == math.inf
+    # the server runs 10.3 seconds ahead, the round trip takes 0.1 seconds
+    for sent_at in (1000.0, 1000.25, 1000.5, 1000.75, 1001.0):
+        received_at = sent_at + 0.1
+        server_time = sent_at + 0.05 + 10.3
+        server_clock.observe(email.utils.formatdate(math.floor(server_time), usegmt=True), sent_at, received_at)
+    assert abs(server_clock.get_offset() - 10.3) <= server_clock.get_uncertainty()
+    assert server_clock.get_uncertainty() < 0.2
+    assert server_clock.get_one_way_delay() == pytest.approx(0.05)
+
+
+def test_server_clock_ignores_missing_and_malformed_headers():
+    server_clock = ServerClock()
+    server_clock.observe(None, 1000, 1000.1)
+    server_clock.observe('not a date', 1000, 1000.1)
+    assert server_clock.samples == 0
+
+
+def test_phases_follow_the_server_clock():
+    server_clock = ServerClock()
+    # the server is 100 seconds ahead, to within a second
+    server_clock.observe(email.utils.formatdate(OPENS_AT - 500 + 100, usegmt=True), OPENS_AT - 500, OPENS_AT - 500)
+    window = make_window(server_clock)
+    # by our clock the window is 100 seconds away, but it's about to open on the server
+    assert window.get_state(OPENS_AT - 100 - BURST_LEAD - 1).phase == WindowPhase.IDLE
+    assert window.get_state(OPENS_AT - 100 - 2).phase == WindowPhase.BURST
+    assert window.get_state(OPENS_AT - 100 + 5).phase == WindowPhase.BURST
+    assert window.get_state(OPENS_AT).phase == WindowPhase.RAMP_DOWN
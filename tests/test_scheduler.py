@@ -0,0 +1,119 @@
+import math
+
+import pytest
+
+from core.poll_plan import PollGroup
+from core.scheduler import TokenBucket, PollScheduler, PollCycle, RATE_PERIOD
+from tests.fake_clock import FakeClock
+
+
+def make_group(course_code: str) -> PollGroup:
+    return PollGroup(('2024-FALL', 'CAS', 'CS', course_code), [])
+
+
+def test_token_bucket_starts_full_and_refills_at_its_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(2, capacity=3, clock=clock)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.get_wait_time() == pytest.approx(0.5)
+
+    clock.advance(0.5)
+    assert bucket.get_wait_time() == 0
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+    clock.advance(100)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_token_bucket_keeps_tokens_earned_before_a_rate_change():
+    clock = FakeClock()
+    bucket = TokenBucket(1, clock=clock)
+    bucket.try_acquire()
+    clock.advance(0.5)
+    bucket.set_rate(0.25)
+    assert bucket.get_wait_time() == pytest.approx(2)
+
+
+def test_token_bucket_without_a_rate_never_refills():
+    bucket = TokenBucket(0, clock=FakeClock())
+    bucket.try_acquire()
+    assert bucket.get_wait_time() == math.inf
+
+
+def test_scheduler_round_robins_least_recently_checked_first():
+    clock = FakeClock()
+    scheduler = PollScheduler(6000, 6000, jitter=0, clock=clock)
+    plan = [make_group('111'), make_group('112'), make_group('113')]
+    dispatched = []
+    for _ in range(6):
+        group, wait = scheduler.next_dispatch(plan, set())
+        assert wait == 0
+        dispatched += [group.key[3]]
+        clock.advance(1)
+    assert dispatched == ['111', '112', '113'] * 2
+
+
+def test_scheduler_skips_groups_in_flight():
+    scheduler = PollScheduler(6000, 6000, jitter=0, clock=FakeClock())
+    plan = [make_group('111'), make_group('112')]
+    group, _ = scheduler.next_dispatch(plan, {plan[0].key})
+    assert group is plan[1]
+    group, wait = scheduler.next_dispatch(plan, {plan[0].key, plan[1].key})
+    assert group is None and wait > 0
+
+
+def test_scheduler_holds_to_the_total_rate():
+    clock = FakeClock()
+    scheduler = PollScheduler(60, 6000, jitter=0, clock=clock)
+    plan = [make_group(str(code)) for code in range(100, 110)]
+    # the total bucket allows a burst of two
+    assert scheduler.next_dispatch(plan, set())[0] is not None
+    assert scheduler.next_dispatch(plan, set())[0] is not None
+    group, wait = scheduler.next_dispatch(plan, set())
+    assert group is None
+    assert wait == pytest.approx(RATE_PERIOD / 60)
+
+
+def test_scheduler_holds_each_course_to_the_course_rate():
+    clock = FakeClock()
+    scheduler = PollScheduler(6000, 6, jitter=0, clock=clock)
+    plan = [make_group('111')]
+    assert scheduler.next_dispatch(plan, set())[0] is not None
+    group, wait = scheduler.next_dispatch(plan, set())
+    assert group is None
+    assert wait == pytest.approx(RATE_PERIOD / 6)
+
+    clock.advance(RATE_PERIOD / 6)
+    assert scheduler.next_dispatch(plan, set())[0] is not None
+
+
+def test_scheduler_rates_can_be_changed():
+    clock = FakeClock()
+    scheduler = PollScheduler(60, 60, jitter=0, clock=clock)
+    scheduler.next_dispatch([make_group('111')], set())
+    scheduler.set_rates(120, 30)
+    assert scheduler.get_total_rate() == pytest.approx(120)
+    # the course's bucket is empty, and now refills at the new course rate
+    assert scheduler.next_dispatch([make_group('111')], set())[1] == pytest.approx(RATE_PERIOD / 30)
+
+
+def test_scheduler_jitter_stays_within_bounds():
+    scheduler = PollScheduler(60, 60, jitter=0.1, clock=FakeClock())
+    plan = [make_group('111')]
+    scheduler.next_dispatch(plan, set())
+    for _ in range(50):
+        _, wait = scheduler.next_dispatch(plan, set())
+        assert RATE_PERIOD / 60 * 0.9 <= wait <= RATE_PERIOD / 60 * 1.1
+
+
+def test_poll_cycle_completes_once_every_group_reported():
+    plan = [make_group('111'), make_group('112')]
+    cycle = PollCycle()
+    assert not cycle.is_complete(plan)
+    cycle.record_result(plan[0].key, {})
+    cycle.record_result(plan[0].key, {})
+    assert not cycle.is_complete(plan)
+    cycle.record_result(plan[1].key, {})
+    assert cycle.is_complete(plan)
+    assert not PollCycle().is_complete([])
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from core import secure_storage_handler
+from core.secure_storage_handler import SecurelyStorageData, StorageConflictError
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(secure_storage_handler, 'STORAGE_FILE', str(tmp_path / 'secure_storage.tt'))
+    # a fixed key, rather than one derived from the hardware UUID
+    monkeypatch.setattr(secure_storage_handler, '_masked_key', (b'\0' * 32, b'k' * 32))
+    monkeypatch.setattr(secure_storage_handler, 'loaded_storage', None)
+    monkeypatch.setattr(secure_storage_handler, 'loaded_stamp', None)
+    return tmp_path
+
+
+def make_data(license_key: str, kerberos_password: str = None) -> SecurelyStorageData:
+    return SecurelyStorageData.from_dict({'license_key': license_key, 'kerberos_password': kerberos_password})
+
+
+def get_open_file_count() -> int:
+    return len(os.listdir('/proc/self/fd'))
+
+
+def test_round_trip(storage):
+    secure_storage_handler.set_license_key('KEY')
+    secure_storage_handler.set_kerberos_password('hunter2')
+    assert secure_storage_handler.get_license_key() == 'KEY'
+    assert secure_storage_handler.get_kerberos_password() == 'hunter2'
+    with open(secure_storage_handler.STORAGE_FILE) as file:
+        header, _, body = file.read().partition('\n')
+    assert header == '2' and 'hunter2' not in body
+
+
+def test_conflicting_write_is_rejected_and_cleaned_up(storage):
+    secure_storage_handler.save_encrypted_data(make_data('KEY'))
+    open_files = get_open_file_count() if os.path.isdir('/proc/self/fd') else None
+
+    with pytest.raises(StorageConflictError):
+        with secure_storage_handler.transaction() as data:
+            data.kerberos_password = 'mine'
+            # another process writes in the meantime
+            secure_storage_handler._write_storage(make_data('KEY', 'theirs'), None)
+
+    # the other write stands, and the losing write left no temp file or open descriptor behind
+    secure_storage_handler.loaded_stamp = None
+    assert secure_storage_handler.get_kerberos_password() == 'theirs'
+    assert sorted(os.listdir(storage)) == ['secure_storage.tt', 'secure_storage.tt.lock']
+    if open_files is not None:
+        assert get_open_file_count() == open_files
+
+
+def test_updates_are_retried_after_a_conflict(storage, monkeypatch):
+    secure_storage_handler.save_encrypted_data(make_data('KEY'))
+    write_storage = secure_storage_handler._write_storage
+    conflicts = []
+
+    def write_after_another_process(data, expected_version):
+        if len(conflicts) == 0:
+            conflicts.append(expected_version)
+            write_storage(make_data('KEY', 'theirs'), None)
+        write_storage(data, expected_version)
+
+    monkeypatch.setattr(secure_storage_handler, '_write_storage', write_after_another_process)
+    monkeypatch.setattr(secure_storage_handler, 'loaded_stamp', None)
+    secure_storage_handler._update(duo_cookies=[{'name': 'a'}])
+
+    assert conflicts == [1]
+    assert secure_storage_handler.get_kerberos_password() == 'theirs'
+    assert secure_storage_handler.get_duo_cookies() == [{'name': 'a'}]
+
+
+def test_updates_give_up_after_repeated_conflicts(storage, monkeypatch):
+    secure_storage_handler.save_encrypted_data(make_data('KEY'))
+
+    def always_conflict(data, expected_version):
+        raise StorageConflictError('conflict')
+
+    monkeypatch.setattr(secure_storage_handler, '_write_storage', always_conflict)
+    with pytest.raises(StorageConflictError):
+        secure_storage_handler._update(kerberos_password='mine')
+
+
+def test_reads_are_served_from_the_cache_until_the_file_changes(storage, monkeypatch):
+    secure_storage_handler.save_encrypted_data(make_data('KEY'))
+    reads = []
+    read_storage = secure_storage_handler._read_storage
+    monkeypatch.setattr(secure_storage_handler, '_read_storage', lambda: reads.append(1) or read_storage())
+
+    for _ in range(10):
+        assert secure_storage_handler.get_license_key() == 'KEY'
+    assert reads == []
+
+    # replaced by another process, which this process didn't write the stamp for
+    other_file = str(storage / 'other.tt')
+    os.rename(secure_storage_handler.STORAGE_FILE, other_file)
+    with open(other_file) as source, open(secure_storage_handler.STORAGE_FILE, 'w') as target:
+        target.write(source.read())
+    assert secure_storage_handler.get_license_key() == 'KEY'
+    assert reads == [1]
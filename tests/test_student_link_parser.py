@@ -0,0 +1,92 @@
+import pytest
+
+from benchmarks.student_link_pages import HEADER, FOOTER, course_row, department_rows, browse_schedule_page
+from core import student_link_parser
+from core.student_link_parser import _fast_course_table, _bs4_course_table
+
+
+def assert_same_table(page: str):
+    fast = _fast_course_table(page)
+    assert fast is not None, 'the fast path fell back on a page it should handle'
+    assert fast == _bs4_course_table(page)
+    return fast
+
+
+@pytest.mark.parametrize('count', [0, 1, 30, 300])
+def test_fast_path_matches_bs4_on_department_listings(count):
+    table = assert_same_table(browse_schedule_page(department_rows('CAS', 'CS', count)))
+    assert len(table.rows) == count
+
+
+def test_rows_without_select_it_are_blocked():
+    page = browse_schedule_page([course_row('CAS', 'CS', '111', 'A1', 0, None),
+                                 course_row('CAS', 'CS', '111', 'A2', 5, '0001190000')])
+    table = assert_same_table(page)
+    assert table.find('CAS CS111 A1').select_it is None
+    assert table.find('CAS CS111 A2').select_it == '0001190000'
+
+
+@pytest.mark.parametrize('checkbox, select_it', [
+    ('<INPUT TYPE="checkbox" NAME="SelectIt" VALUE="123">', '123'),
+    ("<input type='checkbox' name='SelectIt' value='456'>", '456'),
+    ('<input type=checkbox name=SelectIt value=789>', '789'),
+    ('<INPUT TYPE="checkbox" NAME="SelectIt">', ''),
+    ('<INPUT TYPE="checkbox" NAME="SelectIt" VALUE="a&amp;b">', 'a&b'),
+    ('<INPUT TYPE="checkbox" NAME="SelectItToo" VALUE="1">', None),
+])
+def test_select_it_attribute_variants(checkbox, select_it):
+    row = course_row('CAS', 'CS', '111', 'A1', 5, '0').replace(
+        '<INPUT TYPE="checkbox" NAME="SelectIt" VALUE="0">', checkbox)
+    table = assert_same_table(browse_schedule_page([row]))
+    assert table.rows[0].select_it == select_it
+
+
+def test_comments_and_entities():
+    row = course_row('CAS', 'CS', '111', 'A1', 5, '1').replace(
+        '<TD><FONT SIZE=-1>CAS&nbsp;CS111&nbsp;A1</FONT></TD>',
+        '<TD><FONT SIZE=-1>CAS&nbsp;<!-- <b>x</b> -->CS111&#160;A1</FONT></TD>')
+    table = assert_same_table(browse_schedule_page([row, course_row('CAS', 'CS', '112', 'A1', 0, None)]))
+    assert [row.registration_string for row in table.rows] == ['CAS CS111 A1', 'CAS CS112 A1']
+
+
+def test_verify_catches_tables_nested_in_rows():
+    # the fast path cuts a row off at the first closing tag, which a nested table has too
+    row = course_row('CAS', 'CS', '111', 'A1', 5, '1').replace(
+        '<TD><FONT SIZE=-1>Mon,Wed</FONT></TD>',
+        '<TD><TABLE><TR><TD>Mon</TD></TR><TR><TD>Wed</TD></TR></TABLE></TD>')
+    page = browse_schedule_page([row])
+    assert student_link_parser.parse_course_table(page, verify=True) == _bs4_course_table(page)
+
+
+def test_lower_case_markup():
+    page = browse_schedule_page(department_rows('ENG', 'EK', 20))
+    lowered = page.lower().replace('selectit', 'SelectIt')
+    assert_same_table(lowered)
+
+
+def test_rows_with_an_empty_first_cell_are_skipped():
+    row = course_row('CAS', 'CS', '111', 'A1', 0, None).replace(
+        '<TD><IMG SRC="https://www.bu.edu/link/student/images/blocked.gif" ALT="Blocked">&nbsp;</TD>', '<TD></TD>')
+    table = assert_same_table(browse_schedule_page([row]))
+    assert table.rows == []
+    assert table.total_rows == 2  # the header row, and the skipped one
+
+
+def test_unclosed_rows_fall_back_to_bs4():
+    page = HEADER + course_row('CAS', 'CS', '111', 'A1', 5, '1').replace('</TD>', '') + FOOTER
+    assert _fast_course_table(page) is None
+    assert student_link_parser.parse_course_table(page) == _bs4_course_table(page)
+
+
+def test_verify_uses_bs4_when_the_parsers_disagree(monkeypatch):
+    page = browse_schedule_page(department_rows('CAS', 'CS', 10))
+    expected = _bs4_course_table(page)
+    monkeypatch.setattr(student_link_parser, '_fast_course_table',
+                        lambda _: student_link_parser.CourseTable([], expected.total_rows))
+    assert student_link_parser.parse_course_table(page, verify=True) == expected
+
+
+def test_parse_title():
+    page = browse_schedule_page([])
+    assert student_link_parser.parse_title(page) == 'Add Classes - Display'
+    assert student_link_parser.parse_title('<title>A &amp; <b>B</b></title>') == 'A & B'
@@ -0,0 +1,93 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import pytest
+
+from core import student_link_session
+from core.student_link_session import StudentLinkSession
+
+PAGE = b'<html><head><title>Add Classes - Display</title></head><body></body></html>'
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """
+    Answers with PAGE, encoded as the ?encoding= parameter asks, and notes the connection and the
+    cookies of every request.
+    """
+    protocol_version = 'HTTP/1.1'  # required for keep-alive
+    client_ports: List[int] = []
+    cookies: List[str] = []
+    accept_encodings: List[str] = []
+
+    def do_GET(self):
+        EchoHandler.client_ports += [self.client_address[1]]
+        EchoHandler.cookies += [self.headers.get('Cookie', '')]
+        EchoHandler.accept_encodings += [self.headers.get('Accept-Encoding', '')]
+        body, encoding = PAGE, None
+        if 'encoding=gzip' in self.path:
+            body, encoding = gzip.compress(PAGE), 'gzip'
+        elif 'encoding=br' in self.path:
+            body, encoding = pytest.importorskip('brotli').compress(PAGE), 'br'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def session():
+    EchoHandler.client_ports, EchoHandler.cookies, EchoHandler.accept_encodings = [], [], []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EchoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    session = StudentLinkSession(f'http://127.0.0.1:{server.server_address[1]}/', pool_size=2, timeout=5)
+    yield session
+    session.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_kept_alive(session):
+    for _ in range(5):
+        assert session.get({'ModuleName': 'reg/add/browse_schedule.pl'}).content == PAGE
+    assert len(set(EchoHandler.client_ports)) == 1
+
+
+def test_browser_cookies_are_synced(session):
+    session.sync_cookies([{'name': 'SESSION', 'value': 'abc', 'domain': '127.0.0.1', 'path': '/'},
+                          {'name': 'theme', 'value': 'dark'}])
+    session.get({})
+    assert sorted(EchoHandler.cookies[-1].split('; ')) == ['SESSION=abc', 'theme=dark']
+
+    # a sync replaces the cookies rather than adding to them
+    session.sync_cookies([{'name': 'SESSION', 'value': 'def', 'domain': '127.0.0.1', 'path': '/'}])
+    session.get({})
+    assert EchoHandler.cookies[-1] == 'SESSION=def'
+    assert session.get_cookies() == [{'name': 'SESSION', 'value': 'def', 'domain': '127.0.0.1', 'path': '/',
+                                      'secure': False}]
+
+
+def test_gzip_bodies_are_decoded(session):
+    assert session.get({'encoding': 'gzip'}).content == PAGE
+
+
+def test_brotli_is_advertised_and_decoded_when_available(session):
+    pytest.importorskip('brotli')
+    assert session.get({'encoding': 'br'}).content == PAGE
+    assert 'br' in EchoHandler.accept_encodings[-1].split(', ')
+
+
+def test_brotli_is_only_advertised_when_it_can_be_decoded():
+    try:
+        import brotli  # noqa: F401
+        assert student_link_session.ACCEPT_ENCODING == 'gzip, deflate, br'
+    except ImportError:
+        assert student_link_session.ACCEPT_ENCODING == 'gzip, deflate'
@@ -0,0 +1,115 @@
+import gzip
+import json
+
+import pytest
+import requests
+
+from benchmarks.fake_student_link import FakeStudentLink, FakeSection, LOGIN_PAGE
+from core.student_link_session import StudentLinkSession
+from core.traffic_capture import TrafficCapture, ReplayAdapter, CapturedExchange, REDACTED, load_exchanges, \
+    redact_url, redact_headers, redact_body
+
+BROWSE_PARAMS = {'ModuleName': 'reg/add/browse_schedule.pl', 'College': 'CAS', 'Dept': 'CS', 'Course': '111',
+                 'Section': 'A1'}
+
+
+@pytest.mark.parametrize('tag', [
+    '<input type="hidden" name="SAMLResponse" value="PHNhbWw+">',
+    '<input value="PHNhbWw+" type="hidden" name="SAMLResponse">',
+    "<INPUT VALUE='PHNhbWw+' NAME='samlresponse'>",
+    '<input name=SAMLResponse value=PHNhbWw+>',
+    '<input\nname="SAMLResponse"\nvalue = "PHNhbWw+" />',
+])
+def test_token_fields_are_redacted_in_any_attribute_order(tag):
+    redacted = redact_body(f'<form>{tag}<input name="keep" value="visible"></form>')
+    assert 'PHNhbWw+' not in redacted
+    assert REDACTED in redacted
+    assert 'value="visible"' in redacted
+
+
+def test_other_fields_are_left_alone():
+    body = '<input name="SelectIt" value="0001190000"><input data-name="j_password" value="x">'
+    assert redact_body(body) == body
+
+
+def test_url_encoded_tokens_are_redacted_in_pages():
+    body = ('<a href="/idp/SSO?SAMLRequest=fZJN%2B&amp;RelayState=ss%3Amem&amp;keep=1">Continue</a>\n'
+            '<form action="/login?j_username=bob">j_password=hunter2&amp;sig_response=AUTH|abc</form>')
+    redacted = redact_body(body)
+    for secret in ('fZJN%2B', 'ss%3Amem', 'bob', 'hunter2', 'AUTH|abc'):
+        assert secret not in redacted
+    assert 'keep=1' in redacted
+
+
+def test_credential_query_parameters_are_redacted():
+    url = redact_url('https://example.com/idp/SSO?j_username=bob&j_password=hunter2&SAMLRequest=abc&Keep=1')
+    assert 'bob' not in url and 'hunter2' not in url and 'abc' not in url
+    assert 'Keep=1' in url
+
+
+def test_session_headers_are_redacted():
+    headers = redact_headers({'Cookie': 'StudentLinkSession=abc', 'Set-Cookie': 'x=y', 'Authorization': 'Basic eA==',
+                              'Accept': 'text/html'})
+    assert headers == {'Cookie': REDACTED, 'Set-Cookie': REDACTED, 'Authorization': REDACTED, 'Accept': 'text/html'}
+
+
+def test_secrets_are_redacted_everywhere():
+    secrets = ['U12345678', 'bob']
+    assert redact_url('https://example.com/?Student=U12345678', secrets) == f'https://example.com/?Student={REDACTED}'
+    assert redact_headers({'Referer': 'https://example.com/bob'}, secrets) == \
+           {'Referer': f'https://example.com/{REDACTED}'}
+    assert redact_body('<td>bob, U12345678</td>', secrets) == f'<td>{REDACTED}, {REDACTED}</td>'
+
+
+@pytest.fixture
+def fake_student_link():
+    fake_student_link = FakeStudentLink([FakeSection('CAS', 'CS', '111', 'A1', seats=5, opens_at=0)],
+                                        filler_sections=16, session_id='super-secret-session')
+    fake_student_link.start()
+    yield fake_student_link
+    fake_student_link.stop()
+
+
+def test_capture_then_replay(fake_student_link, tmp_path):
+    path = str(tmp_path / 'capture.jsonl.gz')
+    capture = TrafficCapture(path, secrets=['super-secret-session'])
+    session = StudentLinkSession(fake_student_link.get_url(), 1, capture=capture)
+    logged_out_page = session.get(BROWSE_PARAMS).text
+    session.sync_cookies([fake_student_link.get_session_cookie()])
+    browse_page = session.get(BROWSE_PARAMS).text
+    session.close()
+    capture.close()
+
+    with gzip.open(path, 'rt') as file:
+        assert 'super-secret-session' not in file.read()
+    exchanges = load_exchanges(path)
+    assert [exchange.status_code for exchange in exchanges] == [200, 200]
+    assert exchanges[1].request_headers['Cookie'] == REDACTED
+    assert logged_out_page == LOGIN_PAGE
+
+    # replayed against another host, the recorded responses come back in order, the last one repeating
+    replay = StudentLinkSession('https://studentlink.example/link/bin/uiscgi_studentlink.pl', 1,
+                                replay=ReplayAdapter.from_file(path))
+    assert replay.get(BROWSE_PARAMS).text == logged_out_page
+    for _ in range(2):
+        response = replay.get(BROWSE_PARAMS)
+        assert response.status_code == 200 and response.text == browse_page
+        assert 'SelectIt' in response.text
+
+    # requests nothing was recorded for fall back to the responses recorded for their module, from the
+    # first one, then fail like an unreachable server
+    assert replay.get({**BROWSE_PARAMS, 'Course': '999'}).text == logged_out_page
+    assert replay.get({**BROWSE_PARAMS, 'Course': '999'}).text == browse_page
+    with pytest.raises(requests.exceptions.ConnectionError):
+        replay.get({'ModuleName': 'reg/add/confirm_classes.pl'})
+
+
+def test_captures_cut_short_are_loaded_up_to_the_cut(tmp_path):
+    path = str(tmp_path / 'capture.jsonl.gz')
+    exchange = CapturedExchange('GET', 'https://example.com/?a=1', {}, 200, 'OK', {}, 'body', 'utf-8', 0.1, 0)
+    with gzip.open(path, 'wt') as file:
+        file.write(json.dumps(exchange.__json__()) + '\n')
+    # a second member the app crashed half way through writing
+    with open(path, 'ab') as file:
+        file.write(gzip.compress(b'{"method": "GET", "url"')[:-8])
+    assert [str(loaded) for loaded in load_exchanges(path)] == [str(exchange)]